@@ -1,68 +1,86 @@
 """FastAPI server for HTTP access to MCP functionality."""
-from fastapi import FastAPI, Depends, HTTPException, Response
+from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+from datetime import datetime
+import re
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from mcp_server import (
     find_cases, search_similar_cases, get_case_details,
     get_document, analyze_judge_patterns
 )
-from services.metrics import get_metrics, get_metrics_content_type
+from schemas import (
+    FindCasesRequest, SearchSimilarRequest, GetCaseRequest,
+    GetDocumentRequest, AnalyzeJudgeRequest, TriggerFetchRequest
+)
+from services.metrics import iter_metrics, get_metrics_content_type
+from services.cache import get_cache, close_cache
+from services.change_monitor import ChangeMonitor
+from services.http_client import close_http_client
+from services.kafka_client import get_producer
+from services.triggers import publish_trigger
 from config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Court Registry MCP API", version="1.0.0")
+# Document/case links in the raw search page bytes (relative or absolute hrefs)
+DOCUMENT_HREF_RE = re.compile(rb'href=["\']((?:https?://[^"\'/]+)?/(?:Document|Case)/[0-9]+)["\'/?#]')
+
+# Returns the candidates that have no document version yet, in discovery order
+NEW_CANDIDATES_SQL = text("""
+    SELECT c.doc_id, c.url
+    FROM unnest(CAST(:doc_ids AS text[]), CAST(:urls AS text[])) WITH ORDINALITY AS c(doc_id, url, ord)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM document_versions dv WHERE dv.source_url = c.url
+    )
+    ORDER BY c.ord
+""")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources at startup and release them on shutdown."""
+    try:
+        yield
+    finally:
+        await close_http_client()
+        await close_cache()
+
+
+app = FastAPI(
+    title="Court Registry MCP API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.allowed_origins.split(","),
+    allow_origins=settings.allowed_origins_list,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 
-# Request models
-class FindCasesRequest(BaseModel):
-    plaintiff: Optional[str] = None
-    defendant: Optional[str] = None
-    law_article: Optional[str] = None
-    date_from: Optional[str] = None
-    date_to: Optional[str] = None
-    outcome: Optional[str] = None
-    court: Optional[str] = None
-    limit: int = 10
-
-
-class SearchSimilarRequest(BaseModel):
-    query: str
-    section_type: Optional[str] = None
-    limit: int = 5
-
-
-class GetCaseRequest(BaseModel):
-    case_id: str
-
-
-class GetDocumentRequest(BaseModel):
-    document_version_id: str
-
-
-class AnalyzeJudgeRequest(BaseModel):
-    judge_name: Optional[str] = None
-    law_article: Optional[str] = None
-    party_type: Optional[str] = None
-
-
-class TriggerFetchRequest(BaseModel):
-    date_from: str
-    date_to: Optional[str] = None
-    force: bool = False  # Force re-fetch even if already exists
+async def cached_query(endpoint: str, func, db: AsyncSession, request: BaseModel, ttl: int) -> dict:
+    """Run an MCP query function through the Redis read-through cache."""
+    cache = get_cache()
+    key = cache.make_key(endpoint, request.model_dump(exclude_none=True))
+    cached = await cache.get(key)
+    if cached is not None:
+        return cached
+    
+    result = await func(db, request)
+    if "error" not in result:
+        await cache.set(key, result, ttl)
+    return result
 
 
 # API endpoints
@@ -75,28 +93,56 @@ async def health_check():
 @app.get("/metrics")
 async def metrics():
     """Prometheus metrics endpoint."""
-    return Response(
-        content=get_metrics(),
+    return StreamingResponse(
+        iter_metrics(),
         media_type=get_metrics_content_type()
     )
 
 
+@app.post("/admin/reconcile_now")
+async def admin_reconcile_now():
+    """Wake the background worker's reconciliation loop immediately."""
+    receivers = await publish_trigger("reconciliation")
+    return {"status": "triggered" if receivers else "no_worker_listening", "receivers": receivers}
+
+
+@app.post("/admin/discover_now")
+async def admin_discover_now():
+    """Wake the background worker's discovery loop immediately."""
+    receivers = await publish_trigger("discovery")
+    return {"status": "triggered" if receivers else "no_worker_listening", "receivers": receivers}
+
+
 @app.post("/api/find_cases")
-async def api_find_cases(request: FindCasesRequest, db: Session = Depends(get_db)):
+async def api_find_cases(request: FindCasesRequest, db: AsyncSession = Depends(get_db)):
     """Find cases by criteria."""
     try:
-        result = await find_cases(db, request.dict())
+        result = await cached_query("find_cases", find_cases, db, request, settings.cache_ttl_seconds)
         return result
     except Exception as e:
         logger.error(f"Error in find_cases: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/find_cases/stream")
+async def api_find_cases_stream(request: FindCasesRequest, db: AsyncSession = Depends(get_db)):
+    """Find cases by criteria, streamed as JSON Lines (one case per line)."""
+    result = await cached_query("find_cases", find_cases, db, request, settings.cache_ttl_seconds)
+    if "error" in result:
+        logger.error(f"Error in find_cases: {result['error']}")
+        raise HTTPException(status_code=500, detail=result["error"])
+    
+    return StreamingResponse(
+        (orjson.dumps(case) + b"\n" for case in result["cases"]),
+        media_type="application/x-ndjson"
+    )
+
+
 @app.post("/api/search_similar")
-async def api_search_similar(request: SearchSimilarRequest, db: Session = Depends(get_db)):
+async def api_search_similar(request: SearchSimilarRequest, db: AsyncSession = Depends(get_db)):
     """Search for similar cases."""
     try:
-        result = await search_similar_cases(db, request.dict())
+        result = await search_similar_cases(db, request)
         return result
     except Exception as e:
         logger.error(f"Error in search_similar_cases: {e}")
@@ -104,10 +150,10 @@ async def api_search_similar(request: SearchSimilarRequest, db: Session = Depend
 
 
 @app.post("/api/case_details")
-async def api_case_details(request: GetCaseRequest, db: Session = Depends(get_db)):
+async def api_case_details(request: GetCaseRequest, db: AsyncSession = Depends(get_db)):
     """Get case details."""
     try:
-        result = await get_case_details(db, request.dict())
+        result = await cached_query("case_details", get_case_details, db, request, settings.cache_ttl_seconds)
         return result
     except Exception as e:
         logger.error(f"Error in get_case_details: {e}")
@@ -115,10 +161,10 @@ async def api_case_details(request: GetCaseRequest, db: Session = Depends(get_db
 
 
 @app.post("/api/document")
-async def api_document(request: GetDocumentRequest, db: Session = Depends(get_db)):
+async def api_document(request: GetDocumentRequest, db: AsyncSession = Depends(get_db)):
     """Get document details."""
     try:
-        result = await get_document(db, request.dict())
+        result = await cached_query("document", get_document, db, request, settings.cache_ttl_seconds)
         return result
     except Exception as e:
         logger.error(f"Error in get_document: {e}")
@@ -126,10 +172,10 @@ async def api_document(request: GetDocumentRequest, db: Session = Depends(get_db
 
 
 @app.post("/api/analyze_judge")
-async def api_analyze_judge(request: AnalyzeJudgeRequest, db: Session = Depends(get_db)):
+async def api_analyze_judge(request: AnalyzeJudgeRequest, db: AsyncSession = Depends(get_db)):
     """Analyze judge patterns."""
     try:
-        result = await analyze_judge_patterns(db, request.dict())
+        result = await cached_query("analyze_judge", analyze_judge_patterns, db, request, settings.cache_judge_ttl_seconds)
         return result
     except Exception as e:
         logger.error(f"Error in analyze_judge_patterns: {e}")
@@ -137,14 +183,9 @@ async def api_analyze_judge(request: AnalyzeJudgeRequest, db: Session = Depends(
 
 
 @app.post("/api/trigger_fetch")
-async def api_trigger_fetch(request: TriggerFetchRequest, db: Session = Depends(get_db)):
+async def api_trigger_fetch(request: TriggerFetchRequest, db: AsyncSession = Depends(get_db)):
     """Trigger fetching cases from registry for a specific date range."""
     try:
-        from services.change_monitor import ChangeMonitor
-        from services.kafka_client import get_producer
-        from datetime import datetime
-        from models import DocumentVersion
-        
         # Validate date format
         try:
             date_from_obj = datetime.strptime(request.date_from, "%Y-%m-%d")
@@ -152,88 +193,80 @@ async def api_trigger_fetch(request: TriggerFetchRequest, db: Session = Depends(
         except ValueError as e:
             raise HTTPException(status_code=400, detail=f"Invalid date format: {e}")
         
-        # Initialize services
+        # Initialize services (the shared HTTP client keeps registry connections warm)
         monitor = ChangeMonitor()
         kafka_producer = get_producer()
         
-        try:
-            # Search registry for cases in date range
-            search_url = f"{settings.court_registry_base_url}{settings.court_registry_search_endpoint}"
-            params = {
-                "date_from": request.date_from,
-                "date_to": request.date_to or datetime.utcnow().strftime("%Y-%m-%d")
-            }
-            
-            logger.info(f"Triggering fetch for date range: {request.date_from} to {params['date_to']}")
-            
-            # Use monitor's HTTP client to search
-            response = await monitor.http_client.get(search_url, params=params)
-            response.raise_for_status()
-            
-            # Parse search results
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = soup.find_all('a', href=True)
-            
-            discovered_count = 0
-            queued_count = 0
-            skipped_count = 0
-            failed_count = 0
-            
-            for link in links:
-                href = link.get('href', '')
-                if '/Document/' in href or '/Case/' in href:
-                    full_url = monitor._make_absolute_url(href)
-                    doc_id = monitor._extract_doc_id_from_url(full_url)
-                    
-                    if not doc_id:
-                        continue
-                    
-                    discovered_count += 1
-                    
-                    # Check if already exists (unless force)
-                    if not request.force:
-                        existing = db.query(DocumentVersion).filter(
-                            DocumentVersion.source_url == full_url
-                        ).first()
-                        if existing:
-                            skipped_count += 1
-                            continue
-                    
-                    # Publish to Kafka for background processing
-                    try:
-                        kafka_producer.publish_discovered(
-                            doc_id=doc_id,
-                            case_id='',  # Will be extracted during parsing
-                            url=full_url,
-                            hash_hint=None
-                        )
-                        queued_count += 1
-                    except Exception as e:
-                        logger.error(f"Error queuing document {doc_id}: {e}")
-                        failed_count += 1
-            
-            result = {
-                "status": "completed",
-                "discovered": discovered_count,
-                "queued": queued_count,
-                "skipped": skipped_count,
-                "failed": failed_count,
-                "date_from": request.date_from,
-                "date_to": params['date_to'],
-                "message": f"Discovered {discovered_count} documents, queued {queued_count} for processing"
-            }
-            
-            return result
-            
-        finally:
-            await monitor.close()
-            
+        # Search registry for cases in date range
+        params = {
+            "date_from": request.date_from,
+            "date_to": request.date_to or datetime.utcnow().strftime("%Y-%m-%d")
+        }
+        
+        logger.info(f"Triggering fetch for date range: {request.date_from} to {params['date_to']}")
+        
+        response = await monitor.http_client.get(settings.search_url, params=params)
+        response.raise_for_status()
+        
+        # Links follow a fixed pattern, so scan the raw bytes instead of parsing HTML (dedup keeps page order)
+        hrefs = list(dict.fromkeys(
+            match.group(1).decode() for match in DOCUMENT_HREF_RE.finditer(response.content)
+        ))
+        
+        # First pass: resolve candidate documents without touching the DB
+        candidates = []
+        for href in hrefs:
+            full_url = monitor._make_absolute_url(href)
+            doc_id = monitor._extract_doc_id_from_url(full_url)
+            if doc_id:
+                candidates.append((doc_id, full_url))
+        
+        discovered_count = len(candidates)
+        
+        # Let Postgres anti-join the candidates against existing versions in one round trip (unless force)
+        if not request.force and candidates:
+            rows = await db.execute(NEW_CANDIDATES_SQL, {
+                "doc_ids": [doc_id for doc_id, _ in candidates],
+                "urls": [url for _, url in candidates]
+            })
+            candidates = rows.all()
+        
+        to_publish = [
+            {"doc_id": doc_id, "case_id": '', "url": full_url}  # case_id is extracted during parsing
+            for doc_id, full_url in candidates
+        ]
+        skipped_count = discovered_count - len(to_publish)
+        
+        # Publish to Kafka for background processing in a single batch
+        queued_count, failed_count = await kafka_producer.publish_discovered_batch(to_publish)
+        
+        result = {
+            "status": "completed",
+            "discovered": discovered_count,
+            "queued": queued_count,
+            "skipped": skipped_count,
+            "failed": failed_count,
+            "date_from": request.date_from,
+            "date_to": params['date_to'],
+            "message": f"Discovered {discovered_count} documents, queued {queued_count} for processing"
+        }
+        
+        return result
+        
     except Exception as e:
         logger.error(f"Error in trigger_fetch: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run(app, host=settings.mcp_server_host, port=settings.mcp_server_port)
+    uvicorn.run(
+        "api_server:app",
+        host=settings.mcp_server_host,
+        port=settings.mcp_server_port,
+        loop="uvloop",
+        http="httptools",
+        workers=settings.api_workers or os.cpu_count(),
+        log_level="info"
+    )
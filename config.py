@@ -1,6 +1,8 @@
 """Configuration management for Court Registry MCP Server."""
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from functools import cached_property
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -15,53 +17,61 @@ class Settings(BaseSettings):
     postgres_db: str = "court_registry"
     postgres_user: str = "court_user"
     postgres_password: str
+    postgres_pgbouncer: bool = False  # Set when POSTGRES_HOST/PORT point at a transaction-mode PgBouncer
     
     # Redis
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_password: Optional[str] = None
     redis_db: int = 0
+    cache_ttl_seconds: int = 60
+    cache_judge_ttl_seconds: int = 600
     
     # Kafka
     kafka_bootstrap_servers: str = "localhost:9092"
     kafka_enabled: bool = True
     kafka_auto_create_topics: bool = True
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
-        # Allow environment variables to override defaults
-        fields = {
-            'kafka_bootstrap_servers': {'env': 'KAFKA_BOOTSTRAP_SERVERS'}
-        }
+    kafka_linger_ms: int = 50
+    kafka_batch_size: int = 262144
+    kafka_compression_type: str = "lz4"
     
     # MCP Server
     mcp_server_port: int = 8000
     mcp_server_host: str = "0.0.0.0"
+    api_workers: Optional[int] = None  # api_server.py standalone only; defaults to os.cpu_count()
     
     # Court Registry
     court_registry_base_url: str = "https://reyestr.court.gov.ua"
     court_registry_search_endpoint: str = "/Search"
     court_registry_rss_endpoint: str = "/RSS"
+    court_registry_user_agent: str = "court-registry-mcp/1.0"  # Identifies our requests to the registry
     
     # Fetcher
     # Note: fetcher_workers must be set in .env file as FETCHER_WORKERS
     fetcher_workers: int  # Required: set FETCHER_WORKERS in .env
     fetcher_max_retries: int = 3
     fetcher_timeout: int = 30
+    fetcher_requests_per_second: float = 10.0  # Token-bucket rate for registry document requests
+    fetcher_max_retry_after: int = 300  # Cap (seconds) on a server-sent Retry-After wait
     
     # Parser
     parser_version: str = "1.0.0"
     parser_confidence_threshold: float = 0.7
+    parser_workers: Optional[int] = None  # Parse process pool size, defaults to os.cpu_count()
     
     # Embedding
     embedding_model: str = "text-embedding-3-small"
     embedding_batch_size: int = 100
     embedding_chunk_size: int = 512
+    embedding_concurrency: int = 4  # Embedding batch requests in flight at once
+    embedding_max_retries: int = 5  # OpenAI client retries (exponential backoff, honors 429 Retry-After)
+    query_embedding_cache_size: int = 4096
+    query_embedding_cache_ttl_seconds: int = 3600
     
     # Storage
     storage_type: str = "minio"
     storage_path: str = "/app/storage"
+    content_hash_algorithm: str = "sha256"  # "sha256" or "blake3"; used for source_hash change detection
     minio_endpoint: str = "localhost:9000"
     minio_access_key: str = "minioadmin"
     minio_secret_key: str = "minioadmin"
@@ -71,7 +81,10 @@ class Settings(BaseSettings):
     
     # Monitoring
     discovery_interval_minutes: int = 10
+    known_url_filter_capacity: int = 10_000_000  # Bloom filter size for stored source URLs (needs rbloom)
+    known_url_filter_error_rate: float = 1e-7
     reconciliation_interval_hours: int = 24
+    metrics_cache_ttl_seconds: float = 1.0  # /metrics scrapes within this window reuse one exposition
     
     # Logging
     log_level: str = "INFO"
@@ -84,6 +97,26 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         case_sensitive = False
+    
+    @cached_property
+    def search_url(self) -> str:
+        """Full court registry search URL."""
+        return self.court_registry_base_url + self.court_registry_search_endpoint
+    
+    @field_validator("allowed_origins")
+    @classmethod
+    def validate_allowed_origins(cls, value: str) -> str:
+        """Reject malformed CORS origins at startup rather than silently never matching them."""
+        for origin in (o.strip() for o in value.split(",")):
+            if origin and origin != "*" and "://" not in origin:
+                raise ValueError(f"Invalid CORS origin (expected scheme://host[:port]): {origin}")
+        return value
+    
+    @cached_property
+    def allowed_origins_list(self) -> List[str]:
+        """CORS origins parsed from the comma-separated setting."""
+        origins = [origin.strip().rstrip("/") for origin in self.allowed_origins.split(",") if origin.strip()]
+        return ["*"] if "*" in origins else origins
 
 
 settings = Settings()
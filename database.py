@@ -1,35 +1,88 @@
 """Database connection and session management."""
-from sqlalchemy import create_engine
+import orjson
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from pgvector.asyncpg import register_vector
 from config import settings
 
-# Create database URL
+# Create database URLs (sync driver for background workers, asyncpg for the API)
 DATABASE_URL = (
     f"postgresql://{settings.postgres_user}:{settings.postgres_password}"
     f"@{settings.postgres_host}:{settings.postgres_port}/{settings.postgres_db}"
 )
+ASYNC_DATABASE_URL = (
+    f"postgresql+asyncpg://{settings.postgres_user}:{settings.postgres_password}"
+    f"@{settings.postgres_host}:{settings.postgres_port}/{settings.postgres_db}"
+)
+
+# Create engine (LIFO reuse keeps a small set of hot connections busy)
+# Compiled-SQL cache entries per engine; dynamic filter combinations each take one
+QUERY_CACHE_SIZE = 1200
+
+
+def json_serializer(value) -> str:
+    """Serialize JSON/JSONB column values (e.g. parsed_json) with orjson."""
+    return orjson.dumps(value, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS).decode()
+
 
-# Create engine
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=1800,
+    pool_use_lifo=True,
+    json_serializer=json_serializer,
+    json_deserializer=orjson.loads,
     echo=False
 )
 
-# Create session factory
+# Create async engine for request handlers, so queries don't block the event loop
+if settings.postgres_pgbouncer:
+    # PgBouncer owns connection pooling; in transaction mode server connections are
+    # shared between clients, so asyncpg's per-connection prepared statements must be off
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=NullPool,
+        connect_args={"statement_cache_size": 0, "prepared_statement_cache_size": 0},
+        query_cache_size=QUERY_CACHE_SIZE,
+        json_serializer=json_serializer,
+        json_deserializer=orjson.loads,
+        echo=False
+    )
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_pre_ping=True,
+        pool_size=20,
+        max_overflow=40,
+        pool_recycle=1800,
+        pool_use_lifo=True,
+        query_cache_size=QUERY_CACHE_SIZE,
+        json_serializer=json_serializer,
+        json_deserializer=orjson.loads,
+        echo=False
+    )
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _register_vector_codec(dbapi_connection, connection_record):
+    """Exchange pgvector values in binary form (numpy float32 arrays) on asyncpg connections."""
+    dbapi_connection.run_async(register_vector)
+
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Get database session."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Get async database session."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
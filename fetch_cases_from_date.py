@@ -2,12 +2,74 @@
 """
 Script to fetch all cases registered from a specific date from the deployed backend on gate server.
 """
-import requests
-import json
+import httpx
+import ijson
+import orjson
 import sys
 import os
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+
+def create_session() -> httpx.Client:
+    """Create an HTTP/2 client that can be shared across fetch_cases calls."""
+    return httpx.Client(
+        http2=True,
+        timeout=60,
+        headers={"Content-Type": "application/json"}
+    )
+
+
+def print_case_summary(case_count: int, first_cases: List[Dict[str, Any]]):
+    """Print the number of fetched cases and the first few of them."""
+    print(f"\nSuccessfully fetched {case_count} cases")
+    
+    if first_cases:
+        print("\nFirst few cases:")
+        for i, case in enumerate(first_cases, 1):
+            registry_num = case.get("registry_number", "N/A")
+            opened_at = case.get("opened_at", "N/A")
+            status = case.get("status", "N/A")
+            print(f"  {i}. {registry_num} - Opened: {opened_at} - Status: {status}")
+
+
+def stream_cases_to_jsonl(
+    session: httpx.Client,
+    api_url: str,
+    payload: Dict[str, Any],
+    output_file: str
+) -> Dict[str, Any]:
+    """
+    Stream the find_cases response to a JSON Lines file one case at a time.
+    
+    The body is fed incrementally into ijson, so peak memory stays at roughly
+    one case regardless of how many cases the response contains.
+    """
+    case_count = 0
+    first_cases = []
+    
+    with session.stream("POST", api_url, json=payload) as response:
+        if response.is_error:
+            response.read()
+        response.raise_for_status()
+        
+        cases = ijson.sendable_list()
+        coro = ijson.items_coro(cases, "cases.item")
+        with open(output_file, 'wb') as f:
+            for chunk in response.iter_bytes():
+                coro.send(chunk)
+                for case in cases:
+                    f.write(orjson.dumps(case, option=orjson.OPT_NAIVE_UTC) + b"\n")
+                    case_count += 1
+                    if len(first_cases) < 5:
+                        first_cases.append(case)
+                del cases[:]
+            coro.close()
+    
+    print_case_summary(case_count, first_cases)
+    print(f"\nResults saved to: {output_file}")
+    
+    return {"count": case_count, "output_file": output_file}
 
 
 def fetch_cases(
@@ -15,7 +77,8 @@ def fetch_cases(
     date_from: str = "2026-01-01",
     date_to: Optional[str] = None,
     limit: int = 1000,
-    output_file: Optional[str] = None
+    output_file: Optional[str] = None,
+    session: Optional[httpx.Client] = None
 ) -> Dict[str, Any]:
     """
     Fetch cases from the backend API.
@@ -26,9 +89,11 @@ def fetch_cases(
         date_to: End date in YYYY-MM-DD format (optional)
         limit: Maximum number of cases to fetch
         output_file: Optional file path to save the results as JSON
+            (a .jsonl path streams cases to disk as JSON Lines)
+        session: Optional HTTP client reused across calls (keeps the connection alive)
     
     Returns:
-        Dictionary containing the API response
+        Dictionary containing the API response (only the case count when streaming to .jsonl)
     """
     # Construct the API endpoint URL
     api_url = f"{gate_server_url.rstrip('/')}/api/find_cases"
@@ -45,53 +110,52 @@ def fetch_cases(
     # Make the API request
     print(f"Fetching cases from {date_from}...")
     print(f"API URL: {api_url}")
-    print(f"Payload: {json.dumps(payload, indent=2)}")
+    print(f"Payload: {orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()}")
+    
+    owns_session = session is None
+    session = session or create_session()
     
     try:
-        response = requests.post(
-            api_url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=60
-        )
+        if output_file and output_file.endswith(".jsonl"):
+            return stream_cases_to_jsonl(session, api_url, payload, output_file)
+        
+        response = session.post(api_url, json=payload)
         
         # Check if request was successful
         response.raise_for_status()
         
         # Parse the response
-        result = response.json()
+        result = orjson.loads(response.content)
         
         # Print summary
         if isinstance(result, dict):
-            case_count = len(result.get("cases", []))
-            print(f"\nSuccessfully fetched {case_count} cases")
-            
-            if case_count > 0 and "cases" in result:
-                print("\nFirst few cases:")
-                for i, case in enumerate(result["cases"][:5], 1):
-                    registry_num = case.get("registry_number", "N/A")
-                    opened_at = case.get("opened_at", "N/A")
-                    status = case.get("status", "N/A")
-                    print(f"  {i}. {registry_num} - Opened: {opened_at} - Status: {status}")
+            cases = result.get("cases", [])
+            print_case_summary(len(cases), cases[:5])
         
         # Save to file if requested
         if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_NAIVE_UTC))
             print(f"\nResults saved to: {output_file}")
         
         return result
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error making request: {e}", file=sys.stderr)
-        if hasattr(e, 'response') and e.response is not None:
+        if isinstance(e, httpx.HTTPStatusError):
             print(f"Response status: {e.response.status_code}", file=sys.stderr)
             print(f"Response body: {e.response.text}", file=sys.stderr)
         sys.exit(1)
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}", file=sys.stderr)
         print(f"Response text: {response.text}", file=sys.stderr)
         sys.exit(1)
+    except ijson.JSONError as e:
+        print(f"Error parsing streamed JSON response: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if owns_session:
+            session.close()
 
 
 def main():
@@ -126,7 +190,7 @@ def main():
         "--output",
         "-o",
         default=None,
-        help="Output file path to save results as JSON (optional)"
+        help="Output file path to save results as JSON, or as JSON Lines if it ends in .jsonl (optional)"
     )
     
     args = parser.parse_args()
@@ -148,13 +212,15 @@ def main():
             sys.exit(1)
     
     # Fetch cases
-    result = fetch_cases(
-        gate_server_url=args.gate_server,
-        date_from=args.date_from,
-        date_to=args.date_to,
-        limit=args.limit,
-        output_file=args.output
-    )
+    with create_session() as session:
+        result = fetch_cases(
+            gate_server_url=args.gate_server,
+            date_from=args.date_from,
+            date_to=args.date_to,
+            limit=args.limit,
+            output_file=args.output,
+            session=session
+        )
     
     return result
 
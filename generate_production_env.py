@@ -11,21 +11,20 @@ from pathlib import Path
 def generate_password(length=32, include_special=False):
     """Generate a secure random password (alphanumeric only by default)."""
     alphabet = string.ascii_letters + string.digits
+    # Largest multiple of len(alphabet) below 256; higher bytes are dropped so b % 62 stays unbiased
+    limit = 256 - 256 % len(alphabet)
     
-    # Ensure at least one of each type
-    password = [
-        secrets.choice(string.ascii_lowercase),
-        secrets.choice(string.ascii_uppercase),
-        secrets.choice(string.digits),
-    ]
-    
-    # Fill the rest randomly
-    password.extend(secrets.choice(alphabet) for _ in range(length - len(password)))
-    
-    # Shuffle
-    secrets.SystemRandom().shuffle(password)
-    
-    return ''.join(password)
+    while True:
+        # One entropy read per attempt; 2x bytes leaves headroom for rejected ones
+        chars = [alphabet[b % len(alphabet)] for b in secrets.token_bytes(length * 2) if b < limit]
+        password = ''.join(chars[:length])
+        
+        # Ensure at least one of each type (regenerating is rarely needed)
+        if (len(password) == length
+                and any(c.islower() for c in password)
+                and any(c.isupper() for c in password)
+                and any(c.isdigit() for c in password)):
+            return password
 
 
 def generate_secret_key(length=64):
@@ -37,7 +36,8 @@ def escape_for_env(value):
     """Escape special characters for .env file."""
     # If value contains spaces or special chars, wrap in quotes
     if any(c in value for c in [' ', '$', '"', "'", '\\']):
-        return f'"{value.replace('"', '\\"')}"'
+        escaped = value.replace('"', '\\"')
+        return f'"{escaped}"'
     return value
 
 
@@ -1,5 +1,6 @@
 -- Enable pgvector extension
 CREATE EXTENSION IF NOT EXISTS vector;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Core Entities
 CREATE TABLE IF NOT EXISTS courts (
@@ -153,7 +154,7 @@ CREATE TABLE IF NOT EXISTS embedding_chunks (
     section_id UUID REFERENCES document_sections(id),
     chunk_index INTEGER NOT NULL,
     text TEXT NOT NULL,
-    embedding_vector vector(1536),
+    embedding_vector halfvec(1536),
     token_count INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -179,13 +180,30 @@ CREATE INDEX IF NOT EXISTS idx_cases_registry_number ON cases(registry_number);
 CREATE INDEX IF NOT EXISTS idx_documents_case_id ON documents(case_id);
 CREATE INDEX IF NOT EXISTS idx_document_versions_document_id ON document_versions(document_id);
 CREATE INDEX IF NOT EXISTS idx_document_versions_source_hash ON document_versions(source_hash);
+CREATE INDEX IF NOT EXISTS idx_document_versions_source_url ON document_versions(source_url);
 CREATE INDEX IF NOT EXISTS idx_parties_normalized_name ON parties(normalized_name);
 CREATE INDEX IF NOT EXISTS idx_case_parties_case_id ON case_parties(case_id);
 CREATE INDEX IF NOT EXISTS idx_case_parties_party_id ON case_parties(party_id);
 CREATE INDEX IF NOT EXISTS idx_document_sections_document_version_id ON document_sections(document_version_id);
-CREATE INDEX IF NOT EXISTS idx_document_sections_section_type ON document_sections(section_type);
+-- Covers the section_type filter of similarity search (index-only lookups of id/document_version_id)
+DROP INDEX IF EXISTS idx_document_sections_section_type;
+CREATE INDEX IF NOT EXISTS idx_document_sections_type_version ON document_sections(section_type, document_version_id) INCLUDE (id);
 CREATE INDEX IF NOT EXISTS idx_embedding_chunks_section_id ON embedding_chunks(section_id);
-CREATE INDEX IF NOT EXISTS idx_embedding_chunks_vector ON embedding_chunks USING ivfflat (embedding_vector vector_cosine_ops);
+-- HNSW replaces the earlier IVFFlat index (built on an empty table, so its lists were useless)
+DROP INDEX IF EXISTS idx_embedding_chunks_vector;
+-- Embeddings are stored in half precision; convert tables created with vector(1536) (and their index)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'embedding_chunks' AND column_name = 'embedding_vector' AND udt_name = 'vector'
+    ) THEN
+        DROP INDEX IF EXISTS idx_embedding_chunks_vector_hnsw;
+        ALTER TABLE embedding_chunks
+            ALTER COLUMN embedding_vector TYPE halfvec(1536) USING embedding_vector::halfvec(1536);
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS idx_embedding_chunks_vector_hnsw ON embedding_chunks USING hnsw (embedding_vector halfvec_cosine_ops) WITH (m = 16, ef_construction = 200);
 CREATE INDEX IF NOT EXISTS idx_case_relations_parent ON case_relations(parent_case_id);
 CREATE INDEX IF NOT EXISTS idx_case_relations_child ON case_relations(child_case_id);
 CREATE INDEX IF NOT EXISTS idx_document_relations_parent ON document_relations(parent_document_version_id);
@@ -195,6 +213,25 @@ CREATE INDEX IF NOT EXISTS idx_entity_mentions_document_version ON entity_mentio
 CREATE INDEX IF NOT EXISTS idx_entity_mentions_entity ON entity_mentions(entity_type, entity_id);
 CREATE INDEX IF NOT EXISTS idx_search_index_entity ON search_index(entity_type, entity_id);
 
+-- Trigram indexes for the substring (ILIKE '%...%') filters of find_cases / analyze_judge_patterns
+CREATE INDEX IF NOT EXISTS idx_parties_normalized_name_trgm ON parties USING gin (normalized_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_courts_name_trgm ON courts USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_judges_full_name_trgm ON judges USING gin (full_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_law_articles_code_trgm ON law_articles USING gin (code gin_trgm_ops);
+
+-- Party and court names are matched by substring through the trigram indexes above;
+-- drop the full-text columns (and their indexes) that earlier schema versions created
+ALTER TABLE parties DROP COLUMN IF EXISTS name_tsv;
+ALTER TABLE courts DROP COLUMN IF EXISTS name_tsv;
+
+-- Judge who decided a document version (set at ingest), so judge statistics join on the actual decision
+ALTER TABLE document_versions ADD COLUMN IF NOT EXISTS presiding_judge_id UUID REFERENCES judges(id);
+CREATE INDEX IF NOT EXISTS idx_document_versions_presiding_judge ON document_versions(presiding_judge_id);
+
+-- HTTP validators of the last fetch, for conditional GETs (If-None-Match / If-Modified-Since)
+ALTER TABLE document_versions ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE document_versions ADD COLUMN IF NOT EXISTS last_modified TEXT;
+
 -- Update timestamps trigger
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
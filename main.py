@@ -1,27 +1,42 @@
 """Main entry point - runs all services in a single container."""
 import asyncio
+import csv
+import io
 import logging
 import signal
-import sys
+import socket
+import ssl
 import os
 import subprocess
 import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import accumulate, chain
 from multiprocessing import Process
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+from cachetools import TTLCache
+from sqlalchemy import func, select
 from config import settings
-from database import engine, Base
+from database import engine, Base, SessionLocal
+from models import DocumentVersion, Document, Case, DocumentSection, Judge
 from services.change_monitor import ChangeMonitor
 from services.fetcher import FetcherPool
 from services.parser import Parser
 from services.embeddings import EmbeddingService
 from services.kafka_client import get_producer, close_producer
+from services.cache import get_cache, close_cache, CACHED_QUERY_ENDPOINTS
+from services.http_client import close_http_client
+from services.triggers import listen_for_triggers, wait_for_trigger
 from services.metrics import (
-    documents_discovered, documents_fetched, documents_parsed,
-    document_processing_duration, active_document_processing,
+    documents_discovered, DOCUMENTS_FETCHED, DOCUMENTS_PARSED,
+    PROCESSING_DURATION, ACTIVE_PROCESSING,
     embeddings_generated, embedding_generation_duration
 )
 from api_server import app
 import uvicorn
+import uvloop
 
 # Configure logging
 logging.basicConfig(
@@ -31,6 +46,68 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Document versions checked per reconciliation cycle, streamed in partitions
+RECONCILIATION_BATCH_SIZE = 100
+RECONCILIATION_PARTITION_SIZE = 20
+
+# Bulk load of embedding chunks (CSV rows built by insert_sections)
+EMBEDDING_CHUNK_COPY_SQL = (
+    "COPY embedding_chunks (id, section_id, chunk_index, text, embedding_vector, token_count) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+# Discovery pipeline queue sizes (bound how many documents sit between stages)
+PIPELINE_FETCH_QUEUE_SIZE = 16
+PIPELINE_PARSE_QUEUE_SIZE = 16
+PIPELINE_EMBED_QUEUE_SIZE = 8
+PIPELINE_DB_QUEUE_SIZE = 32
+
+# End-of-stream marker passed between pipeline stages
+PIPELINE_DONE = object()
+
+# Parser instance of a parse pool worker process (set by _init_parse_worker)
+_worker_parser = None
+
+# Upper bound on waiting for the MinIO child process to open its port
+MINIO_READY_TIMEOUT = 15
+
+# registry_number -> case id; many documents of one discovery batch share a case
+case_id_cache = TTLCache(maxsize=10000, ttl=300)
+
+
+@dataclass(slots=True)
+class ParsedView:
+    """Fields of a parser result that document processing reads, pulled out once."""
+    court: Optional[str]
+    judge: Optional[str]
+    parties: Dict[str, Any]
+    date: Optional[str]
+    case_number: Optional[str]
+    text_blocks: Sequence[Dict[str, Any]]
+    law_refs: List[str]
+    
+    @classmethod
+    def from_parsed(cls, d: Dict[str, Any]) -> "ParsedView":
+        return cls(
+            d.get('court'),
+            d.get('judge'),
+            d.get('parties') or {},
+            d.get('date'),
+            d.get('case_number'),
+            d.get('text_blocks') or (),
+            d.get('law_references') or []
+        )
+    
+    def entities(self) -> Dict[str, Any]:
+        """Entity payload for the parsed event."""
+        return {
+            'court': self.court,
+            'judge': self.judge,
+            'parties': self.parties,
+            'date': self.date
+        }
+
+
 def init_database():
     """Initialize database tables."""
     try:
@@ -40,17 +117,39 @@ def init_database():
         logger.error(f"Error initializing database: {e}")
 
 
+def _init_parse_worker():
+    """Set up the Parser used by this parse pool worker process."""
+    global _worker_parser
+    _worker_parser = Parser.get_default()
+
+
+def _parse_task(content: bytes, content_type: str, url: str) -> Dict:
+    """Parse a document inside a parse pool worker process."""
+    return _worker_parser.parse(content, content_type, url)
+
+
+async def parse_in_pool(parse_pool, content: bytes, content_type: str, url: str) -> Dict:
+    """Parse a document in the process pool so parsing neither blocks the event loop nor holds its GIL."""
+    return await asyncio.get_running_loop().run_in_executor(
+        parse_pool, _parse_task, content, content_type, url
+    )
+
+
+def get_minio_port() -> int:
+    """Parse the MinIO port from the configured endpoint."""
+    endpoint = settings.minio_endpoint
+    if ':' in endpoint:
+        _, port = endpoint.split(':')
+        return int(port)
+    return 9000
+
+
 def run_minio_server():
     """Run MinIO server."""
     minio_data_dir = Path("/app/minio-data")
     minio_data_dir.mkdir(parents=True, exist_ok=True)
     
-    # Parse MinIO endpoint to get port
-    endpoint = settings.minio_endpoint
-    if ':' in endpoint:
-        _, port = endpoint.split(':')
-    else:
-        port = "9000"
+    port = get_minio_port()
     
     # Set MinIO environment variables
     env = os.environ.copy()
@@ -73,41 +172,53 @@ def run_minio_server():
         logger.error(f"MinIO server error: {e}")
 
 
-def run_api_server():
-    """Run FastAPI server."""
-    uvicorn.run(
-        app,
-        host=settings.mcp_server_host,
-        port=settings.mcp_server_port,
-        log_level=settings.log_level.lower()
-    )
+def wait_for_port(host: str, port: int, timeout: float = MINIO_READY_TIMEOUT) -> bool:
+    """Poll until host:port accepts TCP connections; returns False on timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.1):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
 
 
 async def run_background_services():
     """Run background services (monitor, fetcher, parser, embeddings)."""
-    from database import SessionLocal
-    from models import DocumentVersion, Document, Case, DocumentSection, EmbeddingChunk
-    from services.parser import Parser
-    from services.embeddings import EmbeddingService
-    import uuid
-    
-    monitor = None
-    fetcher = None
-    parser = None
+    parse_pool = None
     embedding_service = None
+    listener_task = None
     
     try:
         # Initialize services
-        monitor = ChangeMonitor()
+        # Both use the shared HTTP client, so discovery and fetching reuse one connection pool
         fetcher = FetcherPool()
-        parser = Parser()
+        monitor = ChangeMonitor()
+        parse_pool = ProcessPoolExecutor(
+            max_workers=settings.parser_workers or os.cpu_count(),
+            initializer=_init_parse_worker
+        )
         embedding_service = EmbeddingService()
         
+        # Events that wake a loop before its interval elapses (set via /admin or SIGUSR1)
+        discovery_trigger = asyncio.Event()
+        reconcile_trigger = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, reconcile_trigger.set)
+        listener_task = asyncio.create_task(listen_for_triggers({
+            "discovery": discovery_trigger,
+            "reconciliation": reconcile_trigger
+        }))
+        
         # Start discovery loop (runs continuously)
-        discovery_task = asyncio.create_task(run_discovery_loop(monitor, fetcher, parser, embedding_service))
+        discovery_task = asyncio.create_task(
+            run_discovery_loop(monitor, fetcher, parse_pool, embedding_service, discovery_trigger)
+        )
         
         # Start reconciliation loop (runs periodically)
-        reconciliation_task = asyncio.create_task(run_reconciliation_loop(monitor, fetcher, parser, embedding_service))
+        reconciliation_task = asyncio.create_task(
+            run_reconciliation_loop(monitor, fetcher, parse_pool, embedding_service, reconcile_trigger)
+        )
         
         # Wait for both tasks
         await asyncio.gather(discovery_task, reconciliation_task)
@@ -115,165 +226,174 @@ async def run_background_services():
     except Exception as e:
         logger.error(f"Error in background services: {e}", exc_info=True)
     finally:
-        if monitor:
-            await monitor.close()
-        if fetcher:
-            await fetcher.close()
-        close_producer()
+        if listener_task:
+            listener_task.cancel()
+        await close_http_client()
+        if parse_pool:
+            parse_pool.shutdown(cancel_futures=True)
+        await close_producer()
+        await close_cache()
 
 
-async def run_discovery_loop(monitor, fetcher, parser, embedding_service):
+async def run_discovery_loop(monitor, fetcher, parse_pool, embedding_service, trigger):
     """Run discovery loop to find new documents."""
-    from database import SessionLocal
-    from models import DocumentVersion, Document, Case, DocumentSection, EmbeddingChunk
-    import uuid
-    
     kafka_producer = get_producer()
+    discovery_interval = settings.discovery_interval_minutes * 60
     
     while True:
         try:
-            db = SessionLocal()
-            try:
-                discovered = await monitor.discover_documents(db)
+            # Discovery opens its own sessions for the lookups, in worker threads
+            discovered = await monitor.discover_documents()
+            
+            if discovered:
+                logger.info(f"Discovered {len(discovered)} documents, processing...")
+                documents_discovered.inc(len(discovered))
                 
-                if discovered:
-                    logger.info(f"Discovered {len(discovered)} documents, processing...")
-                    documents_discovered.inc(len(discovered))
-                    
-                    # Process discovered documents
-                    for doc_info in discovered:
-                        doc_id = doc_info.get('doc_id') or str(uuid.uuid4())
-                        case_id = doc_info.get('case_id', '')
-                        url = doc_info.get('url', '')
-                        hash_hint = doc_info.get('hash_hint')
-                        
-                        # Publish discovery event to Kafka
-                        try:
-                            kafka_producer.publish_discovered(
-                                doc_id=doc_id,
-                                case_id=case_id,
-                                url=url,
-                                hash_hint=hash_hint
-                            )
-                        except Exception as e:
-                            logger.warning(f"Failed to publish discovery event: {e}")
-                        
-                        try:
-                            await process_discovered_document(
-                                db, doc_info, fetcher, parser, embedding_service, kafka_producer
-                            )
-                        except Exception as e:
-                            logger.error(f"Error processing document {doc_id}: {e}", exc_info=True)
-                            # Publish failure event
-                            try:
-                                kafka_producer.publish_failed(
-                                    doc_id=doc_id,
-                                    stage='discovery',
-                                    error=str(e),
-                                    error_details={'url': url}
-                                )
-                            except Exception as kafka_err:
-                                logger.warning(f"Failed to publish failure event: {kafka_err}")
-                    
-                    db.commit()
+                # Enqueue all discovery events, then flush once so the producer can batch them
+                for doc_info in discovered:
+                    # Keep the database id as a UUID object; only the Kafka/storage key is a string
+                    doc_info['doc_uuid'] = uuid.uuid4()
+                    doc_info['doc_id'] = doc_info.get('doc_id') or str(doc_info['doc_uuid'])
+                    try:
+                        await kafka_producer.publish_discovered(
+                            doc_id=doc_info['doc_id'],
+                            case_id=doc_info.get('case_id', ''),
+                            url=doc_info.get('url', ''),
+                            hash_hint=doc_info.get('hash_hint')
+                        )
+                    except Exception as e:
+                        logger.warning(f"Failed to publish discovery event: {e}")
+                await kafka_producer.flush()
                 
-            finally:
-                db.close()
+                # Process discovered documents
+                await process_discovered_batch(
+                    discovered, fetcher, parse_pool, embedding_service, kafka_producer,
+                    on_stored=monitor.mark_stored
+                )
+                
+                await get_cache().invalidate(*CACHED_QUERY_ENDPOINTS)
             
-            await asyncio.sleep(settings.discovery_interval_minutes * 60)
+            await wait_for_trigger(trigger, discovery_interval)
             
         except Exception as e:
             logger.error(f"Error in discovery cycle: {e}", exc_info=True)
             await asyncio.sleep(60)  # Wait before retry
 
 
-async def run_reconciliation_loop(monitor, fetcher, parser, embedding_service):
+async def run_reconciliation_loop(monitor, fetcher, parse_pool, embedding_service, trigger):
     """Run reconciliation loop to detect changed documents."""
-    from database import SessionLocal
-    from models import DocumentVersion
-    from sqlalchemy import and_
+    reconciliation_interval = settings.reconciliation_interval_hours * 3600
     
     while True:
         try:
-            await asyncio.sleep(settings.reconciliation_interval_hours * 3600)
+            await wait_for_trigger(trigger, reconciliation_interval)
             
             db = SessionLocal()
             try:
-                # Get all document versions to check
-                versions = db.query(DocumentVersion).filter(
-                    DocumentVersion.source_hash.isnot(None)
-                ).limit(100).all()  # Check in batches
+                # The event loop also serves the API, so every blocking database call runs in a worker thread
+                partitions = await asyncio.to_thread(stream_versions_to_check, db)
                 
-                logger.info(f"Checking {len(versions)} documents for changes...")
+                logger.info("Checking documents for changes...")
                 
+                checked_count = 0
                 changed_count = 0
-                for version in versions:
-                    try:
-                        has_changed = await monitor.check_for_changes(db, version)
-                        if has_changed:
-                            changed_count += 1
-                            # Re-fetch and re-parse
-                            await process_changed_document(
-                                db, version, fetcher, parser, embedding_service
-                            )
-                    except Exception as e:
-                        logger.error(f"Error checking version {version.id}: {e}")
+                # Pull the next partition off the event loop so other tasks keep running meanwhile
+                while versions := await asyncio.to_thread(next, partitions, None):
+                    checked_count += len(versions)
+                    
+                    # Preload the latest version number of every document in the partition
+                    max_versions = await asyncio.to_thread(
+                        load_max_versions, db, {v.document_id for v in versions}
+                    )
+                    
+                    for version in versions:
+                        try:
+                            changed = await monitor.check_for_changes(db, version)
+                            if changed:
+                                changed_count += 1
+                                # Store and re-parse the body the check downloaded
+                                await process_changed_document(
+                                    db, version, changed, fetcher, parse_pool, embedding_service, max_versions
+                                )
+                        except Exception as e:
+                            logger.error(f"Error checking version {version.id}: {e}")
+                
+                logger.info(f"Checked {checked_count} documents for changes")
                 
+                # Also persists refreshed ETag / Last-Modified validators of unchanged documents
+                await asyncio.to_thread(db.commit)
                 if changed_count > 0:
-                    db.commit()
+                    await get_cache().invalidate(*CACHED_QUERY_ENDPOINTS)
                     logger.info(f"Processed {changed_count} changed documents")
                 
             finally:
-                db.close()
+                await asyncio.to_thread(db.close)
                 
         except Exception as e:
             logger.error(f"Error in reconciliation cycle: {e}", exc_info=True)
 
 
-async def process_discovered_document(db, doc_info, fetcher, parser, embedding_service, kafka_producer):
-    """Process a newly discovered document."""
-    from models import DocumentVersion, Document, Case, DocumentSection, EmbeddingChunk
-    import uuid
-    import hashlib
-    
+def stream_versions_to_check(db):
+    """Partitions of document versions to check, streamed instead of loading the batch up front."""
+    result = db.execute(
+        select(DocumentVersion)
+        .where(DocumentVersion.source_hash.isnot(None))
+        .limit(RECONCILIATION_BATCH_SIZE)
+        .execution_options(yield_per=RECONCILIATION_PARTITION_SIZE)
+    )
+    return result.scalars().partitions()
+
+
+def load_max_versions(db, document_ids):
+    """Map each document id to its highest version_number."""
+    return dict(
+        db.query(DocumentVersion.document_id, func.max(DocumentVersion.version_number))
+        .filter(DocumentVersion.document_id.in_(document_ids))
+        .group_by(DocumentVersion.document_id)
+        .all()
+    )
+
+
+async def fetch_discovered(doc_info, fetcher, kafka_producer):
+    """Fetch stage: download a discovered document; returns None if it could not be fetched."""
     url = doc_info['url']
-    doc_id = doc_info.get('doc_id') or str(uuid.uuid4())
+    doc_id = doc_info['doc_id']
     
-    active_document_processing.labels(stage='fetch').inc()
+    ACTIVE_PROCESSING['fetch'].inc()
     fetch_start = time.time()
     
     # Fetch document
     try:
         fetch_result = await fetcher.fetch_document(url, doc_id)
         fetch_duration = time.time() - fetch_start
-        document_processing_duration.labels(stage='fetch').observe(fetch_duration)
-        active_document_processing.labels(stage='fetch').dec()
+        PROCESSING_DURATION['fetch'].observe(fetch_duration)
+        ACTIVE_PROCESSING['fetch'].dec()
         
         if not fetch_result:
             logger.warning(f"Failed to fetch document from {url}")
-            documents_fetched.labels(status='failed').inc()
-            kafka_producer.publish_failed(
+            DOCUMENTS_FETCHED['failed'].inc()
+            await kafka_producer.publish_failed(
                 doc_id=doc_id,
                 stage='fetch',
                 error='Failed to fetch document',
                 error_details={'url': url}
             )
-            return
+            return None
         
-        documents_fetched.labels(status='success').inc()
+        DOCUMENTS_FETCHED['success'].inc()
         
-        # Calculate SHA256 hash
-        sha256 = hashlib.sha256(fetch_result.get('content', b'')).hexdigest()
+        # The content hash is computed by the fetcher, which keys storage by it
+        sha256 = fetch_result['hash']
         
         # Publish fetched event to Kafka
-        kafka_producer.publish_fetched(
+        await kafka_producer.publish_fetched(
             doc_id=doc_id,
             storage_path=fetch_result.get('storage_path', ''),
             sha256=sha256
         )
     except Exception as e:
         logger.error(f"Error fetching document {doc_id}: {e}", exc_info=True)
-        kafka_producer.publish_failed(
+        await kafka_producer.publish_failed(
             doc_id=doc_id,
             stage='fetch',
             error=str(e),
@@ -281,27 +401,35 @@ async def process_discovered_document(db, doc_info, fetcher, parser, embedding_s
         )
         raise
     
-    # Parse document
-    active_document_processing.labels(stage='parse').inc()
+    return fetch_result
+
+
+async def parse_discovered(doc_info, fetch_result, parse_pool, kafka_producer):
+    """Parse stage: parse fetched content in the parse process pool."""
+    url = doc_info['url']
+    doc_id = doc_info['doc_id']
+    
+    ACTIVE_PROCESSING['parse'].inc()
     parse_start = time.time()
     
     try:
-        parsed_data = parser.parse(
+        parsed_data = await parse_in_pool(
+            parse_pool,
             fetch_result['content'],
             fetch_result['content_type'],
             url
         )
         parse_duration = time.time() - parse_start
-        document_processing_duration.labels(stage='parse').observe(parse_duration)
-        active_document_processing.labels(stage='parse').dec()
-        documents_parsed.labels(status='success').inc()
+        PROCESSING_DURATION['parse'].observe(parse_duration)
+        ACTIVE_PROCESSING['parse'].dec()
+        DOCUMENTS_PARSED['success'].inc()
     except Exception as e:
         parse_duration = time.time() - parse_start
-        document_processing_duration.labels(stage='parse').observe(parse_duration)
-        active_document_processing.labels(stage='parse').dec()
-        documents_parsed.labels(status='failed').inc()
+        PROCESSING_DURATION['parse'].observe(parse_duration)
+        ACTIVE_PROCESSING['parse'].dec()
+        DOCUMENTS_PARSED['failed'].inc()
         logger.error(f"Error parsing document {doc_id}: {e}", exc_info=True)
-        kafka_producer.publish_failed(
+        await kafka_producer.publish_failed(
             doc_id=doc_id,
             stage='parse',
             error=str(e),
@@ -309,132 +437,232 @@ async def process_discovered_document(db, doc_info, fetcher, parser, embedding_s
         )
         raise
     
-    # Create or get case (simplified - would need proper case matching)
-    case = db.query(Case).filter(Case.registry_number == parsed_data.get('case_number')).first()
-    if not case:
-        # Create new case (simplified)
-        case = Case(
-            id=uuid.uuid4(),
-            registry_number=parsed_data.get('case_number') or doc_id,
-            category=None,
-            status='active'
-        )
-        db.add(case)
+    return parsed_data
+
+
+def resolve_judge_id(db, judge_name):
+    """Id of the judge with this name, created if unknown; None without a name."""
+    if not judge_name:
+        return None
+    judge_id = db.query(Judge.id).filter(Judge.full_name == judge_name).scalar()
+    if judge_id is None:
+        judge = Judge(id=uuid.uuid4(), full_name=judge_name)
+        db.add(judge)
         db.flush()
-    
-    # Create document
-    document = Document(
-        id=uuid.UUID(doc_id),
-        case_id=case.id,
-        type='decision'
-    )
-    db.add(document)
-    db.flush()
-    
-    # Create document version
-    version = DocumentVersion(
-        id=uuid.uuid4(),
-        document_id=document.id,
-        version_number=1,
-        published_at=None,  # Would parse from document
-        source_url=url,
-        source_hash=fetch_result.get('hash', ''),
-        raw_storage_path=fetch_result.get('storage_path', ''),
-        parsed_json=parsed_data
+        judge_id = judge.id
+    return judge_id
+
+
+async def store_discovered(doc_info, fetch_result, parsed_data, view, embedded, kafka_producer):
+    """Store stage: write case, document, version and sections for a discovered document.
+    
+    Each document is written and committed in its own session, so a failing
+    document cannot roll back the rest of its discovery batch. The writes run
+    in a worker thread, off the event loop that also serves the API.
+    """
+    doc_id = doc_info['doc_id']
+    
+    # The cache is not thread-safe, so it is only touched here on the event loop
+    cached_case_id = case_id_cache.get(view.case_number) if view.case_number else None
+    case_id, version_id = await asyncio.to_thread(
+        write_discovered, doc_info, fetch_result, parsed_data, view, embedded, cached_case_id
     )
-    db.add(version)
-    document.current_version_id = version.id
-    db.flush()
     
-    # Extract entities and law references from parsed data
-    entities = {
-        'court': parsed_data.get('court'),
-        'judge': parsed_data.get('judge'),
-        'parties': parsed_data.get('parties', {}),
-        'date': parsed_data.get('date')
-    }
-    law_refs = parsed_data.get('law_references', [])
+    # Only cache case ids that are committed
+    if view.case_number:
+        case_id_cache[view.case_number] = case_id
     
     # Publish parsed event to Kafka
     try:
-        kafka_producer.publish_parsed(
+        await kafka_producer.publish_parsed(
             doc_id=doc_id,
-            version_id=str(version.id),
-            entities=entities,
-            law_refs=law_refs
+            version_id=str(version_id),
+            entities=view.entities(),
+            law_refs=view.law_refs
         )
     except Exception as e:
         logger.warning(f"Failed to publish parsed event: {e}")
     
-    # Create document sections
-    for idx, section_data in enumerate(parsed_data.get('text_blocks', [])):
-        section = DocumentSection(
+    logger.info(f"Processed document {doc_id}")
+
+
+def write_discovered(doc_info, fetch_result, parsed_data, view, embedded, case_id=None):
+    """Write and commit a discovered document; returns (case_id, version_id).
+    
+    case_id is the document's case if already known (from case_id_cache).
+    """
+    url = doc_info['url']
+    doc_id = doc_info['doc_id']
+    
+    with SessionLocal() as db:
+        # Create or get case (simplified - would need proper case matching)
+        if case_id is None:
+            case = db.query(Case).filter(Case.registry_number == view.case_number).first()
+            if not case:
+                # Create new case (simplified)
+                case = Case(
+                    id=uuid.uuid4(),
+                    registry_number=view.case_number or doc_id,
+                    category=None,
+                    status='active'
+                )
+                db.add(case)
+                db.flush()
+            case_id = case.id
+        
+        # Create document
+        document = Document(
+            id=doc_info['doc_uuid'],
+            case_id=case_id,
+            type='decision'
+        )
+        db.add(document)
+        db.flush()
+        
+        # Create document version
+        version = DocumentVersion(
             id=uuid.uuid4(),
-            document_version_id=version.id,
-            section_type=section_data.get('type', 'TEXT'),
-            order_index=idx,
-            text=section_data.get('text', '')
+            document_id=document.id,
+            version_number=1,
+            published_at=None,  # Would parse from document
+            source_url=url,
+            source_hash=fetch_result.get('hash', ''),
+            raw_storage_path=fetch_result.get('storage_path', ''),
+            parsed_json=parsed_data,
+            presiding_judge_id=resolve_judge_id(db, view.judge),
+            etag=fetch_result.get('etag'),
+            last_modified=fetch_result.get('last_modified')
         )
-        db.add(section)
+        db.add(version)
+        document.current_version_id = version.id
         db.flush()
         
-        # Generate embeddings for section
-        section_text = section.text
-        if section_text:
-            chunks = embedding_service.chunk_text(section_text)
-            embedding_start = time.time()
-            embeddings = await embedding_service.generate_embeddings(chunks)
-            embedding_duration = time.time() - embedding_start
-            embedding_generation_duration.observe(embedding_duration)
-            embeddings_generated.inc(len(embeddings))
-            
-            for chunk_idx, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-                chunk = EmbeddingChunk(
-                    id=uuid.uuid4(),
-                    section_id=section.id,
-                    chunk_index=chunk_idx,
-                    text=chunk_text,
-                    embedding_vector=embedding,
-                    token_count=embedding_service.count_tokens(chunk_text)
-                )
-                db.add(chunk)
+        # Create document sections
+        insert_sections(db, version.id, view.text_blocks, embedded)
+        
+        db.commit()
     
-    logger.info(f"Processed document {doc_id}")
+    return case_id, version.id
+
+
+async def run_pipeline_stage(inbox, outbox, handler, on_error, workers=1):
+    """Feed items from inbox through handler into outbox until the end-of-stream marker.
+    
+    Items are argument tuples whose first element is the doc_info; a handler
+    returning None drops the item. The marker is forwarded once all workers stop.
+    """
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is PIPELINE_DONE:
+                await inbox.put(PIPELINE_DONE)  # Let sibling workers see it too
+                return
+            try:
+                result = await handler(*item)
+            except Exception as e:
+                await on_error(item[0], e)
+                continue
+            if result is not None and outbox is not None:
+                await outbox.put(result)
+    
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    if outbox is not None:
+        await outbox.put(PIPELINE_DONE)
+
+
+async def process_discovered_batch(discovered, fetcher, parse_pool, embedding_service, kafka_producer, on_stored=None):
+    """Process newly discovered documents as a pipeline.
+    
+    fetch -> parse -> embed -> store run concurrently, connected by bounded
+    queues, so network, CPU and embedding work overlap across documents. The
+    store stage has a single worker: documents of one batch may create the
+    same case. on_stored, if given, is called with the source URL of every
+    document stored.
+    """
+    fetch_q = asyncio.Queue(maxsize=PIPELINE_FETCH_QUEUE_SIZE)
+    parse_q = asyncio.Queue(maxsize=PIPELINE_PARSE_QUEUE_SIZE)
+    embed_q = asyncio.Queue(maxsize=PIPELINE_EMBED_QUEUE_SIZE)
+    db_q = asyncio.Queue(maxsize=PIPELINE_DB_QUEUE_SIZE)
+    
+    async def on_error(doc_info, e):
+        doc_id = doc_info['doc_id']
+        logger.error(f"Error processing document {doc_id}: {e}", exc_info=True)
+        # Publish failure event
+        try:
+            await kafka_producer.publish_failed(
+                doc_id=doc_id,
+                stage='discovery',
+                error=str(e),
+                error_details={'url': doc_info.get('url', '')}
+            )
+        except Exception as kafka_err:
+            logger.warning(f"Failed to publish failure event: {kafka_err}")
+    
+    async def fetch(doc_info):
+        fetch_result = await fetch_discovered(doc_info, fetcher, kafka_producer)
+        return (doc_info, fetch_result) if fetch_result else None
+    
+    async def parse(doc_info, fetch_result):
+        parsed_data = await parse_discovered(doc_info, fetch_result, parse_pool, kafka_producer)
+        return doc_info, fetch_result, parsed_data, ParsedView.from_parsed(parsed_data)
+    
+    async def embed(doc_info, fetch_result, parsed_data, view):
+        embedded = await embed_sections(view.text_blocks, embedding_service)
+        return doc_info, fetch_result, parsed_data, view, embedded
+    
+    async def store(doc_info, fetch_result, parsed_data, view, embedded):
+        await store_discovered(doc_info, fetch_result, parsed_data, view, embedded, kafka_producer)
+        if on_stored:
+            on_stored(doc_info['url'])
+    
+    async def feed():
+        for doc_info in discovered:
+            await fetch_q.put((doc_info,))
+        await fetch_q.put(PIPELINE_DONE)
+    
+    await asyncio.gather(
+        feed(),
+        run_pipeline_stage(fetch_q, parse_q, fetch, on_error, workers=fetcher.workers),
+        run_pipeline_stage(parse_q, embed_q, parse, on_error),
+        run_pipeline_stage(embed_q, db_q, embed, on_error),
+        run_pipeline_stage(db_q, None, store, on_error)
+    )
 
 
-async def process_changed_document(db, old_version, fetcher, parser, embedding_service):
-    """Process a changed document (create new version)."""
-    from models import DocumentVersion, Document, DocumentSection, EmbeddingChunk
-    import uuid
-    import hashlib
+async def process_changed_document(db, old_version, changed, fetcher, parse_pool, embedding_service, max_versions=None):
+    """Process a changed document (create new version).
+    
+    changed is the new body as returned by ChangeMonitor.check_for_changes; it
+    is stored as is rather than downloaded again.
     
+    max_versions optionally maps document_id -> highest version_number, preloaded
+    for a reconciliation batch; it is updated with the version created here.
+    """
     kafka_producer = get_producer()
     doc_id = str(old_version.document_id)
     
-    # Fetch new version
+    # Store new version (already hashed by the change check)
     try:
-        fetch_result = await fetcher.fetch_document(old_version.source_url, doc_id)
-        if not fetch_result:
-            kafka_producer.publish_failed(
-                doc_id=doc_id,
-                stage='fetch',
-                error='Failed to fetch changed document',
-                error_details={'url': old_version.source_url}
-            )
-            return
-        
-        # Calculate SHA256 hash
-        sha256 = hashlib.sha256(fetch_result.get('content', b'')).hexdigest()
+        fetch_result = await fetcher.store_content(
+            old_version.source_url,
+            doc_id,
+            changed['content'],
+            changed['content_type'],
+            etag=changed['etag'],
+            last_modified=changed['last_modified'],
+            content_hash=changed['hash']
+        )
+        sha256 = fetch_result['hash']
         
         # Publish fetched event
-        kafka_producer.publish_fetched(
+        await kafka_producer.publish_fetched(
             doc_id=doc_id,
             storage_path=fetch_result.get('storage_path', ''),
             sha256=sha256
         )
     except Exception as e:
-        logger.error(f"Error fetching changed document {doc_id}: {e}", exc_info=True)
-        kafka_producer.publish_failed(
+        logger.error(f"Error storing changed document {doc_id}: {e}", exc_info=True)
+        await kafka_producer.publish_failed(
             doc_id=doc_id,
             stage='fetch',
             error=str(e),
@@ -444,14 +672,15 @@ async def process_changed_document(db, old_version, fetcher, parser, embedding_s
     
     # Parse new version
     try:
-        parsed_data = parser.parse(
+        parsed_data = await parse_in_pool(
+            parse_pool,
             fetch_result['content'],
             fetch_result.get('content_type', 'text/html'),
             old_version.source_url
         )
     except Exception as e:
         logger.error(f"Error parsing changed document {doc_id}: {e}", exc_info=True)
-        kafka_producer.publish_failed(
+        await kafka_producer.publish_failed(
             doc_id=doc_id,
             stage='parse',
             error=str(e),
@@ -459,17 +688,53 @@ async def process_changed_document(db, old_version, fetcher, parser, embedding_s
         )
         raise
     
-    # Get document
-    document = db.query(Document).filter(Document.id == old_version.document_id).first()
-    if not document:
+    view = ParsedView.from_parsed(parsed_data)
+    embedded = await embed_sections(view.text_blocks, embedding_service)
+    
+    # The session's blocking calls run in a worker thread, off the event loop that also serves the API
+    written = await asyncio.to_thread(
+        write_changed_version, db, old_version, fetch_result, parsed_data, view, embedded, max_versions
+    )
+    if written is None:
         return
+    document_id, version_id, next_version_num = written
+    
+    # Publish parsed event
+    try:
+        await kafka_producer.publish_parsed(
+            doc_id=doc_id,
+            version_id=str(version_id),
+            entities=view.entities(),
+            law_refs=view.law_refs
+        )
+    except Exception as e:
+        logger.warning(f"Failed to publish parsed event: {e}")
+    
+    logger.info(f"Created new version {next_version_num} for document {document_id}")
+
+
+def write_changed_version(db, old_version, fetch_result, parsed_data, view, embedded, max_versions):
+    """Add the new version and its sections to the session (flushed, not committed).
+    
+    Returns:
+        Tuple of (document_id, version_id, version_number), or None if the document is gone
+    """
+    # Get document (identity map first)
+    document = db.get(Document, old_version.document_id)
+    if not document:
+        return None
     
     # Get next version number
-    max_version = db.query(DocumentVersion).filter(
-        DocumentVersion.document_id == document.id
-    ).order_by(DocumentVersion.version_number.desc()).first()
+    if max_versions is not None and document.id in max_versions:
+        max_version_num = max_versions[document.id]
+    else:
+        max_version_num = db.query(func.max(DocumentVersion.version_number)).filter(
+            DocumentVersion.document_id == document.id
+        ).scalar()
     
-    next_version_num = (max_version.version_number if max_version else 0) + 1
+    next_version_num = (max_version_num or 0) + 1
+    if max_versions is not None:
+        max_versions[document.id] = next_version_num
     
     # Create new version
     new_version = DocumentVersion(
@@ -480,77 +745,123 @@ async def process_changed_document(db, old_version, fetcher, parser, embedding_s
         source_url=old_version.source_url,
         source_hash=fetch_result.get('hash', ''),
         raw_storage_path=fetch_result.get('storage_path', ''),
-        parsed_json=parsed_data
+        parsed_json=parsed_data,
+        presiding_judge_id=resolve_judge_id(db, view.judge),
+        etag=fetch_result.get('etag'),
+        last_modified=fetch_result.get('last_modified')
     )
     db.add(new_version)
     document.current_version_id = new_version.id
     db.flush()
     
-    # Extract entities and law references
-    entities = {
-        'court': parsed_data.get('court'),
-        'judge': parsed_data.get('judge'),
-        'parties': parsed_data.get('parties', {}),
-        'date': parsed_data.get('date')
-    }
-    law_refs = parsed_data.get('law_references', [])
+    # Create sections and embedding chunks
+    insert_sections(db, new_version.id, view.text_blocks, embedded)
     
-    # Publish parsed event
-    try:
-        kafka_producer.publish_parsed(
-            doc_id=doc_id,
-            version_id=str(new_version.id),
-            entities=entities,
-            law_refs=law_refs
-        )
-    except Exception as e:
-        logger.warning(f"Failed to publish parsed event: {e}")
+    return document.id, new_version.id, next_version_num
+
+
+async def embed_sections(text_blocks, embedding_service):
+    """Chunk and embed the text of all sections of a document.
     
-    # Create sections and embeddings (same as in process_discovered_document)
-    for idx, section_data in enumerate(parsed_data.get('text_blocks', [])):
-        section = DocumentSection(
-            id=uuid.uuid4(),
-            document_version_id=new_version.id,
-            section_type=section_data.get('type', 'TEXT'),
-            order_index=idx,
-            text=section_data.get('text', '')
-        )
-        db.add(section)
-        db.flush()
-        
-        # Generate embeddings
-        section_text = section.text
-        if section_text:
-            chunks = embedding_service.chunk_text(section_text)
-            embeddings = await embedding_service.generate_embeddings(chunks)
-            
-            for chunk_idx, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-                chunk = EmbeddingChunk(
-                    id=uuid.uuid4(),
-                    section_id=section.id,
-                    chunk_index=chunk_idx,
-                    text=chunk_text,
-                    embedding_vector=embedding,
-                    token_count=embedding_service.count_tokens(chunk_text)
-                )
-                db.add(chunk)
+    Chunks from all sections are embedded with a single generate_embeddings call.
     
-    logger.info(f"Created new version {next_version_num} for document {document.id}")
+    Returns:
+        Tuple of (flat_chunks, offsets, embeddings, token_counts); section i owns
+        flat_chunks[offsets[i]:offsets[i + 1]]
+    """
+    per_section_chunks = embedding_service.chunk_texts(
+        [section_data.get('text') or '' for section_data in text_blocks]
+    )
+    flat_chunks = list(chain.from_iterable(per_section_chunks))
+    offsets = list(accumulate((len(chunks) for chunks in per_section_chunks), initial=0))
+    
+    all_embeddings = []
+    if flat_chunks:
+        embedding_start = time.time()
+        all_embeddings = await embedding_service.generate_embeddings(flat_chunks)
+        embedding_duration = time.time() - embedding_start
+        embedding_generation_duration.observe(embedding_duration)
+        embeddings_generated.inc(len(all_embeddings))
+    all_token_counts = embedding_service.count_tokens_batch(flat_chunks) if flat_chunks else []
+    
+    return flat_chunks, offsets, all_embeddings, all_token_counts
+
 
+def insert_sections(db, version_id, text_blocks, embedded):
+    """Write sections with one multi-row INSERT and embedding chunks with COPY.
+    
+    The version row must already be flushed.
+    """
+    flat_chunks, offsets, all_embeddings, all_token_counts = embedded
+    
+    # Client-generated UUIDs let chunk rows reference their section before anything is written
+    section_rows = []
+    chunk_rows = []
+    for idx, section_data in enumerate(text_blocks):
+        section_id = uuid.uuid4()
+        section_rows.append({
+            'id': section_id,
+            'document_version_id': version_id,
+            'section_type': section_data.get('type', 'TEXT'),
+            'order_index': idx,
+            'text': section_data.get('text', '')
+        })
+        
+        start, end = offsets[idx], offsets[idx + 1]
+        section_chunks = zip(flat_chunks[start:end], all_embeddings[start:end], all_token_counts[start:end])
+        for chunk_idx, (chunk_text, embedding, token_count) in enumerate(section_chunks):
+            # Columns in EMBEDDING_CHUNK_COPY_SQL order; vectors in pgvector's text format (parsed as halfvec)
+            chunk_rows.append((
+                str(uuid.uuid4()),
+                str(section_id),
+                chunk_idx,
+                chunk_text,
+                '[' + ','.join(map(str, embedding)) + ']',
+                token_count
+            ))
+    
+    if section_rows:
+        db.bulk_insert_mappings(DocumentSection, section_rows)
+    if chunk_rows:
+        copy_embedding_chunks(db, chunk_rows)
+
+
+def copy_embedding_chunks(db, chunk_rows):
+    """Stream embedding chunk rows into Postgres with COPY ... FROM STDIN.
+    
+    Runs on the session's own connection, so the rows share its transaction.
+    """
+    buffer = io.StringIO()
+    # Quote every string so empty texts stay empty strings rather than NULL
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(chunk_rows)
+    buffer.seek(0)
+    
+    with db.connection().connection.cursor() as cursor:
+        cursor.copy_expert(EMBEDDING_CHUNK_COPY_SQL, buffer)
 
-def run_background_worker():
-    """Run background worker in separate process."""
+
+async def run_services():
+    """Serve the API and run background services in one event loop."""
+    server = uvicorn.Server(uvicorn.Config(
+        app,
+        host=settings.mcp_server_host,
+        port=settings.mcp_server_port,
+        http="httptools",
+        log_level=settings.log_level.lower()
+    ))
+    background_task = asyncio.create_task(run_background_services())
     try:
-        asyncio.run(run_background_services())
-    except KeyboardInterrupt:
-        logger.info("Background worker interrupted")
-    except Exception as e:
-        logger.error(f"Background worker error: {e}")
+        # uvicorn handles SIGINT/SIGTERM and returns once it has shut down
+        await server.serve()
+    finally:
+        background_task.cancel()
+        await asyncio.gather(background_task, return_exceptions=True)
 
 
 def main():
     """Main entry point."""
     logger.info("Starting Court Registry MCP Server...")
+    logger.info(f"Content hashing: {settings.content_hash_algorithm} ({ssl.OPENSSL_VERSION})")
     
     # Initialize database
     init_database()
@@ -561,45 +872,25 @@ def main():
         minio_process = Process(target=run_minio_server, daemon=True)
         minio_process.start()
         logger.info("MinIO server started")
-        # Wait a bit for MinIO to start
-        import time
-        time.sleep(3)
-    
-    # Start API server in separate process
-    api_process = Process(target=run_api_server, daemon=True)
-    api_process.start()
-    logger.info(f"API server started on {settings.mcp_server_host}:{settings.mcp_server_port}")
-    
-    # Start background services
-    background_process = Process(target=run_background_worker, daemon=True)
-    background_process.start()
-    logger.info("Background services started")
-    
-    # Handle shutdown
-    def signal_handler(sig, frame):
+        # Wait until MinIO accepts connections instead of sleeping a fixed time
+        minio_port = get_minio_port()
+        if wait_for_port('127.0.0.1', minio_port):
+            logger.info("MinIO server is accepting connections")
+        else:
+            logger.warning(f"MinIO did not open port {minio_port} within {MINIO_READY_TIMEOUT}s, continuing anyway")
+    
+    # Run the API server and background services together in this process
+    logger.info(f"Starting API server on {settings.mcp_server_host}:{settings.mcp_server_port}")
+    try:
+        uvloop.install()
+        asyncio.run(run_services())
+    except KeyboardInterrupt:
+        pass
+    finally:
         logger.info("Shutting down...")
         if minio_process:
             minio_process.terminate()
-        api_process.terminate()
-        background_process.terminate()
-        if minio_process:
             minio_process.join()
-        api_process.join()
-        background_process.join()
-        sys.exit(0)
-    
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
-    # Keep main process alive
-    try:
-        if minio_process:
-            minio_process.join()
-        api_process.join()
-        background_process.join()
-    except KeyboardInterrupt:
-        signal_handler(None, None)
-
 
 if __name__ == "__main__":
     main()
@@ -1,20 +1,28 @@
 """MCP Server for Court Registry queries."""
 import asyncio
-import json
+import uuid
+from collections import defaultdict
 from typing import Any, Sequence
+import orjson
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent, ImageContent, EmbeddedResource
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, text
-from database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, func, text, select
+from sqlalchemy.orm import joinedload
+from database import AsyncSessionLocal
 from models import (
     Case, Document, DocumentVersion, Party, CaseParty, LawArticle,
     DocumentLawRef, DecisionOutcome, DocumentSection, EmbeddingChunk,
     EmbeddingEntityLink, Court, Judge
 )
-from services.embeddings import EmbeddingService
+from schemas import (
+    FindCasesRequest, SearchSimilarRequest, GetCaseRequest,
+    GetDocumentRequest, AnalyzeJudgeRequest
+)
+import numpy as np
+from services.embeddings import EmbeddingService, rerank_by_cosine
 from config import settings
 import logging
 
@@ -23,6 +31,15 @@ logger = logging.getLogger(__name__)
 # Create MCP server instance
 app = Server("court-registry-mcp")
 
+# Lower bound for hnsw.ef_search in similarity searches (pgvector's default)
+HNSW_MIN_EF_SEARCH = 40
+
+# ANN candidates fetched per similarity search, reranked by exact cosine in numpy
+SIMILAR_RERANK_CANDIDATES = 200
+
+# Rows fetched per round trip when streaming document sections
+SECTION_STREAM_BATCH_SIZE = 500
+
 # Initialize embedding service (lazy initialization)
 embedding_service = None
 
@@ -35,182 +52,185 @@ def get_embedding_service():
     return embedding_service
 
 
+async def gather_queries(*stmts):
+    """
+    Execute independent statements concurrently.
+    
+    An AsyncSession can't run statements concurrently, so each one gets its own
+    session (and pooled connection); results are fully buffered before it closes.
+    """
+    async def run(stmt):
+        async with AsyncSessionLocal() as session:
+            return await session.execute(stmt)
+    
+    return await asyncio.gather(*(run(stmt) for stmt in stmts))
+
+
+# Tool definitions never change, so they are built once at import; input
+# schemas come from the request models that validate the arguments
+TOOLS: list[Tool] = [
+    Tool(
+        name="find_cases",
+        description="Find court cases by various criteria (plaintiff, defendant, law article, date range, outcome)",
+        inputSchema=FindCasesRequest.model_json_schema()
+    ),
+    Tool(
+        name="search_similar_cases",
+        description="Search for similar cases using semantic similarity",
+        inputSchema=SearchSimilarRequest.model_json_schema()
+    ),
+    Tool(
+        name="get_case_details",
+        description="Get detailed information about a specific case",
+        inputSchema=GetCaseRequest.model_json_schema()
+    ),
+    Tool(
+        name="get_document",
+        description="Get a specific document version with all sections",
+        inputSchema=GetDocumentRequest.model_json_schema()
+    ),
+    Tool(
+        name="analyze_judge_patterns",
+        description="Analyze patterns in judge decisions (e.g., win rate for specific law articles)",
+        inputSchema=AnalyzeJudgeRequest.model_json_schema()
+    )
+]
+
+
+def dump_result(result: dict) -> str:
+    """Serialize a tool result as indented JSON text."""
+    return orjson.dumps(
+        result,
+        default=str,  # Decimal amounts and other non-native values
+        option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+    ).decode()
+
+
 @app.list_tools()
 async def handle_list_tools() -> list[Tool]:
     """List available MCP tools."""
-    return [
-        Tool(
-            name="find_cases",
-            description="Find court cases by various criteria (plaintiff, defendant, law article, date range, outcome)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "plaintiff": {"type": "string", "description": "Name of plaintiff"},
-                    "defendant": {"type": "string", "description": "Name of defendant"},
-                    "law_article": {"type": "string", "description": "Law article code (e.g., 'CCU 625')"},
-                    "date_from": {"type": "string", "description": "Start date (YYYY-MM-DD)"},
-                    "date_to": {"type": "string", "description": "End date (YYYY-MM-DD)"},
-                    "outcome": {"type": "string", "enum": ["won", "lost", "partial"], "description": "Case outcome"},
-                    "court": {"type": "string", "description": "Court name"},
-                    "limit": {"type": "integer", "description": "Maximum number of results", "default": 10}
-                }
-            }
-        ),
-        Tool(
-            name="search_similar_cases",
-            description="Search for similar cases using semantic similarity",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string", "description": "Natural language query describing the case"},
-                    "section_type": {
-                        "type": "string",
-                        "enum": ["FACTS", "CLAIMS", "ARGUMENTS", "LAW_REFERENCES", "COURT_REASONING", "DECISION"],
-                        "description": "Type of section to search in"
-                    },
-                    "limit": {"type": "integer", "description": "Maximum number of results", "default": 5}
-                },
-                "required": ["query"]
-            }
-        ),
-        Tool(
-            name="get_case_details",
-            description="Get detailed information about a specific case",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "case_id": {"type": "string", "description": "Case UUID or registry number"}
-                },
-                "required": ["case_id"]
-            }
-        ),
-        Tool(
-            name="get_document",
-            description="Get a specific document version with all sections",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "document_version_id": {"type": "string", "description": "Document version UUID"}
-                },
-                "required": ["document_version_id"]
-            }
-        ),
-        Tool(
-            name="analyze_judge_patterns",
-            description="Analyze patterns in judge decisions (e.g., win rate for specific law articles)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "judge_name": {"type": "string", "description": "Judge full name"},
-                    "law_article": {"type": "string", "description": "Law article code"},
-                    "party_type": {"type": "string", "enum": ["person", "company", "state"], "description": "Type of party"}
-                }
-            }
-        )
-    ]
+    return TOOLS
 
 
 @app.call_tool()
 async def handle_call_tool(name: str, arguments: dict) -> Sequence[TextContent | ImageContent]:
     """Handle tool calls."""
-    db = SessionLocal()
-    try:
-        if name == "find_cases":
-            result = await find_cases(db, arguments)
-        elif name == "search_similar_cases":
-            result = await search_similar_cases(db, arguments)
-        elif name == "get_case_details":
-            result = await get_case_details(db, arguments)
-        elif name == "get_document":
-            result = await get_document(db, arguments)
-        elif name == "analyze_judge_patterns":
-            result = await analyze_judge_patterns(db, arguments)
-        else:
-            result = {"error": f"Unknown tool: {name}"}
-        
-        return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
-    except Exception as e:
-        logger.error(f"Error in tool {name}: {e}", exc_info=True)
-        error_result = {"error": str(e), "tool": name}
-        return [TextContent(type="text", text=json.dumps(error_result, ensure_ascii=False, indent=2))]
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        try:
+            if name == "find_cases":
+                result = await find_cases(db, FindCasesRequest.model_validate(arguments))
+            elif name == "search_similar_cases":
+                result = await search_similar_cases(db, SearchSimilarRequest.model_validate(arguments))
+            elif name == "get_case_details":
+                result = await get_case_details(db, GetCaseRequest.model_validate(arguments))
+            elif name == "get_document":
+                result = await get_document(db, GetDocumentRequest.model_validate(arguments))
+            elif name == "analyze_judge_patterns":
+                result = await analyze_judge_patterns(db, AnalyzeJudgeRequest.model_validate(arguments))
+            else:
+                result = {"error": f"Unknown tool: {name}"}
+            
+            return [TextContent(type="text", text=dump_result(result))]
+        except Exception as e:
+            logger.error(f"Error in tool {name}: {e}", exc_info=True)
+            error_result = {"error": str(e), "tool": name}
+            return [TextContent(type="text", text=dump_result(error_result))]
+
 
+def _party_exists(name: str, role: str):
+    """EXISTS predicate: the case has a party with this role whose name contains the text."""
+    return (
+        select(CaseParty.case_id)
+        .join(CaseParty.party)
+        .where(
+            CaseParty.case_id == Case.id,
+            CaseParty.role == role,
+            Party.normalized_name.ilike(f"%{name}%")
+        )
+        .exists()
+    )
+
+
+def _case_document_exists(condition, *relationships):
+    """EXISTS predicate: a document version of the case, joined along relationships, matches condition."""
+    stmt = select(Document.id).join(Document.versions)
+    for attr in relationships:
+        stmt = stmt.join(attr)
+    return stmt.where(Document.case_id == Case.id, condition).exists()
 
-async def find_cases(db: Session, args: dict) -> dict:
+
+async def find_cases(db: AsyncSession, request: FindCasesRequest) -> dict:
     """Find cases by criteria."""
     try:
-        # Validate limit
-        limit = min(args.get("limit", 10), 100)  # Max 100 results
-        
-        query = db.query(Case).distinct()
-        
-        # Filter by plaintiff
-        if args.get("plaintiff"):
-            query = query.join(CaseParty).join(Party).filter(
-                and_(
-                    Party.normalized_name.ilike(f"%{args['plaintiff']}%"),
-                    CaseParty.role == "plaintiff"
-                )
-            )
+        # Plain rows with just the listed columns; document counts come from a correlated subquery
+        document_count = select(func.count()).where(Document.case_id == Case.id).scalar_subquery()
+        stmt = select(
+            Case.id,
+            Case.registry_number,
+            Case.court_id,
+            Case.category,
+            Case.opened_at,
+            Case.status,
+            document_count.label("document_count")
+        )
         
-        # Filter by defendant
-        if args.get("defendant"):
-            query = query.join(CaseParty).join(Party).filter(
-                and_(
-                    Party.normalized_name.ilike(f"%{args['defendant']}%"),
-                    CaseParty.role == "defendant"
-                )
-            )
+        # Filter by plaintiff / defendant
+        if request.plaintiff:
+            stmt = stmt.where(_party_exists(request.plaintiff, "plaintiff"))
+        if request.defendant:
+            stmt = stmt.where(_party_exists(request.defendant, "defendant"))
         
         # Filter by law article
-        if args.get("law_article"):
-            query = query.join(Document).join(DocumentVersion).join(DocumentLawRef).join(LawArticle).filter(
-                LawArticle.code.ilike(f"%{args['law_article']}%")
-            )
+        if request.law_article:
+            stmt = stmt.where(_case_document_exists(
+                LawArticle.code.ilike(f"%{request.law_article}%"),
+                DocumentVersion.law_refs,
+                DocumentLawRef.law_article
+            ))
         
         # Filter by date
-        if args.get("date_from"):
-            query = query.filter(Case.opened_at >= args["date_from"])
-        if args.get("date_to"):
-            query = query.filter(Case.opened_at <= args["date_to"])
+        if request.date_from:
+            stmt = stmt.where(Case.opened_at >= request.date_from)
+        if request.date_to:
+            stmt = stmt.where(Case.opened_at <= request.date_to)
         
         # Filter by outcome
-        if args.get("outcome"):
-            query = query.join(Document).join(DocumentVersion).join(DecisionOutcome).filter(
-                DecisionOutcome.result == args["outcome"]
-            )
+        if request.outcome:
+            stmt = stmt.where(_case_document_exists(
+                DecisionOutcome.result == request.outcome,
+                DocumentVersion.outcomes
+            ))
         
         # Filter by court
-        if args.get("court"):
-            query = query.join(Court).filter(Court.name.ilike(f"%{args['court']}%"))
-        
-        cases = query.limit(limit).all()
-        
-        results = []
-        for case in cases:
-            try:
-                # Get parties
-                parties = db.query(Party, CaseParty.role).join(CaseParty).filter(
-                    CaseParty.case_id == case.id
-                ).all()
-                
-                # Get documents
-                documents = db.query(Document).filter(Document.case_id == case.id).all()
-                
-                results.append({
-                    "case_id": str(case.id),
-                    "registry_number": case.registry_number,
-                    "court": str(case.court_id) if case.court_id else None,
-                    "category": case.category,
-                    "opened_at": case.opened_at.isoformat() if case.opened_at else None,
-                    "status": case.status,
-                    "parties": [{"name": p.normalized_name, "role": r} for p, r in parties],
-                    "document_count": len(documents)
-                })
-            except Exception as e:
-                logger.warning(f"Error processing case {case.id}: {e}")
-                continue
+        if request.court:
+            stmt = stmt.join(Case.court).where(Court.name.ilike(f"%{request.court}%"))
+        
+        cases = (await db.execute(stmt.limit(request.limit))).mappings().all()
+        
+        # Parties of all matched cases in one query
+        parties = defaultdict(list)
+        if cases:
+            party_rows = await db.execute(
+                select(CaseParty.case_id, Party.normalized_name, CaseParty.role)
+                .join(CaseParty.party)
+                .where(CaseParty.case_id.in_([case["id"] for case in cases]))
+            )
+            for case_id, name, role in party_rows:
+                parties[case_id].append({"name": name, "role": role})
+        
+        results = [
+            {
+                "case_id": str(case["id"]),
+                "registry_number": case["registry_number"],
+                "court": str(case["court_id"]) if case["court_id"] else None,
+                "category": case["category"],
+                "opened_at": case["opened_at"].isoformat() if case["opened_at"] else None,
+                "status": case["status"],
+                "parties": parties[case["id"]],
+                "document_count": case["document_count"]
+            }
+            for case in cases
+        ]
         
         return {"cases": results, "count": len(results)}
     except Exception as e:
@@ -218,68 +238,70 @@ async def find_cases(db: Session, args: dict) -> dict:
         return {"error": str(e), "cases": [], "count": 0}
 
 
-async def search_similar_cases(db: Session, args: dict) -> dict:
+async def search_similar_cases(db: AsyncSession, request: SearchSimilarRequest) -> dict:
     """Search for similar cases using semantic similarity."""
     try:
-        query_text = args.get("query", "").strip()
-        if not query_text:
-            return {"error": "Query text is required", "similar_cases": [], "count": 0}
-        
-        section_type = args.get("section_type", "COURT_REASONING")
-        limit = min(args.get("limit", 5), 50)  # Max 50 results
+        section_type = request.section_type
+        limit = request.limit
+        candidates = max(limit, SIMILAR_RERANK_CANDIDATES)
         
         # Generate embedding for query
         emb_service = get_embedding_service()
-        embeddings = await emb_service.generate_embeddings([query_text])
-        if not embeddings or not embeddings[0]:
+        query_embedding = await emb_service.generate_query_embedding(request.query)
+        if query_embedding is None:
             return {"error": "Failed to generate embedding for query", "similar_cases": [], "count": 0}
         
-        query_embedding = embeddings[0]
+        # query_embedding is a float32 array, bound through the binary pgvector codec (as halfvec)
         
-        # Convert embedding to PostgreSQL vector format
-        embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
+        # Widen the HNSW candidate list to the candidate set size (transaction-local)
+        await db.execute(
+            text("SELECT set_config('hnsw.ef_search', :ef_search, true)"),
+            {"ef_search": str(max(candidates, HNSW_MIN_EF_SEARCH))}
+        )
         
-        # Vector similarity search using pgvector cosine similarity
+        # Approximate candidates from the HNSW index, with their vectors and the case in the same row
         sql = text("""
             SELECT 
                 ec.id as chunk_id,
                 ec.section_id,
-                ec.text,
-                ec.embedding_vector <=> :query_embedding::vector as distance,
+                left(ec.text, 500) as text,
+                ec.embedding_vector,
                 ds.document_version_id,
                 dv.document_id,
-                d.case_id
+                c.id as case_id,
+                c.registry_number
             FROM embedding_chunks ec
             JOIN document_sections ds ON ec.section_id = ds.id
             JOIN document_versions dv ON ds.document_version_id = dv.id
             JOIN documents d ON dv.document_id = d.id
+            JOIN cases c ON d.case_id = c.id
             WHERE ds.section_type = :section_type
-            ORDER BY distance
-            LIMIT :limit
+            ORDER BY ec.embedding_vector <=> :query_embedding
+            LIMIT :candidates
         """)
         
-        result = db.execute(sql, {
-            "query_embedding": embedding_str,
+        rows = (await db.execute(sql, {
+            "query_embedding": query_embedding,
             "section_type": section_type,
-            "limit": limit
-        })
-        
-        results = []
-        for row in result:
-            try:
-                # Get case details
-                case = db.query(Case).filter(Case.id == row.case_id).first()
-                if case:
-                    results.append({
-                        "case_id": str(case.id),
-                        "registry_number": case.registry_number,
-                        "relevance_score": max(0.0, 1 - float(row.distance)),  # Convert distance to similarity
-                        "relevant_text": row.text[:500] if row.text else "",  # First 500 chars
-                        "section_type": section_type
-                    })
-            except Exception as e:
-                logger.warning(f"Error processing search result: {e}")
-                continue
+            "candidates": candidates
+        })).all()
+        if not rows:
+            return {"similar_cases": [], "count": 0}
+        
+        # Rerank the candidates by exact cosine over their halfvec values in one batch
+        vectors = np.stack([row.embedding_vector.to_numpy() for row in rows])
+        top, scores = rerank_by_cosine(query_embedding, vectors, limit)
+        
+        results = [
+            {
+                "case_id": str(rows[i].case_id),
+                "registry_number": rows[i].registry_number,
+                "relevance_score": max(0.0, float(score)),
+                "relevant_text": rows[i].text or "",  # First 500 chars
+                "section_type": section_type
+            }
+            for i, score in zip(top, scores)
+        ]
         
         return {"similar_cases": results, "count": len(results)}
     except Exception as e:
@@ -287,47 +309,44 @@ async def search_similar_cases(db: Session, args: dict) -> dict:
         return {"error": str(e), "similar_cases": [], "count": 0}
 
 
-async def get_case_details(db: Session, args: dict) -> dict:
+async def get_case_details(db: AsyncSession, request: GetCaseRequest) -> dict:
     """Get detailed case information."""
     try:
-        case_id = args.get("case_id", "").strip()
-        if not case_id:
-            return {"error": "case_id is required"}
+        case_id = request.case_id
         
-        # Try UUID first, then registry number
-        case = None
+        # Match by UUID or registry number, loading the court in the same statement
+        lookup = Case.registry_number == case_id
         try:
-            import uuid
-            case_uuid = uuid.UUID(case_id)
-            case = db.query(Case).filter(Case.id == case_uuid).first()
+            lookup = or_(Case.id == uuid.UUID(case_id), lookup)
         except ValueError:
-            case = db.query(Case).filter(Case.registry_number == case_id).first()
+            pass
+        case = (await db.execute(
+            select(Case).options(joinedload(Case.court)).where(lookup).limit(1)
+        )).scalars().first()
         
         if not case:
             return {"error": "Case not found"}
         
-        # Get court
-        court = db.query(Court).filter(Court.id == case.court_id).first()
-        
-        # Get parties
-        parties = db.query(Party, CaseParty.role).join(CaseParty).filter(
-            CaseParty.case_id == case.id
-        ).all()
-        
-        # Get documents
-        documents = db.query(Document).filter(Document.case_id == case.id).all()
-        doc_details = []
-        for doc in documents:
-            version = db.query(DocumentVersion).filter(
-                DocumentVersion.id == doc.current_version_id
-            ).first()
-            if version:
-                doc_details.append({
-                    "document_id": str(doc.id),
-                    "type": doc.type,
-                    "published_at": version.published_at.isoformat() if version.published_at else None,
-                    "source_url": version.source_url
-                })
+        # Get parties and documents concurrently
+        parties_result, documents_result = await gather_queries(
+            select(Party, CaseParty.role).select_from(CaseParty).join(CaseParty.party)
+            .where(CaseParty.case_id == case.id),
+            # Each document with its current version, instead of one version query per document
+            select(Document, DocumentVersion)
+            .join(Document.current_version)
+            .where(Document.case_id == case.id)
+        )
+        court = case.court
+        parties = parties_result.all()
+        doc_details = [
+            {
+                "document_id": str(doc.id),
+                "type": doc.type,
+                "published_at": version.published_at.isoformat() if version.published_at else None,
+                "source_url": version.source_url
+            }
+            for doc, version in documents_result.all()
+        ]
         
         return {
             "case_id": str(case.id),
@@ -349,35 +368,30 @@ async def get_case_details(db: Session, args: dict) -> dict:
         return {"error": str(e)}
 
 
-async def get_document(db: Session, args: dict) -> dict:
+async def get_document(db: AsyncSession, request: GetDocumentRequest) -> dict:
     """Get document with all sections."""
     try:
-        doc_version_id_str = args.get("document_version_id", "").strip()
-        if not doc_version_id_str:
-            return {"error": "document_version_id is required"}
+        doc_version_id = request.document_version_id
         
-        import uuid
-        try:
-            doc_version_id = uuid.UUID(doc_version_id_str)
-        except ValueError:
-            return {"error": "Invalid document_version_id format"}
-        
-        version = db.query(DocumentVersion).filter(DocumentVersion.id == doc_version_id).first()
+        version = (await db.execute(
+            select(DocumentVersion).where(DocumentVersion.id == doc_version_id)
+        )).scalars().first()
         if not version:
             return {"error": "Document version not found"}
         
-        # Get sections
-        sections = db.query(DocumentSection).filter(
-            DocumentSection.document_version_id == doc_version_id
-        ).order_by(DocumentSection.order_index).all()
+        # Stream sections through a server-side cursor; long documents have thousands of them
+        sections = await db.stream(
+            select(
+                DocumentSection.section_type,
+                DocumentSection.order_index,
+                DocumentSection.text
+            ).where(
+                DocumentSection.document_version_id == doc_version_id
+            ).order_by(DocumentSection.order_index)
+            .execution_options(yield_per=SECTION_STREAM_BATCH_SIZE)
+        )
         
-        section_data = []
-        for section in sections:
-            section_data.append({
-                "section_type": section.section_type,
-                "order_index": section.order_index,
-                "text": section.text
-            })
+        section_data = [dict(section) async for section in sections.mappings()]
         
         return {
             "document_version_id": str(version.id),
@@ -392,39 +406,40 @@ async def get_document(db: Session, args: dict) -> dict:
         return {"error": str(e)}
 
 
-async def analyze_judge_patterns(db: Session, args: dict) -> dict:
+async def analyze_judge_patterns(db: AsyncSession, request: AnalyzeJudgeRequest) -> dict:
     """Analyze judge decision patterns."""
     try:
-        judge_name = args.get("judge_name")
-        law_article = args.get("law_article")
-        party_type = args.get("party_type")
+        judge_name = request.judge_name
+        law_article = request.law_article
+        party_type = request.party_type
         
-        query = db.query(DecisionOutcome, DocumentVersion, Judge, Case)
-        query = query.join(DocumentVersion, DecisionOutcome.document_version_id == DocumentVersion.id)
-        query = query.join(Document, DocumentVersion.document_id == Document.id)
-        query = query.join(Case, Document.case_id == Case.id)
-        query = query.join(Judge, Case.court_id == Judge.court_id)
+        # Count decisions per result in the database instead of materializing every row
+        stmt = select(DecisionOutcome.result, func.count()).select_from(DecisionOutcome)
+        stmt = stmt.join(DecisionOutcome.document_version)
+        stmt = stmt.join(DocumentVersion.document)
+        stmt = stmt.join(Document.case)
         
+        # Only the judge who decided the version; joining every judge of the court multiplied the counts
         if judge_name:
-            query = query.filter(Judge.full_name.ilike(f"%{judge_name}%"))
+            stmt = stmt.join(DocumentVersion.presiding_judge).where(Judge.full_name.ilike(f"%{judge_name}%"))
         
         if law_article:
-            query = query.join(DocumentLawRef).join(LawArticle).filter(
+            stmt = stmt.join(DocumentVersion.law_refs).join(DocumentLawRef.law_article).where(
                 LawArticle.code.ilike(f"%{law_article}%")
             )
         
         if party_type:
-            query = query.join(Party, DecisionOutcome.party_id == Party.id).filter(
+            stmt = stmt.join(DecisionOutcome.party).where(
                 Party.type == party_type
             )
         
-        outcomes = query.all()
+        counts = dict((await db.execute(stmt.group_by(DecisionOutcome.result))).all())
         
         # Calculate statistics
-        total = len(outcomes)
-        won = sum(1 for o, _, _, _ in outcomes if o and o.result == "won")
-        lost = sum(1 for o, _, _, _ in outcomes if o and o.result == "lost")
-        partial = sum(1 for o, _, _, _ in outcomes if o and o.result == "partial")
+        total = sum(counts.values())
+        won = counts.get("won", 0)
+        lost = counts.get("lost", 0)
+        partial = counts.get("partial", 0)
         
         return {
             "total_decisions": total,
@@ -1,9 +1,9 @@
 """SQLAlchemy models for Court Registry database."""
-from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, DECIMAL, CheckConstraint, UniqueConstraint
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, DECIMAL, CheckConstraint, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC, Vector
 import uuid
 from database import Base
 
@@ -17,6 +17,15 @@ class Court(Base):
     level = Column(String(50))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index(
+            'idx_courts_name_trgm',
+            'name',
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'}
+        ),
+    )
 
 
 class Judge(Base):
@@ -27,6 +36,15 @@ class Judge(Base):
     court_id = Column(UUID(as_uuid=True), ForeignKey("courts.id"))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index(
+            'idx_judges_full_name_trgm',
+            'full_name',
+            postgresql_using='gin',
+            postgresql_ops={'full_name': 'gin_trgm_ops'}
+        ),
+    )
 
 
 class Case(Base):
@@ -41,6 +59,10 @@ class Case(Base):
     status = Column(String(100))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    court = relationship("Court")
+    parties_assoc = relationship("CaseParty", back_populates="case")
+    documents = relationship("Document", back_populates="case")
 
 
 class Document(Base):
@@ -52,6 +74,15 @@ class Document(Base):
     current_version_id = Column(UUID(as_uuid=True))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    case = relationship("Case", back_populates="documents")
+    versions = relationship("DocumentVersion", back_populates="document")
+    # current_version_id has no FK (it would make documents and versions mutually dependent)
+    current_version = relationship(
+        "DocumentVersion",
+        primaryjoin="foreign(Document.current_version_id) == DocumentVersion.id",
+        viewonly=True
+    )
 
 
 class DocumentVersion(Base):
@@ -65,10 +96,21 @@ class DocumentVersion(Base):
     source_hash = Column(String(64))
     raw_storage_path = Column(Text)
     parsed_json = Column(JSONB)
+    presiding_judge_id = Column(UUID(as_uuid=True), ForeignKey("judges.id"))
+    etag = Column(Text)  # HTTP validators from the last fetch, sent back as conditional GET headers
+    last_modified = Column(Text)
     created_at = Column(DateTime, server_default=func.now())
     
+    document = relationship("Document", back_populates="versions")
+    presiding_judge = relationship("Judge")
+    sections = relationship("DocumentSection", back_populates="document_version")
+    law_refs = relationship("DocumentLawRef", back_populates="document_version")
+    outcomes = relationship("DecisionOutcome", back_populates="document_version")
+    
     __table_args__ = (
         UniqueConstraint('document_id', 'version_number', name='uq_document_version'),
+        Index('idx_document_versions_source_url', 'source_url'),
+        Index('idx_document_versions_presiding_judge', 'presiding_judge_id'),
     )
 
 
@@ -81,6 +123,15 @@ class Party(Base):
     tax_id = Column(String(50))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index(
+            'idx_parties_normalized_name_trgm',
+            'normalized_name',
+            postgresql_using='gin',
+            postgresql_ops={'normalized_name': 'gin_trgm_ops'}
+        ),
+    )
 
 
 class CaseParty(Base):
@@ -89,6 +140,9 @@ class CaseParty(Base):
     case_id = Column(UUID(as_uuid=True), ForeignKey("cases.id"), primary_key=True)
     party_id = Column(UUID(as_uuid=True), ForeignKey("parties.id"), primary_key=True)
     role = Column(String(50), primary_key=True)
+    
+    case = relationship("Case", back_populates="parties_assoc")
+    party = relationship("Party")
 
 
 class LawArticle(Base):
@@ -99,6 +153,15 @@ class LawArticle(Base):
     title = Column(Text)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index(
+            'idx_law_articles_code_trgm',
+            'code',
+            postgresql_using='gin',
+            postgresql_ops={'code': 'gin_trgm_ops'}
+        ),
+    )
 
 
 class DocumentLawRef(Base):
@@ -106,6 +169,9 @@ class DocumentLawRef(Base):
     
     document_version_id = Column(UUID(as_uuid=True), ForeignKey("document_versions.id"), primary_key=True)
     law_article_id = Column(UUID(as_uuid=True), ForeignKey("law_articles.id"), primary_key=True)
+    
+    document_version = relationship("DocumentVersion", back_populates="law_refs")
+    law_article = relationship("LawArticle")
 
 
 class Claim(Base):
@@ -126,6 +192,9 @@ class DecisionOutcome(Base):
     party_id = Column(UUID(as_uuid=True), ForeignKey("parties.id"), primary_key=True)
     result = Column(String(50))
     amount_awarded = Column(DECIMAL(20, 2))
+    
+    document_version = relationship("DocumentVersion", back_populates="outcomes")
+    party = relationship("Party")
 
 
 class DocumentSection(Base):
@@ -137,6 +206,18 @@ class DocumentSection(Base):
     order_index = Column(Integer, nullable=False)
     text = Column(Text, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+    
+    document_version = relationship("DocumentVersion", back_populates="sections")
+    chunks = relationship("EmbeddingChunk", back_populates="section")
+    
+    __table_args__ = (
+        Index(
+            'idx_document_sections_type_version',
+            'section_type',
+            'document_version_id',
+            postgresql_include=['id']
+        ),
+    )
 
 
 class EmbeddingChunk(Base):
@@ -146,9 +227,21 @@ class EmbeddingChunk(Base):
     section_id = Column(UUID(as_uuid=True), ForeignKey("document_sections.id"))
     chunk_index = Column(Integer, nullable=False)
     text = Column(Text, nullable=False)
-    embedding_vector = Column(Vector(1536))
+    embedding_vector = Column(HALFVEC(1536))
     token_count = Column(Integer)
     created_at = Column(DateTime, server_default=func.now())
+    
+    section = relationship("DocumentSection", back_populates="chunks")
+    
+    __table_args__ = (
+        Index(
+            'idx_embedding_chunks_vector_hnsw',
+            'embedding_vector',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 200},
+            postgresql_ops={'embedding_vector': 'halfvec_cosine_ops'}
+        ),
+    )
 
 
 class EmbeddingEntityLink(Base):
@@ -0,0 +1,64 @@
+"""Request models shared by the HTTP API and the MCP tools.
+
+Arguments are validated and normalized here, so handlers use fields as-is.
+"""
+import uuid
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Literal, Optional
+
+# Upper bounds for result sizes; larger requested limits are clamped
+MAX_FIND_CASES_LIMIT = 100
+MAX_SIMILAR_CASES_LIMIT = 50
+
+SectionType = Literal["FACTS", "CLAIMS", "ARGUMENTS", "LAW_REFERENCES", "COURT_REASONING", "DECISION"]
+
+
+class RequestModel(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+
+class FindCasesRequest(RequestModel):
+    plaintiff: Optional[str] = Field(None, description="Name of plaintiff")
+    defendant: Optional[str] = Field(None, description="Name of defendant")
+    law_article: Optional[str] = Field(None, description="Law article code (e.g., 'CCU 625')")
+    date_from: Optional[str] = Field(None, description="Start date (YYYY-MM-DD)")
+    date_to: Optional[str] = Field(None, description="End date (YYYY-MM-DD)")
+    outcome: Optional[Literal["won", "lost", "partial"]] = Field(None, description="Case outcome")
+    court: Optional[str] = Field(None, description="Court name")
+    limit: int = Field(10, ge=1, description="Maximum number of results")
+
+    @field_validator("limit")
+    @classmethod
+    def clamp_limit(cls, v: int) -> int:
+        return min(v, MAX_FIND_CASES_LIMIT)
+
+
+class SearchSimilarRequest(RequestModel):
+    query: str = Field(min_length=1, description="Natural language query describing the case")
+    section_type: SectionType = Field("COURT_REASONING", description="Type of section to search in")
+    limit: int = Field(5, ge=1, description="Maximum number of results")
+
+    @field_validator("limit")
+    @classmethod
+    def clamp_limit(cls, v: int) -> int:
+        return min(v, MAX_SIMILAR_CASES_LIMIT)
+
+
+class GetCaseRequest(RequestModel):
+    case_id: str = Field(min_length=1, description="Case UUID or registry number")
+
+
+class GetDocumentRequest(RequestModel):
+    document_version_id: uuid.UUID = Field(description="Document version UUID")
+
+
+class AnalyzeJudgeRequest(RequestModel):
+    judge_name: Optional[str] = Field(None, description="Judge full name")
+    law_article: Optional[str] = Field(None, description="Law article code")
+    party_type: Optional[Literal["person", "company", "state"]] = Field(None, description="Type of party")
+
+
+class TriggerFetchRequest(RequestModel):
+    date_from: str
+    date_to: Optional[str] = None
+    force: bool = False  # Force re-fetch even if already exists
@@ -0,0 +1,92 @@
+"""Redis read-through cache for API responses."""
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+import orjson
+import redis.asyncio as redis
+from config import settings
+from services.metrics import cache_hits, cache_misses
+
+logger = logging.getLogger(__name__)
+
+# Endpoints whose cached results go stale when documents are ingested or updated
+CACHED_QUERY_ENDPOINTS = ("find_cases", "case_details", "document", "analyze_judge")
+
+
+class ResponseCache:
+    """Caches JSON-serializable query results in Redis, keyed by endpoint and payload."""
+    
+    def __init__(self):
+        """Initialize Redis client."""
+        self.client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            password=settings.redis_password,
+            db=settings.redis_db
+        )
+    
+    @staticmethod
+    def make_key(endpoint: str, payload: Dict[str, Any]) -> str:
+        """Build a stable cache key from the endpoint name and request payload."""
+        digest = hashlib.blake2b(
+            orjson.dumps(payload, option=orjson.OPT_SORT_KEYS),
+            digest_size=16
+        ).hexdigest()
+        return f"{endpoint}:{digest}"
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on miss or Redis failure."""
+        endpoint = key.split(':', 1)[0]
+        try:
+            cached = await self.client.get(key)
+        except Exception as e:
+            logger.warning(f"Cache read failed for {key}: {e}")
+            return None
+        
+        if cached is None:
+            cache_misses.labels(cache_type=endpoint).inc()
+            return None
+        
+        cache_hits.labels(cache_type=endpoint).inc()
+        return orjson.loads(cached)
+    
+    async def set(self, key: str, value: Any, ttl: int):
+        """Store a value with an expiry in seconds."""
+        try:
+            await self.client.set(key, orjson.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+    
+    async def invalidate(self, *endpoints: str):
+        """Drop all cached entries for the given endpoints."""
+        try:
+            for endpoint in endpoints:
+                keys = [key async for key in self.client.scan_iter(match=f"{endpoint}:*", count=500)]
+                if keys:
+                    await self.client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for {endpoints}: {e}")
+    
+    async def close(self):
+        """Close the Redis connection pool."""
+        await self.client.aclose()
+
+
+# Global cache instance
+_cache_instance: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    """Get or create global response cache instance."""
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = ResponseCache()
+    return _cache_instance
+
+
+async def close_cache():
+    """Close global cache instance."""
+    global _cache_instance
+    if _cache_instance:
+        await _cache_instance.close()
+        _cache_instance = None
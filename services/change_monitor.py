@@ -2,110 +2,207 @@
 import asyncio
 import hashlib
 import logging
+import re
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
+from urllib.parse import urljoin
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 import httpx
-from bs4 import BeautifulSoup
+from lxml import etree, html
 from config import settings
+from database import SessionLocal
 from models import DocumentVersion, Case, Document
-from services.storage import StorageService
+from services.fetcher import FETCH_CHUNK_SIZE
+from services.http_client import get_http_client
+from services.storage import StorageService, new_content_hasher
 
 logger = logging.getLogger(__name__)
 
+try:
+    from rbloom import Bloom
+except ImportError:
+    Bloom = None
+
+# Rows per round trip when loading known source URLs into the bloom filter
+KNOWN_URL_LOAD_BATCH_SIZE = 10000
+
+# Matches hrefs pointing at a registry document or case page
+is_document_link = re.compile(r'/(?:Document|Case)/').search
+
+# Text nodes that look like a search result count
+RESULT_COUNT_XPATH = etree.XPath(
+    "//text()[contains(., 'Документів') or contains(., 'записів') or contains(., 'результатів')]"
+)
+
+# The same hints as UTF-8 bytes, found with a plain substring scan of the raw page
+RESULT_COUNT_MARKERS = tuple(word.encode() for word in ('Документів', 'записів', 'результатів'))
+PAGINATION_MARKERS = tuple(text.encode() for text in ('Документів у системі:', 'Документів:'))
+
+# Captures the id segment following /Document/ or /Case/
+DOC_ID_PATTERN = re.compile(r'/(?:Document|Case)/([^/?#]+)')
+
+
+def conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    """Build conditional GET headers from stored ETag / Last-Modified validators."""
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def parse_rss_links(content: bytes) -> List[str]:
+    """Return the item links of an RSS feed (the most recent 100 items)."""
+    root = etree.fromstring(content, etree.XMLParser(recover=True))
+    if root is None:
+        return []
+    return [(item.findtext('link') or '').strip() for item in root.findall('.//item')[:100]]
+
+
+@dataclass
+class SearchPage:
+    """What discovery needs from a search results page."""
+    total_links: int
+    document_links: List[Tuple[str, str]]  # (href, anchor text); text is empty unless requested
+    has_pagination: bool
+    has_result_count: bool
+    result_count_texts: List[str]  # Only collected when text is requested
+
+
+def parse_search_page(content: bytes, with_text: bool = False) -> SearchPage:
+    """Extract document links and result-count hints from a search results page."""
+    tree = html.fromstring(content)
+    links = tree.xpath('//a[@href]')
+    return SearchPage(
+        total_links=len(links),
+        document_links=[
+            (link.get('href'), link.text_content().strip() if with_text else '')
+            for link in links if is_document_link(link.get('href'))
+        ],
+        has_pagination=any(marker in content for marker in PAGINATION_MARKERS),
+        has_result_count=any(marker in content for marker in RESULT_COUNT_MARKERS),
+        result_count_texts=[text.strip() for text in RESULT_COUNT_XPATH(tree)] if with_text else []
+    )
+
 
 class ChangeMonitor:
     """Monitors court registry for new and changed documents."""
     
-    def __init__(self):
-        self.base_url = settings.court_registry_base_url
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            http_client: HTTP client to use; defaults to the process-wide
+                client from get_http_client()
+        """
+        self.base_url = settings.court_registry_base_url.rstrip('/')
         self.search_endpoint = settings.court_registry_search_endpoint
         self.rss_endpoint = settings.court_registry_rss_endpoint
         self.storage = StorageService()
-        self.http_client = httpx.AsyncClient(
-            timeout=settings.fetcher_timeout,
-            follow_redirects=True
-        )
+        self.http_client = http_client or get_http_client()
+        # Bloom filter of stored source URLs, loaded on first discovery (None: always ask the DB)
+        self.known_urls = None
+        self._known_urls_loaded = False
+        # Feed/search request URL -> (ETag, Last-Modified) of its last response
+        self.feed_validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
     
-    async def close(self):
-        """Close HTTP client."""
-        await self.http_client.aclose()
+    async def _get_feed(self, url: str, params: Optional[Dict] = None) -> Optional[httpx.Response]:
+        """
+        GET a feed or search page conditionally.
+        
+        Returns:
+            The response, or None if the server answered 304 Not Modified
+        """
+        key = str(httpx.URL(url, params=params))
+        headers = conditional_headers(*self.feed_validators.get(key, (None, None)))
+        response = await self.http_client.get(url, params=params, headers=headers)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        self.feed_validators[key] = (response.headers.get('etag'), response.headers.get('last-modified'))
+        return response
     
-    async def discover_documents(self, db: Session) -> List[Dict]:
+    async def discover_documents(self) -> List[Dict]:
         """
         Discover new and modified documents from court registry.
         
+        Database lookups run in worker threads with their own sessions, so the
+        event loop (which also serves the API) is never blocked on them.
+        
         Returns:
             List of discovered documents with metadata
         """
         discovered = []
         
         try:
-            # Strategy 1: Check RSS feed if available
-            rss_docs = await self._discover_from_rss(db)
-            discovered.extend(rss_docs)
+            if not self._known_urls_loaded:
+                await asyncio.to_thread(self._load_known_urls)
             
-            # Strategy 2: Check search results (recent cases)
-            search_docs = await self._discover_from_search(db)
-            discovered.extend(search_docs)
+            # Strategy 1: RSS feed; strategy 2: search results (recent cases). Both are network-only
+            rss_candidates, search_candidates = await asyncio.gather(
+                self._collect_rss_candidates(),
+                self._collect_search_candidates()
+            )
             
-            logger.info(f"Discovered {len(discovered)} new/modified documents")
+            # Both sources can list the same document; keep the first occurrence per URL
+            candidates = {}
+            for doc_id, url in rss_candidates + search_candidates:
+                candidates.setdefault(url, doc_id)
+            
+            # One existence check covering both strategies
+            existing_urls = await asyncio.to_thread(self._existing_source_urls, list(candidates))
+            for url, doc_id in candidates.items():
+                if url not in existing_urls:
+                    discovered.append({
+                        "doc_id": doc_id,
+                        "url": url,
+                        "discovered_at": datetime.utcnow(),
+                        "hash_hint": None
+                    })
+            
+            logger.info(
+                f"Discovered {len(discovered)} new/modified documents "
+                f"(candidates: rss={len(rss_candidates)}, search={len(search_candidates)}, already stored={len(existing_urls)})"
+            )
             return discovered
             
         except Exception as e:
             logger.error(f"Error in discovery: {e}", exc_info=True)
             return discovered
     
-    async def _discover_from_rss(self, db: Session) -> List[Dict]:
-        """Discover documents from RSS feed."""
-        discovered = []
+    async def _collect_rss_candidates(self) -> List[Tuple[str, str]]:
+        """Collect (doc_id, url) candidates from the RSS feed."""
+        candidates = []
         
         try:
             rss_url = f"{self.base_url}{self.rss_endpoint}"
-            response = await self.http_client.get(rss_url)
-            response.raise_for_status()
+            response = await self._get_feed(rss_url)
+            if response is None:
+                logger.debug("RSS feed not modified since last poll")
+                return candidates
             
-            # Parse RSS feed
-            soup = BeautifulSoup(response.text, 'xml')
-            items = soup.find_all('item')
-            
-            for item in items[:100]:  # Limit to recent 100
-                link = item.find('link')
-                if not link:
+            # Parse RSS feed in a worker thread so the event loop keeps serving other tasks
+            for url in await asyncio.to_thread(parse_rss_links, response.content):
+                if not url:
                     continue
                 
-                url = link.text.strip()
                 doc_id = self._extract_doc_id_from_url(url)
                 
                 if not doc_id:
                     continue
                 
-                # Check if we already have this document
-                existing = db.query(DocumentVersion).filter(
-                    DocumentVersion.source_url == url
-                ).first()
-                
-                if not existing:
-                    discovered.append({
-                        "doc_id": doc_id,
-                        "url": url,
-                        "discovered_at": datetime.utcnow(),
-                        "hash_hint": None
-                    })
-                else:
-                    # Check if document might have changed
-                    # In production, would fetch and compare hash
-                    pass
+                candidates.append((doc_id, url))
             
         except Exception as e:
             logger.warning(f"RSS discovery failed: {e}")
         
-        return discovered
+        return candidates
     
-    async def _discover_from_search(self, db: Session, date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict]:
-        """Discover documents from search results."""
-        discovered = []
+    async def _collect_search_candidates(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Tuple[str, str]]:
+        """Collect (doc_id, url) candidates from search results."""
+        candidates = []
         
         try:
             # Search for cases in date range
@@ -120,123 +217,158 @@ class ChangeMonitor:
                 "date_to": date_to
             }
             
-            logger.info(f"[SEARCH_ENTER] Starting search: url={search_url}, params={params}")
-            logger.debug(f"[SEARCH_DATA] Search parameters: date_from={date_from}, date_to={date_to}")
-            
-            response = await self.http_client.get(search_url, params=params)
-            response.raise_for_status()
-            
-            logger.info(f"[SEARCH_HTTP] Response received: status={response.status_code}, size={len(response.text)} bytes")
-            logger.debug(f"[SEARCH_HTTP] Response headers: {dict(response.headers)}")
-            
-            # Parse search results
-            soup = BeautifulSoup(response.text, 'html.parser')
+            logger.info("[SEARCH_ENTER] Starting search: url=%s, params=%s", search_url, params)
+            logger.debug("[SEARCH_DATA] Search parameters: date_from=%s, date_to=%s", date_from, date_to)
             
-            # Try to find pagination info
-            total_cases = None
-            total_pages = None
-            current_page = None
+            response = await self._get_feed(search_url, params)
+            if response is None:
+                logger.info("[SEARCH_EXIT] Search results not modified since last poll")
+                return candidates
             
-            # Look for common pagination patterns
-            pagination_text = soup.get_text()
-            if 'Документів у системі:' in pagination_text or 'Документів:' in pagination_text:
-                logger.debug(f"[SEARCH_DATA] Found pagination text in response")
+            logger.info("[SEARCH_HTTP] Response received: status=%s, size=%s bytes", response.status_code, len(response.content))
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                logger.debug("[SEARCH_HTTP] Response headers: %s", dict(response.headers))
             
-            # Try to find result count
-            result_count_elements = soup.find_all(string=lambda text: text and ('Документів' in text or 'записів' in text or 'результатів' in text))
-            if result_count_elements:
-                logger.info(f"[SEARCH_DATA] Found result count elements: {len(result_count_elements)}")
-                for elem in result_count_elements:
-                    logger.debug(f"[SEARCH_DATA] Result count text: {elem.strip()}")
+            # Parse search results in a worker thread; only the extracted values come back
+            page = await asyncio.to_thread(parse_search_page, response.content, debug)
             
-            # Find all links that might be documents
-            links = soup.find_all('a', href=True)
-            logger.info(f"[SEARCH_DATA] Found {len(links)} total links in search results")
+            if page.has_pagination:
+                logger.debug("[SEARCH_DATA] Found pagination text in response")
             
-            document_links = []
-            for link in links:
-                href = link.get('href', '')
-                if '/Document/' in href or '/Case/' in href:
-                    document_links.append((href, link.get_text(strip=True)))
+            if page.has_result_count:
+                logger.info("[SEARCH_DATA] Found result count text in response")
+                for text in page.result_count_texts:
+                    logger.debug("[SEARCH_DATA] Result count text: %s", text)
             
-            logger.info(f"[SEARCH_DATA] Found {len(document_links)} document/case links")
+            logger.info("[SEARCH_DATA] Found %s total links in search results", page.total_links)
+            document_links = page.document_links
+            logger.info("[SEARCH_DATA] Found %s document/case links", len(document_links))
             
             # Process document links
-            processed = 0
-            skipped = 0
             for href, link_text in document_links[:100]:  # Limit to 100 per page
                 full_url = self._make_absolute_url(href)
                 doc_id = self._extract_doc_id_from_url(full_url)
                 
                 if not doc_id:
-                    logger.debug(f"[SEARCH_DATA] Could not extract doc_id from URL: {href}")
+                    logger.debug("[SEARCH_DATA] Could not extract doc_id from URL: %s", href)
                     continue
                 
-                logger.debug(f"[SEARCH_DATA] Processing document: doc_id={doc_id}, url={full_url}, link_text={link_text[:50]}")
-                
-                # Check if new
-                existing = db.query(DocumentVersion).filter(
-                    DocumentVersion.source_url == full_url
-                ).first()
-                
-                if not existing:
-                    discovered.append({
-                        "doc_id": doc_id,
-                        "url": full_url,
-                        "discovered_at": datetime.utcnow(),
-                        "hash_hint": None
-                    })
-                    processed += 1
-                    logger.debug(f"[SEARCH_DATA] New document discovered: doc_id={doc_id}")
-                else:
-                    skipped += 1
-                    logger.debug(f"[SEARCH_DATA] Document already exists: doc_id={doc_id}")
+                if debug:
+                    logger.debug("[SEARCH_DATA] Processing document: doc_id=%s, url=%s, link_text=%s", doc_id, full_url, link_text[:50])
+                candidates.append((doc_id, full_url))
             
-            logger.info(f"[SEARCH_EXIT] Search completed: discovered={len(discovered)}, processed={processed}, skipped={skipped}, total_links={len(document_links)}")
+            logger.info("[SEARCH_EXIT] Search completed: candidates=%s, total_links=%s", len(candidates), len(document_links))
             
         except Exception as e:
-            logger.error(f"[SEARCH_ERROR] Search discovery failed: {e}", exc_info=True)
+            logger.error("[SEARCH_ERROR] Search discovery failed: %s", e, exc_info=True)
+        
+        return candidates
+    
+    def _load_known_urls(self):
+        """Fill the known-URL bloom filter from all stored document versions (blocking)."""
+        self._known_urls_loaded = True
+        if Bloom is None:
+            logger.info("rbloom not installed, checking discovered URLs against the database only")
+            return
+        
+        # Only a fully loaded filter is used: its misses are trusted as new URLs
+        known_urls = Bloom(settings.known_url_filter_capacity, settings.known_url_filter_error_rate)
+        with SessionLocal() as db:
+            rows = db.query(DocumentVersion.source_url).yield_per(KNOWN_URL_LOAD_BATCH_SIZE)
+            known_urls.update(url for url, in rows)
+        self.known_urls = known_urls
+        logger.info("Loaded known document URLs into bloom filter")
+    
+    def _existing_source_urls(self, urls: List[str]) -> Set[str]:
+        """
+        Return the subset of urls already stored as document versions (blocking).
+        
+        The bloom filter only answers definite misses: a URL not in it was never
+        stored, so it is new without a query. URLs in the filter may be false
+        positives and are confirmed with one query, so a new document is never
+        skipped. Without the filter every URL is queried. The filter stays complete
+        because discovery is the only writer of new source URLs and reports each
+        stored document through mark_stored().
+        """
+        if self.known_urls is not None:
+            candidates = {url for url in urls if url in self.known_urls}
+        else:
+            candidates = set(urls)
         
-        return discovered
+        if not candidates:
+            return set()
+        with SessionLocal() as db:
+            rows = db.query(DocumentVersion.source_url).filter(
+                DocumentVersion.source_url.in_(candidates)
+            ).all()
+        return {url for url, in rows}
+    
+    def mark_stored(self, url: str):
+        """Record a newly stored document's source URL in the known-URL filter."""
+        if self.known_urls is not None:
+            self.known_urls.add(url)
     
     def _extract_doc_id_from_url(self, url: str) -> Optional[str]:
         """Extract document ID from URL."""
-        # Placeholder - actual implementation depends on URL structure
         # Example: https://reyestr.court.gov.ua/Document/12345678
-        parts = url.split('/')
-        if 'Document' in parts:
-            idx = parts.index('Document')
-            if idx + 1 < len(parts):
-                return parts[idx + 1]
-        return None
+        match = DOC_ID_PATTERN.search(url)
+        return match.group(1) if match else None
     
     def _make_absolute_url(self, href: str) -> str:
         """Convert relative URL to absolute."""
-        if href.startswith('http'):
+        if href.startswith(('http://', 'https://')):
             return href
-        return f"{self.base_url}{href}"
+        if href.startswith('/') and not href.startswith('//'):
+            # Site-relative links (the common case) need no URL parsing
+            return self.base_url + href
+        return urljoin(self.base_url + '/', href)
     
-    async def check_for_changes(self, db: Session, doc_version: DocumentVersion) -> bool:
+    async def check_for_changes(self, db: Session, doc_version: DocumentVersion) -> Optional[Dict]:
         """
         Check if a document has changed by comparing hashes.
         
+        The request is conditional on the stored ETag / Last-Modified, so an
+        unchanged document is usually answered with a bodiless 304.
+        
         Returns:
-            True if document has changed
+            The changed document as a dict with content, hash, content_type, etag
+            and last_modified (so it need not be downloaded again), or None if it
+            is unchanged or could not be checked
         """
         try:
-            # Fetch current version
-            response = await self.http_client.get(doc_version.source_url)
-            response.raise_for_status()
-            
-            current_hash = self.storage.calculate_hash(response.content)
+            # Stream the current version through the hasher, keeping the body in case it changed
+            hasher = new_content_hasher()
+            chunks = []
+            async with self.http_client.stream(
+                "GET",
+                doc_version.source_url,
+                headers=conditional_headers(doc_version.etag, doc_version.last_modified)
+            ) as response:
+                if response.status_code == 304:
+                    return None
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(FETCH_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    chunks.append(chunk)
+            current_hash = hasher.hexdigest()
             
             # Compare with stored hash
             if doc_version.source_hash != current_hash:
                 logger.info(f"Document {doc_version.id} has changed (hash mismatch)")
-                return True
+                return {
+                    'content': b"".join(chunks),
+                    'hash': current_hash,
+                    'content_type': response.headers.get('content-type', ''),
+                    'etag': response.headers.get('etag'),
+                    'last_modified': response.headers.get('last-modified')
+                }
             
-            return False
+            # Same body: keep the fresh validators so the next check can get a 304
+            doc_version.etag = response.headers.get('etag')
+            doc_version.last_modified = response.headers.get('last-modified')
+            return None
             
         except Exception as e:
             logger.error(f"Error checking changes for {doc_version.id}: {e}")
-            return False
+            return None
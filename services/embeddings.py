@@ -1,12 +1,31 @@
 """Embedding service - generates embeddings using OpenAI API."""
+import asyncio
+import functools
+import hashlib
 import logging
+from itertools import chain
 from typing import List, Optional
+import numpy as np
 import tiktoken
+from cachetools import TTLCache
 from openai import AsyncOpenAI
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# BPE encoding of the text-embedding-3 models
+EMBEDDING_ENCODING = "cl100k_base"
+
+
+@functools.lru_cache(maxsize=4)
+def get_encoding(name: str) -> tiktoken.Encoding:
+    """Load a tiktoken encoding once per process; instances share the BPE tables."""
+    return tiktoken.get_encoding(name)
+
+
+# Warm the cache at import so the first embedding request does not pay the load
+get_encoding(EMBEDDING_ENCODING)
+
 
 class EmbeddingService:
     """Service for generating text embeddings."""
@@ -15,8 +34,15 @@ class EmbeddingService:
         self.model = settings.embedding_model
         self.batch_size = settings.embedding_batch_size
         self.chunk_size = settings.embedding_chunk_size
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
-        self.encoding = tiktoken.encoding_for_model("text-embedding-3-small")
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key, max_retries=settings.embedding_max_retries)
+        # Bounds in-flight batch requests across all callers of this service
+        self.request_slots = asyncio.Semaphore(settings.embedding_concurrency)
+        self.encoding = get_encoding(EMBEDDING_ENCODING)
+        # (model, query digest) -> float32 embedding; the model in the key keeps vectors of different models apart
+        self.query_cache = TTLCache(
+            maxsize=settings.query_embedding_cache_size,
+            ttl=settings.query_embedding_cache_ttl_seconds
+        )
     
     async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
@@ -31,23 +57,24 @@ class EmbeddingService:
         if not texts:
             return []
         
-        try:
-            # Process in batches
-            all_embeddings = []
-            for i in range(0, len(texts), self.batch_size):
-                batch = texts[i:i + self.batch_size]
-                
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with self.request_slots:
                 response = await self.client.embeddings.create(
                     model=self.model,
                     input=batch
                 )
-                
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
-                
-                logger.debug(f"Generated embeddings for batch {i // self.batch_size + 1}")
+            return [item.embedding for item in response.data]
+        
+        try:
+            # Process in batches, several in flight at once; a failed batch cancels the rest
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(embed_batch(texts[i:i + self.batch_size]))
+                    for i in range(0, len(texts), self.batch_size)
+                ]
+            logger.debug(f"Generated embeddings for {len(tasks)} batches")
             
-            return all_embeddings
+            return [embedding for task in tasks for embedding in task.result()]
             
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}", exc_info=True)
@@ -66,6 +93,27 @@ class EmbeddingService:
         embeddings = await self.generate_embeddings([text])
         return embeddings[0] if embeddings else None
     
+    async def generate_query_embedding(self, text: str) -> Optional[np.ndarray]:
+        """
+        Generate the embedding of a search query, reusing it for repeated queries.
+        
+        Args:
+            text: Query text
+            
+        Returns:
+            float32 embedding vector or None if failed
+        """
+        key = (self.model, hashlib.blake2b(text.encode()).digest())
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = await self.generate_embedding(text)
+            if not embedding:
+                return None
+            embedding = np.asarray(embedding, dtype=np.float32)
+            embedding.flags.writeable = False  # Shared by every request for this query
+            self.query_cache[key] = embedding
+        return embedding
+    
     def chunk_text(self, text: str, max_tokens: Optional[int] = None) -> List[str]:
         """
         Split text into chunks for embedding.
@@ -77,21 +125,103 @@ class EmbeddingService:
         Returns:
             List of text chunks
         """
+        return self.chunk_texts([text], max_tokens)[0]
+    
+    def chunk_texts(self, texts: List[str], max_tokens: Optional[int] = None) -> List[List[str]]:
+        """
+        Split several texts into chunks for embedding.
+        
+        Paragraphs (split on blank lines) of all texts are tokenized in one
+        multi-threaded batch and packed greedily into chunks of up to max_tokens.
+        A paragraph longer than that is cut into sliding windows overlapping by
+        an eighth of max_tokens; all windows are decoded in one batch.
+        
+        Args:
+            texts: Texts to chunk
+            max_tokens: Maximum tokens per chunk (defaults to chunk_size)
+            
+        Returns:
+            List of text chunks per input text
+        """
         if max_tokens is None:
             max_tokens = self.chunk_size
         
-        # Tokenize text
-        tokens = self.encoding.encode(text)
+        per_text_paragraphs = [[p for p in text.split("\n\n") if p.strip()] for text in texts]
+        token_lists = iter(self.encoding.encode_ordinary_batch(list(chain.from_iterable(per_text_paragraphs))))
+        separator_tokens = len(self.encoding.encode_ordinary("\n\n"))
+        step = max_tokens - max_tokens // 8
         
-        # Split into chunks
-        chunks = []
-        for i in range(0, len(tokens), max_tokens):
-            chunk_tokens = tokens[i:i + max_tokens]
-            chunk_text = self.encoding.decode(chunk_tokens)
-            chunks.append(chunk_text)
+        per_text_chunks = []
+        windows = []  # Token windows of over-long paragraphs; their chunks hold an index until decoded
+        for paragraphs in per_text_paragraphs:
+            chunks = []
+            packed = []  # Paragraphs of the chunk being filled
+            packed_tokens = 0
+            for paragraph in paragraphs:
+                tokens = next(token_lists)
+                if len(tokens) > max_tokens:
+                    if packed:
+                        chunks.append("\n\n".join(packed))
+                        packed, packed_tokens = [], 0
+                    for i in range(0, len(tokens), step):
+                        chunks.append(len(windows))
+                        windows.append(tokens[i:i + max_tokens])
+                        if i + max_tokens >= len(tokens):
+                            break
+                    continue
+                
+                needed = len(tokens) + (separator_tokens if packed else 0)
+                if packed and packed_tokens + needed > max_tokens:
+                    chunks.append("\n\n".join(packed))
+                    packed, packed_tokens = [], 0
+                    needed = len(tokens)
+                packed.append(paragraph)
+                packed_tokens += needed
+            
+            if packed:
+                chunks.append("\n\n".join(packed))
+            per_text_chunks.append(chunks)
+        
+        if windows:
+            decoded = self.encoding.decode_batch(windows)
+            per_text_chunks = [
+                [decoded[chunk] if isinstance(chunk, int) else chunk for chunk in chunks]
+                for chunks in per_text_chunks
+            ]
         
-        return chunks
+        return per_text_chunks
     
     def count_tokens(self, text: str) -> int:
         """Count tokens in text."""
-        return len(self.encoding.encode(text))
+        return len(self.encoding.encode_ordinary(text))
+    
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """Count tokens of several texts with one (multi-threaded) tokenizer call."""
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+
+
+def rerank_by_cosine(query: np.ndarray, candidates: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pick the top-k candidates by exact cosine similarity to the query.
+    
+    Args:
+        query: Query embedding, shape (dim,)
+        candidates: Candidate embeddings (any float dtype), shape (n, dim)
+        k: Number of candidates to keep
+        
+    Returns:
+        (indices into candidates, similarities), best first
+    """
+    candidates = candidates.astype(np.float32, copy=False)
+    query = query.astype(np.float32, copy=False)
+    # One matrix-vector product over the whole candidate set
+    scores = candidates @ query
+    norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(query)
+    scores = np.divide(scores, norms, out=np.zeros_like(scores), where=norms > 0)
+    
+    if k < len(scores):
+        top = np.argpartition(-scores, k)[:k]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
@@ -1,37 +1,59 @@
 """Fetcher Pool service - downloads documents with retry logic."""
 import asyncio
 import logging
+from email.utils import parsedate_to_datetime
 from typing import Optional, Dict
 import httpx
-from datetime import datetime
+from aiolimiter import AsyncLimiter
+from datetime import datetime, timezone
 from config import settings
+from services.http_client import get_http_client
 from services.storage import StorageService
 
 logger = logging.getLogger(__name__)
 
+# Read size for streamed downloads
+FETCH_CHUNK_SIZE = 65536
+
+# Queued URLs per worker in fetch_batch
+FETCH_QUEUE_DEPTH_PER_WORKER = 4
+
+# Statuses whose Retry-After header sets the retry delay
+RETRY_AFTER_STATUSES = {429, 503}
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds, if present."""
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
 
 class FetcherPool:
     """Pool of workers for fetching documents."""
     
     def __init__(self):
-        logger.info(f"[FETCHER_INIT] Initializing FetcherPool with {settings.fetcher_workers} workers")
+        logger.info("[FETCHER_INIT] Initializing FetcherPool with %s workers", settings.fetcher_workers)
         self.workers = settings.fetcher_workers
         self.max_retries = settings.fetcher_max_retries
         self.timeout = settings.fetcher_timeout
         self.storage = StorageService()
         self.semaphore = asyncio.Semaphore(self.workers)
-        self.http_client = httpx.AsyncClient(
-            timeout=self.timeout,
-            follow_redirects=True,
-            limits=httpx.Limits(max_connections=self.workers * 2)
-        )
-        logger.info(f"[FETCHER_INIT] FetcherPool initialized: workers={self.workers}, max_retries={self.max_retries}, timeout={self.timeout}s")
-    
-    async def close(self):
-        """Close HTTP client."""
-        logger.info("[FETCHER_CLOSE] Closing FetcherPool HTTP client")
-        await self.http_client.aclose()
-        logger.info("[FETCHER_CLOSE] FetcherPool HTTP client closed")
+        # Token bucket pacing every request attempt, so batches don't burst past the registry's rate limit
+        self.limiter = AsyncLimiter(settings.fetcher_requests_per_second, 1)
+        self.http_client = get_http_client()
+        logger.info("[FETCHER_INIT] FetcherPool initialized: workers=%s, max_retries=%s, timeout=%ss", self.workers, self.max_retries, self.timeout)
     
     async def fetch_document(self, url: str, doc_id: str) -> Optional[Dict]:
         """
@@ -42,85 +64,120 @@ class FetcherPool:
             doc_id: Document UUID
             
         Returns:
-            Dict with content, hash, and storage path, or None if failed
+            Dict with content, hash (content fingerprint hex), and storage path, or None if failed
         """
-        logger.info(f"[FETCHER_ENTER] fetch_document called: doc_id={doc_id}, url={url}")
-        logger.debug(f"[FETCHER_DATA] Input data: doc_id={doc_id}, url={url}, workers={self.workers}, max_retries={self.max_retries}")
+        logger.info("[FETCHER_ENTER] fetch_document called: doc_id=%s, url=%s", doc_id, url)
+        logger.debug("[FETCHER_DATA] Input data: doc_id=%s, url=%s, workers=%s, max_retries=%s", doc_id, url, self.workers, self.max_retries)
         
         # Log semaphore acquisition
-        logger.debug(f"[FETCHER_SEMAPHORE] Waiting for semaphore slot (available workers: {self.workers})")
+        logger.debug("[FETCHER_SEMAPHORE] Waiting for semaphore slot (available workers: %s)", self.workers)
         async with self.semaphore:
-            logger.info(f"[FETCHER_SEMAPHORE] Semaphore acquired for doc_id={doc_id}, url={url}")
+            logger.info("[FETCHER_SEMAPHORE] Semaphore acquired for doc_id=%s, url=%s", doc_id, url)
             
             for attempt in range(self.max_retries):
+                wait_time = 2 ** attempt
                 try:
-                    logger.info(f"[FETCHER_ATTEMPT] Fetching doc_id={doc_id}, url={url}, attempt={attempt + 1}/{self.max_retries}")
+                    await self.limiter.acquire()
+                    logger.info("[FETCHER_ATTEMPT] Fetching doc_id=%s, url=%s, attempt=%s/%s", doc_id, url, attempt + 1, self.max_retries)
                     
                     # Log HTTP request
-                    logger.debug(f"[FETCHER_HTTP] Sending GET request to url={url}, timeout={self.timeout}s")
-                    response = await self.http_client.get(url)
-                    logger.debug(f"[FETCHER_HTTP] Response received: status={response.status_code}, headers={dict(response.headers)}")
-                    response.raise_for_status()
-                    
-                    # Determine file extension
-                    content_type = response.headers.get('content-type', '')
-                    if 'pdf' in content_type.lower():
-                        ext = 'pdf'
-                    else:
-                        ext = 'html'
+                    logger.debug("[FETCHER_HTTP] Sending GET request to url=%s, timeout=%ss", url, self.timeout)
+                    chunks = []
+                    async with self.http_client.stream("GET", url) as response:
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("[FETCHER_HTTP] Response received: status=%s, headers=%s", response.status_code, dict(response.headers))
+                        response.raise_for_status()
+                        
+                        async for chunk in response.aiter_bytes(FETCH_CHUNK_SIZE):
+                            chunks.append(chunk)
                     
-                    content = response.content
-                    content_size = len(content)
-                    logger.info(f"[FETCHER_DATA] Content received: doc_id={doc_id}, size={content_size} bytes, content_type={content_type}, extension={ext}")
-                    
-                    # Calculate hash
-                    logger.debug(f"[FETCHER_DATA] Calculating hash for doc_id={doc_id}, size={content_size} bytes")
-                    content_hash = self.storage.calculate_hash(content)
-                    logger.info(f"[FETCHER_DATA] Hash calculated: doc_id={doc_id}, hash={content_hash}, size={content_size} bytes")
-                    
-                    # Save to storage
-                    logger.info(f"[FETCHER_STORAGE] Saving document: doc_id={doc_id}, extension={ext}, size={content_size} bytes")
-                    storage_path = self.storage.save(doc_id, content, ext)
-                    logger.info(f"[FETCHER_STORAGE] Document saved: doc_id={doc_id}, storage_path={storage_path}, size={content_size} bytes")
-                    
-                    result = {
-                        "content": content,
-                        "hash": content_hash,
-                        "storage_path": storage_path,
-                        "content_type": content_type,
-                        "extension": ext,
-                        "url": url,
-                        "fetched_at": datetime.utcnow()
-                    }
-                    
-                    logger.info(f"[FETCHER_SUCCESS] Successfully fetched doc_id={doc_id}, url={url}, hash={content_hash[:16]}..., size={content_size} bytes, storage_path={storage_path}")
-                    logger.debug(f"[FETCHER_DATA] Return data: doc_id={doc_id}, hash={content_hash}, size={content_size}, content_type={content_type}, extension={ext}, storage_path={storage_path}")
-                    
-                    return result
+                    return await self.store_content(
+                        url,
+                        doc_id,
+                        b"".join(chunks),
+                        response.headers.get('content-type', ''),
+                        etag=response.headers.get('etag'),
+                        last_modified=response.headers.get('last-modified')
+                    )
                     
                 except httpx.HTTPStatusError as e:
                     if e.response.status_code == 404:
-                        logger.warning(f"[FETCHER_ERROR] Document not found: doc_id={doc_id}, url={url}, status=404")
-                        logger.info(f"[FETCHER_EXIT] fetch_document returning None (404) for doc_id={doc_id}")
+                        logger.warning("[FETCHER_ERROR] Document not found: doc_id=%s, url=%s, status=404", doc_id, url)
+                        logger.info("[FETCHER_EXIT] fetch_document returning None (404) for doc_id=%s", doc_id)
                         return None
-                    logger.warning(f"[FETCHER_ERROR] HTTP error: doc_id={doc_id}, url={url}, status={e.response.status_code}, error={e}")
+                    logger.warning("[FETCHER_ERROR] HTTP error: doc_id=%s, url=%s, status=%s, error=%s", doc_id, url, e.response.status_code, e)
+                    if e.response.status_code in RETRY_AFTER_STATUSES:
+                        retry_after = retry_after_seconds(e.response)
+                        if retry_after is not None:
+                            wait_time = min(retry_after, settings.fetcher_max_retry_after)
                     
                 except httpx.TimeoutException:
-                    logger.warning(f"[FETCHER_ERROR] Timeout: doc_id={doc_id}, url={url}, attempt={attempt + 1}, timeout={self.timeout}s")
+                    logger.warning("[FETCHER_ERROR] Timeout: doc_id=%s, url=%s, attempt=%s, timeout=%ss", doc_id, url, attempt + 1, self.timeout)
                     
                 except Exception as e:
-                    logger.error(f"[FETCHER_ERROR] Exception: doc_id={doc_id}, url={url}, attempt={attempt + 1}, error={e}", exc_info=True)
+                    logger.error("[FETCHER_ERROR] Exception: doc_id=%s, url=%s, attempt=%s, error=%s", doc_id, url, attempt + 1, e, exc_info=True)
                 
-                # Wait before retry (exponential backoff)
+                # Wait before retry (exponential backoff, or the server's Retry-After)
                 if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt
-                    logger.debug(f"[FETCHER_RETRY] Waiting {wait_time}s before retry for doc_id={doc_id}, attempt={attempt + 1}")
+                    logger.debug("[FETCHER_RETRY] Waiting %ss before retry for doc_id=%s, attempt=%s", wait_time, doc_id, attempt + 1)
                     await asyncio.sleep(wait_time)
             
-            logger.error(f"[FETCHER_FAILED] Failed to fetch after {self.max_retries} attempts: doc_id={doc_id}, url={url}")
-            logger.info(f"[FETCHER_EXIT] fetch_document returning None (max retries exceeded) for doc_id={doc_id}")
+            logger.error("[FETCHER_FAILED] Failed to fetch after %s attempts: doc_id=%s, url=%s", self.max_retries, doc_id, url)
+            logger.info("[FETCHER_EXIT] fetch_document returning None (max retries exceeded) for doc_id=%s", doc_id)
             return None
     
+    async def store_content(
+        self,
+        url: str,
+        doc_id: str,
+        content: bytes,
+        content_type: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Dict:
+        """
+        Hash and store downloaded document content.
+        
+        Args:
+            content_hash: Content fingerprint, if the caller already hashed the body while streaming it
+            
+        Returns:
+            Dict with content, hash (content fingerprint hex), and storage path, as from fetch_document
+        """
+        # Determine file extension
+        ext = 'pdf' if 'pdf' in content_type.lower() else 'html'
+        content_size = len(content)
+        logger.info("[FETCHER_DATA] Content received: doc_id=%s, size=%s bytes, content_type=%s, extension=%s", doc_id, content_size, content_type, ext)
+        
+        # Hash and save to storage
+        logger.info("[FETCHER_STORAGE] Saving document: doc_id=%s, extension=%s, size=%s bytes", doc_id, ext, content_size)
+        # Hashing and disk / MinIO writes block, so both run in worker threads; the hash
+        # functions release the GIL, so concurrent fetches hash on separate cores
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(self.storage.calculate_hash, content)
+        logger.info("[FETCHER_DATA] Hash calculated: doc_id=%s, hash=%s, size=%s bytes", doc_id, content_hash, content_size)
+        # Storage is keyed by the hash, so identical content is not written twice
+        storage_path = await asyncio.to_thread(self.storage.save, doc_id, content, ext, content_hash)
+        logger.info("[FETCHER_STORAGE] Document saved: doc_id=%s, storage_path=%s, size=%s bytes", doc_id, storage_path, content_size)
+        
+        result = {
+            "content": content,
+            "hash": content_hash,
+            "storage_path": storage_path,
+            "content_type": content_type,
+            "extension": ext,
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": datetime.utcnow()
+        }
+        
+        logger.info("[FETCHER_SUCCESS] Successfully fetched doc_id=%s, url=%s, hash=%s..., size=%s bytes, storage_path=%s", doc_id, url, content_hash[:16], content_size, storage_path)
+        logger.debug("[FETCHER_DATA] Return data: doc_id=%s, hash=%s, size=%s, content_type=%s, extension=%s, storage_path=%s", doc_id, content_hash, content_size, content_type, ext, storage_path)
+        
+        return result
+    
     async def fetch_batch(self, urls: list[tuple[str, str]]) -> list[Dict]:
         """
         Fetch multiple documents concurrently.
@@ -132,17 +189,35 @@ class FetcherPool:
             List of fetch results
         """
         batch_size = len(urls)
-        logger.info(f"[FETCHER_BATCH_ENTER] fetch_batch called: batch_size={batch_size}, workers={self.workers}")
-        logger.debug(f"[FETCHER_BATCH_DATA] Input URLs: {[f'doc_id={doc_id}, url={url}' for url, doc_id in urls]}")
+        logger.info("[FETCHER_BATCH_ENTER] fetch_batch called: batch_size=%s, workers=%s", batch_size, self.workers)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[FETCHER_BATCH_DATA] Input URLs: %s", [f'doc_id={doc_id}, url={url}' for url, doc_id in urls])
         
-        # Create tasks
-        tasks = [self.fetch_document(url, doc_id) for url, doc_id in urls]
-        logger.debug(f"[FETCHER_BATCH_DATA] Created {len(tasks)} fetch tasks")
+        # A fixed pool of workers drains a bounded queue, so task count and memory stay O(workers)
+        results: list = [None] * batch_size
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * FETCH_QUEUE_DEPTH_PER_WORKER)
+        
+        async def worker():
+            while True:
+                idx, url, doc_id = await queue.get()
+                try:
+                    results[idx] = await self.fetch_document(url, doc_id)
+                except Exception as e:
+                    results[idx] = e
+                finally:
+                    queue.task_done()
         
-        # Execute all tasks concurrently
-        logger.info(f"[FETCHER_BATCH_EXEC] Executing {batch_size} fetch tasks concurrently (max {self.workers} workers)")
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        logger.info(f"[FETCHER_BATCH_EXEC] All {batch_size} tasks completed")
+        logger.info("[FETCHER_BATCH_EXEC] Fetching %s documents with %s workers", batch_size, self.workers)
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.workers, batch_size))]
+        try:
+            for idx, (url, doc_id) in enumerate(urls):
+                await queue.put((idx, url, doc_id))
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        logger.info("[FETCHER_BATCH_EXEC] All %s fetches completed", batch_size)
         
         # Filter out exceptions and None results
         fetched = []
@@ -152,16 +227,16 @@ class FetcherPool:
         for idx, result in enumerate(results):
             url, doc_id = urls[idx]
             if isinstance(result, Exception):
-                logger.error(f"[FETCHER_BATCH_ERROR] Exception in batch fetch: doc_id={doc_id}, url={url}, error={result}")
+                logger.error("[FETCHER_BATCH_ERROR] Exception in batch fetch: doc_id=%s, url=%s, error=%s", doc_id, url, result)
                 exceptions.append((doc_id, url, result))
             elif result is not None:
-                logger.debug(f"[FETCHER_BATCH_SUCCESS] Successfully fetched: doc_id={doc_id}, url={url}, size={len(result.get('content', []))} bytes")
+                logger.debug("[FETCHER_BATCH_SUCCESS] Successfully fetched: doc_id=%s, url=%s, size=%s bytes", doc_id, url, len(result.get('content', [])))
                 fetched.append(result)
             else:
-                logger.warning(f"[FETCHER_BATCH_FAILED] Failed to fetch: doc_id={doc_id}, url={url}")
+                logger.warning("[FETCHER_BATCH_FAILED] Failed to fetch: doc_id=%s, url=%s", doc_id, url)
                 failed.append((doc_id, url))
         
-        logger.info(f"[FETCHER_BATCH_EXIT] Batch fetch completed: total={batch_size}, successful={len(fetched)}, failed={len(failed)}, exceptions={len(exceptions)}")
-        logger.debug(f"[FETCHER_BATCH_DATA] Results: successful={len(fetched)}, failed={len(failed)}, exceptions={len(exceptions)}")
+        logger.info("[FETCHER_BATCH_EXIT] Batch fetch completed: total=%s, successful=%s, failed=%s, exceptions=%s", batch_size, len(fetched), len(failed), len(exceptions))
+        logger.debug("[FETCHER_BATCH_DATA] Results: successful=%s, failed=%s, exceptions=%s", len(fetched), len(failed), len(exceptions))
         
         return fetched
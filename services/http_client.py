@@ -0,0 +1,38 @@
+"""Shared HTTP client for court registry requests."""
+import logging
+from typing import Optional
+import httpx
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Global client instance; discovery, fetching, change checks and the API share its connection pool
+_client_instance: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the global HTTP client (HTTP/2, keep-alive sized for the fetcher workers)."""
+    global _client_instance
+    if _client_instance is None:
+        _client_instance = httpx.AsyncClient(
+            http2=True,
+            timeout=settings.fetcher_timeout,
+            follow_redirects=True,
+            headers={"User-Agent": settings.court_registry_user_agent},
+            limits=httpx.Limits(
+                max_keepalive_connections=settings.fetcher_workers,
+                max_connections=settings.fetcher_workers * 2,
+                keepalive_expiry=300
+            )
+        )
+        logger.info("Shared HTTP client created")
+    return _client_instance
+
+
+async def close_http_client():
+    """Close the global HTTP client."""
+    global _client_instance
+    if _client_instance:
+        await _client_instance.aclose()
+        _client_instance = None
+        logger.info("Shared HTTP client closed")
@@ -1,53 +1,136 @@
 """Kafka client for event streaming in Court Registry MCP."""
-import json
+import asyncio
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
-from kafka import KafkaProducer, KafkaConsumer
-from kafka.errors import KafkaError
+from functools import partial
+from typing import Optional, Dict, Any, List, Tuple
+import orjson
+from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
 from config import settings
-from services.metrics import kafka_events_published, kafka_events_failed
+from services.metrics import inc_kafka_published, inc_kafka_failed
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for a batched publish to be acknowledged
+KAFKA_BATCH_FLUSH_TIMEOUT = 30
+
+# Event timestamps are naive UTC (datetime.utcnow()); orjson writes them as ISO 8601 with a Z suffix
+EVENT_JSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def serialize_event(event: Dict[str, Any]) -> bytes:
+    """Serialize an event payload to JSON bytes."""
+    return orjson.dumps(event, option=EVENT_JSON_OPTIONS)
+
 
 class KafkaEventProducer:
-    """Kafka producer for publishing events."""
+    """Kafka producer for publishing events (asyncio-native, started on first use)."""
     
     def __init__(self):
-        """Initialize Kafka producer."""
-        self.producer = None
-        if settings.kafka_enabled:
-            try:
-                self.producer = KafkaProducer(
+        """Initialize Kafka producer state; the connection is made by start()."""
+        self.producer: Optional[AIOKafkaProducer] = None
+        self._started = False
+        self._start_lock = asyncio.Lock()
+    
+    async def start(self) -> Optional[AIOKafkaProducer]:
+        """Connect the producer once; returns None if Kafka is disabled or unreachable."""
+        if self._started:
+            return self.producer
+        async with self._start_lock:
+            if self._started:
+                return self.producer
+            if settings.kafka_enabled:
+                producer = AIOKafkaProducer(
                     bootstrap_servers=settings.kafka_bootstrap_servers.split(','),
-                    value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+                    value_serializer=serialize_event,
                     key_serializer=lambda k: k.encode('utf-8') if k else None,
                     acks='all',  # Wait for all replicas
-                    retries=3,
-                    max_in_flight_requests_per_connection=1,
+                    linger_ms=settings.kafka_linger_ms,
+                    max_batch_size=settings.kafka_batch_size,
+                    compression_type=settings.kafka_compression_type,
                     enable_idempotence=True
                 )
-                logger.info(f"Kafka producer initialized: {settings.kafka_bootstrap_servers}")
-            except Exception as e:
-                logger.error(f"Failed to initialize Kafka producer: {e}")
-                self.producer = None
+                try:
+                    await producer.start()
+                    self.producer = producer
+                    logger.info(f"Kafka producer initialized: {settings.kafka_bootstrap_servers}")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Kafka producer: {e}")
+                    await producer.stop()
+            self._started = True
+        return self.producer
     
-    def publish_discovered(self, doc_id: str, case_id: str, url: str, hash_hint: Optional[str] = None):
+    async def publish_discovered(self, doc_id: str, case_id: str, url: str, hash_hint: Optional[str] = None):
         """Publish document discovery event.
         
         Topic: court.documents.discovered
         """
-        event = {
+        event = self._discovered_event(doc_id, case_id, url, hash_hint, datetime.utcnow())
+        return await self._publish('court.documents.discovered', doc_id, event)
+    
+    async def publish_discovered_batch(self, items: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Publish many document discovery events with a single flush.
+        
+        Topic: court.documents.discovered
+        
+        Args:
+            items: Dicts with doc_id, case_id, url and optional hash_hint keys
+            
+        Returns:
+            Tuple of (delivered, failed) counts
+        """
+        topic = 'court.documents.discovered'
+        if not items:
+            return 0, 0
+        producer = await self.start()
+        if not producer:
+            logger.warning(f"Kafka producer not available, skipping {len(items)} events: {topic}")
+            inc_kafka_failed(topic, 'producer_unavailable', len(items))
+            return 0, len(items)
+        
+        futures = []
+        failed = 0
+        discovered_at = datetime.utcnow()  # One timestamp for the whole batch
+        for item in items:
+            event = self._discovered_event(
+                item['doc_id'], item.get('case_id', ''), item['url'], item.get('hash_hint'), discovered_at
+            )
+            try:
+                futures.append(await producer.send(topic, value=event, key=item['doc_id']))
+            except Exception as e:
+                logger.error(f"Failed to enqueue event to {topic}: {e}")
+                failed += 1
+        
+        # One flush for the whole batch instead of waiting on every send
+        try:
+            await asyncio.wait_for(producer.flush(), KAFKA_BATCH_FLUSH_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Failed to flush batch to {topic}: {e}")
+        
+        delivered = sum(1 for future in futures if future.done() and not future.cancelled() and future.exception() is None)
+        failed += len(futures) - delivered
+        
+        inc_kafka_published(topic, 'success', delivered)
+        if failed:
+            inc_kafka_published(topic, 'failed', failed)
+            inc_kafka_failed(topic, 'kafka_error', failed)
+        logger.debug(f"Published batch to {topic}: delivered={delivered}, failed={failed}")
+        return delivered, failed
+    
+    @staticmethod
+    def _discovered_event(
+        doc_id: str, case_id: str, url: str, hash_hint: Optional[str], discovered_at: datetime
+    ) -> Dict[str, Any]:
+        """Build a document discovery event payload."""
+        return {
             'doc_id': doc_id,
             'case_id': case_id,
             'url': url,
-            'discovered_at': datetime.utcnow().isoformat(),
+            'discovered_at': discovered_at,
             'hash_hint': hash_hint
         }
-        return self._publish('court.documents.discovered', doc_id, event)
     
-    def publish_fetched(self, doc_id: str, storage_path: str, sha256: str):
+    async def publish_fetched(self, doc_id: str, storage_path: str, sha256: str):
         """Publish document fetch event.
         
         Topic: court.documents.fetched
@@ -56,11 +139,11 @@ class KafkaEventProducer:
             'doc_id': doc_id,
             'storage_path': storage_path,
             'sha256': sha256,
-            'fetched_at': datetime.utcnow().isoformat()
+            'fetched_at': datetime.utcnow()
         }
-        return self._publish('court.documents.fetched', doc_id, event)
+        return await self._publish('court.documents.fetched', doc_id, event)
     
-    def publish_parsed(self, doc_id: str, version_id: str, entities: Dict[str, Any], law_refs: list):
+    async def publish_parsed(self, doc_id: str, version_id: str, entities: Dict[str, Any], law_refs: list):
         """Publish document parse event.
         
         Topic: court.documents.parsed
@@ -70,11 +153,11 @@ class KafkaEventProducer:
             'version_id': version_id,
             'entities': entities,
             'law_refs': law_refs,
-            'parsed_at': datetime.utcnow().isoformat()
+            'parsed_at': datetime.utcnow()
         }
-        return self._publish('court.documents.parsed', doc_id, event)
+        return await self._publish('court.documents.parsed', doc_id, event)
     
-    def publish_failed(self, doc_id: str, stage: str, error: str, error_details: Optional[Dict] = None):
+    async def publish_failed(self, doc_id: str, stage: str, error: str, error_details: Optional[Dict] = None):
         """Publish document processing failure event.
         
         Topic: court.documents.failed
@@ -84,48 +167,61 @@ class KafkaEventProducer:
             'stage': stage,  # 'discovery', 'fetch', 'parse', 'embedding'
             'error': error,
             'error_details': error_details or {},
-            'failed_at': datetime.utcnow().isoformat()
+            'failed_at': datetime.utcnow()
         }
-        return self._publish('court.documents.failed', doc_id, event)
+        return await self._publish('court.documents.failed', doc_id, event)
     
-    def _publish(self, topic: str, key: str, event: Dict[str, Any]) -> bool:
-        """Publish event to Kafka topic."""
-        if not self.producer:
+    async def _publish(self, topic: str, key: str, event: Dict[str, Any]):
+        """Enqueue event for a Kafka topic without waiting for delivery.
+        
+        Delivery is reported through a done callback; await flush() to wait for
+        everything enqueued so far.
+        
+        Returns:
+            The delivery future, or None if the event could not be enqueued
+        """
+        producer = await self.start()
+        if not producer:
             logger.warning(f"Kafka producer not available, skipping event: {topic}")
-            kafka_events_failed.labels(topic=topic, error_type='producer_unavailable').inc()
-            return False
+            inc_kafka_failed(topic, 'producer_unavailable')
+            return None
         
         try:
-            future = self.producer.send(topic, key=key, value=event)
-            # Wait for the message to be sent
-            record_metadata = future.get(timeout=10)
+            future = await producer.send(topic, value=event, key=key)
+        except Exception as e:
+            logger.error(f"Unexpected error publishing to {topic}: {e}")
+            inc_kafka_published(topic, 'failed')
+            inc_kafka_failed(topic, 'unexpected_error')
+            return None
+        
+        future.add_done_callback(partial(self._on_send_done, topic))
+        return future
+    
+    @staticmethod
+    def _on_send_done(topic: str, future: asyncio.Future):
+        error = future.exception() if not future.cancelled() else asyncio.CancelledError()
+        if error is None:
+            record_metadata = future.result()
             logger.debug(
                 f"Published event to {topic} [partition={record_metadata.partition}, "
                 f"offset={record_metadata.offset}]"
             )
-            kafka_events_published.labels(topic=topic, status='success').inc()
-            return True
-        except KafkaError as e:
-            logger.error(f"Failed to publish event to {topic}: {e}")
-            kafka_events_published.labels(topic=topic, status='failed').inc()
-            kafka_events_failed.labels(topic=topic, error_type='kafka_error').inc()
-            return False
-        except Exception as e:
-            logger.error(f"Unexpected error publishing to {topic}: {e}")
-            kafka_events_published.labels(topic=topic, status='failed').inc()
-            kafka_events_failed.labels(topic=topic, error_type='unexpected_error').inc()
-            return False
+            inc_kafka_published(topic, 'success')
+        else:
+            logger.error(f"Failed to publish event to {topic}: {error}")
+            inc_kafka_published(topic, 'failed')
+            inc_kafka_failed(topic, 'kafka_error')
     
-    def flush(self):
+    async def flush(self):
         """Flush all pending messages."""
         if self.producer:
-            self.producer.flush()
+            await self.producer.flush()
     
-    def close(self):
-        """Close the producer."""
+    async def close(self):
+        """Close the producer (pending messages are flushed first)."""
         if self.producer:
-            self.flush()
-            self.producer.close()
+            await self.producer.stop()
+            self.producer = None
             logger.info("Kafka producer closed")
 
 
@@ -133,7 +229,7 @@ class KafkaEventConsumer:
     """Kafka consumer for processing events."""
     
     def __init__(self, group_id: str, topics: list, auto_offset_reset: str = 'earliest'):
-        """Initialize Kafka consumer.
+        """Initialize Kafka consumer; call start() before polling.
         
         Args:
             group_id: Consumer group ID
@@ -143,25 +239,30 @@ class KafkaEventConsumer:
         self.consumer = None
         self.topics = topics
         self.group_id = group_id
-        
-        if settings.kafka_enabled:
-            try:
-                self.consumer = KafkaConsumer(
-                    *topics,
-                    bootstrap_servers=settings.kafka_bootstrap_servers.split(','),
-                    group_id=group_id,
-                    value_deserializer=lambda m: json.loads(m.decode('utf-8')),
-                    key_deserializer=lambda k: k.decode('utf-8') if k else None,
-                    auto_offset_reset=auto_offset_reset,
-                    enable_auto_commit=True,
-                    consumer_timeout_ms=1000  # Timeout for polling
-                )
-                logger.info(f"Kafka consumer initialized: group={group_id}, topics={topics}")
-            except Exception as e:
-                logger.error(f"Failed to initialize Kafka consumer: {e}")
-                self.consumer = None
+        self.auto_offset_reset = auto_offset_reset
+    
+    async def start(self):
+        """Connect the consumer and join the group."""
+        if not settings.kafka_enabled or self.consumer:
+            return
+        consumer = AIOKafkaConsumer(
+            *self.topics,
+            bootstrap_servers=settings.kafka_bootstrap_servers.split(','),
+            group_id=self.group_id,
+            value_deserializer=orjson.loads,
+            key_deserializer=lambda k: k.decode('utf-8') if k else None,
+            auto_offset_reset=self.auto_offset_reset,
+            enable_auto_commit=True
+        )
+        try:
+            await consumer.start()
+            self.consumer = consumer
+            logger.info(f"Kafka consumer initialized: group={self.group_id}, topics={self.topics}")
+        except Exception as e:
+            logger.error(f"Failed to initialize Kafka consumer: {e}")
+            await consumer.stop()
     
-    def poll(self, timeout_ms: int = 1000):
+    async def poll(self, timeout_ms: int = 1000):
         """Poll for messages.
         
         Returns:
@@ -171,20 +272,21 @@ class KafkaEventConsumer:
             return {}
         
         try:
-            return self.consumer.poll(timeout_ms=timeout_ms)
+            return await self.consumer.getmany(timeout_ms=timeout_ms)
         except Exception as e:
             logger.error(f"Error polling Kafka: {e}")
             return {}
     
-    def commit(self):
+    async def commit(self):
         """Commit offsets."""
         if self.consumer:
-            self.consumer.commit()
+            await self.consumer.commit()
     
-    def close(self):
+    async def close(self):
         """Close the consumer."""
         if self.consumer:
-            self.consumer.close()
+            await self.consumer.stop()
+            self.consumer = None
             logger.info(f"Kafka consumer closed: group={self.group_id}")
 
 
@@ -200,9 +302,9 @@ def get_producer() -> KafkaEventProducer:
     return _producer_instance
 
 
-def close_producer():
+async def close_producer():
     """Close global producer instance."""
     global _producer_instance
     if _producer_instance:
-        _producer_instance.close()
+        await _producer_instance.close()
         _producer_instance = None
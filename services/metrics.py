@@ -1,7 +1,10 @@
 """Prometheus metrics for Court Registry MCP."""
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from prometheus_client.core import CollectorRegistry
+from itertools import product
+import threading
 import time
+from config import settings
 
 # Create a custom registry
 registry = CollectorRegistry()
@@ -101,9 +104,87 @@ cache_misses = Counter(
 )
 
 
+# Labeled children for the known label values, created once so hot paths skip .labels()
+KAFKA_TOPICS = (
+    'court.documents.discovered',
+    'court.documents.fetched',
+    'court.documents.parsed',
+    'court.documents.failed',
+)
+KAFKA_PUBLISH_STATUSES = ('success', 'failed')
+KAFKA_ERROR_TYPES = ('producer_unavailable', 'kafka_error', 'unexpected_error')
+DOCUMENT_STATUSES = ('success', 'failed')
+PROCESSING_STAGES = ('fetch', 'parse')
+
+KAFKA_PUBLISHED = {
+    (topic, status): kafka_events_published.labels(topic=topic, status=status)
+    for topic, status in product(KAFKA_TOPICS, KAFKA_PUBLISH_STATUSES)
+}
+KAFKA_FAILED = {
+    (topic, error_type): kafka_events_failed.labels(topic=topic, error_type=error_type)
+    for topic, error_type in product(KAFKA_TOPICS, KAFKA_ERROR_TYPES)
+}
+DOCUMENTS_FETCHED = {status: documents_fetched.labels(status=status) for status in DOCUMENT_STATUSES}
+DOCUMENTS_PARSED = {status: documents_parsed.labels(status=status) for status in DOCUMENT_STATUSES}
+PROCESSING_DURATION = {stage: document_processing_duration.labels(stage=stage) for stage in PROCESSING_STAGES}
+ACTIVE_PROCESSING = {stage: active_document_processing.labels(stage=stage) for stage in PROCESSING_STAGES}
+
+
+def inc_kafka_published(topic: str, status: str, amount: float = 1):
+    """Count published Kafka events (falls back to .labels() for unknown topics)."""
+    child = KAFKA_PUBLISHED.get((topic, status))
+    if child is None:
+        child = kafka_events_published.labels(topic=topic, status=status)
+    child.inc(amount)
+
+
+def inc_kafka_failed(topic: str, error_type: str, amount: float = 1):
+    """Count failed Kafka events (falls back to .labels() for unknown topics)."""
+    child = KAFKA_FAILED.get((topic, error_type))
+    if child is None:
+        child = kafka_events_failed.labels(topic=topic, error_type=error_type)
+    child.inc(amount)
+
+
 def get_metrics():
     """Get Prometheus metrics in text format."""
-    return generate_latest(registry)
+    return b"".join(get_metric_families())
+
+
+class _MetricFamily:
+    """Minimal collector wrapping one already-collected metric family."""
+    
+    def __init__(self, metric):
+        self.metric = metric
+    
+    def collect(self):
+        return [self.metric]
+
+
+# (monotonic time generated, exposition chunks); scrapes within the TTL reuse the chunks
+_metrics_cache = (float('-inf'), ())
+_metrics_cache_lock = threading.Lock()
+
+
+def get_metric_families():
+    """Get the exposition as one text chunk per metric family, cached for metrics_cache_ttl_seconds."""
+    global _metrics_cache
+    generated_at, chunks = _metrics_cache
+    if time.monotonic() - generated_at < settings.metrics_cache_ttl_seconds:
+        return chunks
+    # One scrape regenerates; concurrent ones wait and reuse its result
+    with _metrics_cache_lock:
+        generated_at, chunks = _metrics_cache
+        if time.monotonic() - generated_at < settings.metrics_cache_ttl_seconds:
+            return chunks
+        chunks = tuple(generate_latest(_MetricFamily(metric)) for metric in registry.collect())
+        _metrics_cache = (time.monotonic(), chunks)
+        return chunks
+
+
+def iter_metrics():
+    """Yield Prometheus metrics in text format one metric family at a time."""
+    yield from get_metric_families()
 
 
 def get_metrics_content_type():
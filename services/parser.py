@@ -1,21 +1,140 @@
 """Parser service - extracts structured data from HTML/PDF documents."""
 import logging
 import re
-import json
+import time
+import orjson
 from typing import Dict, List, Optional
-from datetime import datetime
-from bs4 import BeautifulSoup
+from datetime import datetime, timezone
+from lxml import etree, html
 from config import settings
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 logger = logging.getLogger(__name__)
 
+# Whitespace as Python's \s matches it. google-re2's \s is ASCII-only, so the Unicode
+# spaces are spelled out; registry texts put NBSP in "№ 123/…", "ст. 15" and "Суддя: …".
+# Digits are [0-9] for the same reason (Python's \d also matches non-ASCII digits)
+WS = '[\\s\u0085\u00a0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]'
+
+# Extraction patterns, compiled once at import; lists are tried in order
+# Pattern: справa №123/456/2024
+CASE_NUMBER_PATTERNS = [
+    re.compile(rf'справа{WS}*№?{WS}*([0-9]+[/-][0-9]+[/-][0-9]+)', re.IGNORECASE),
+    re.compile(rf'case{WS}*№?{WS}*([0-9]+[/-][0-9]+[/-][0-9]+)', re.IGNORECASE),
+    re.compile(rf'№{WS}*([0-9]+[/-][0-9]+[/-][0-9]+)', re.IGNORECASE),
+]
+COURT_NAME_PATTERNS = [
+    re.compile(rf'([А-Яа-я]+ський{WS}+[А-Яа-я]+{WS}+суд)'),
+    re.compile(rf'(Суд{WS}+[А-Яа-я]+)'),
+]
+# Pattern: Суддя: Іванов І.І.
+JUDGE_NAME_PATTERNS = [
+    re.compile(rf'Суддя(?::|{WS})+([А-Яа-я]+{WS}+[А-Я]\.[А-Я]\.)'),
+    re.compile(rf'Judge(?::|{WS})+([А-Яа-я]+{WS}+[А-Я]\.[А-Я]\.)'),
+]
+# Pattern: DD.MM.YYYY or YYYY-MM-DD
+DATE_PATTERNS = [
+    re.compile(r'([0-9]{2}\.[0-9]{2}\.[0-9]{4})'),
+    re.compile(r'([0-9]{4}-[0-9]{2}-[0-9]{2})'),
+]
+# Pattern: ст. 625 ЦКУ, ст. 123 ККУ
+LAW_REFERENCE_PATTERNS = [
+    re.compile(rf'ст\.{WS}*([0-9]+){WS}+([А-Я]+)'),
+    re.compile(rf'стаття{WS}+([0-9]+){WS}+([А-Я]+)'),
+]
+# Pattern: 12345.67 грн
+AMOUNT_PATTERN = re.compile(rf'([0-9]+[.,]?[0-9]*){WS}*(грн|UAH|USD|EUR)')
+
+# Fields taking the first match, preferring earlier patterns of the list
+FIRST_MATCH_FIELDS = {
+    'case_number': CASE_NUMBER_PATTERNS,
+    'court': COURT_NAME_PATTERNS,
+    'judge': JUDGE_NAME_PATTERNS,
+    'date': DATE_PATTERNS,
+}
+# Fields collecting every match
+ALL_MATCH_FIELDS = {
+    'law_reference': LAW_REFERENCE_PATTERNS,
+    'amount': [AMOUNT_PATTERN],
+}
+
+
+def _combine_patterns(engine=None):
+    """Fuse all extraction patterns into one alternation scanned in a single pass.
+    
+    Each pattern becomes a named group (field + list index); per-pattern flags
+    are kept as scoped inline flags. Returns the compiled regex and a map of
+    group name -> (field, pattern index, group number of its first capture).
+    
+    engine is the regex module to compile with. By default google-re2 is used
+    if installed: a linear-time automaton with no backtracking on long texts.
+    The patterns avoid classes whose meaning differs between re2 and re (see WS),
+    so both engines extract the same fields.
+    """
+    alternatives = []
+    group_names = []
+    for field, patterns in (*FIRST_MATCH_FIELDS.items(), *ALL_MATCH_FIELDS.items()):
+        for index, pattern in enumerate(patterns):
+            source = f'(?i:{pattern.pattern})' if pattern.flags & re.IGNORECASE else pattern.pattern
+            alternatives.append(f'(?P<{field}{index}>{source})')
+            group_names.append((f'{field}{index}', field, index))
+    combined = (engine or re2 or re).compile('|'.join(alternatives))
+    slots = {
+        name: (field, index, combined.groupindex[name] + 1)
+        for name, field, index in group_names
+    }
+    return combined, slots
+
+
+EXTRACTION_PATTERN, EXTRACTION_SLOTS = _combine_patterns()
+
+# A line mentioning one of these starts the decision; at most DECISION_MAX_LINES are kept
+DECISION_PATTERN = re.compile(r'резолютивна|рішення|decision|resolution', re.IGNORECASE)
+DECISION_MAX_LINES = 21
+
+# A line mentioning a section type starts that section; earlier types win within a line
+SECTION_TYPES = ['FACTS', 'CLAIMS', 'ARGUMENTS', 'LAW_REFERENCES', 'COURT_REASONING', 'DECISION']
+SECTION_PATTERN = re.compile(
+    '|'.join(f"(?P<{section_type}>{section_type.lower().replace('_', ' ')})" for section_type in SECTION_TYPES),
+    re.IGNORECASE
+)
+SECTION_PRIORITY = {section_type: priority for priority, section_type in enumerate(SECTION_TYPES)}
+
 
 class Parser:
-    """Parser for court documents (HTML/PDF)."""
+    """Parser for court documents (HTML/PDF).
+    
+    Stateless apart from settings; patterns are module-level constants, so
+    callers can share the instance from get_default().
+    """
+    
+    __slots__ = ('parser_version', 'confidence_threshold', '_now_iso_cache')
+    
+    _default: Optional['Parser'] = None
+    
+    @classmethod
+    def get_default(cls) -> 'Parser':
+        """Get or create the shared Parser instance of this process."""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
     
     def __init__(self):
         self.parser_version = settings.parser_version
         self.confidence_threshold = settings.parser_confidence_threshold
+        # (epoch second, ISO timestamp) shared by every document parsed within that second
+        self._now_iso_cache = (0, "")
+    
+    def _now_iso(self) -> str:
+        """Current UTC time as ISO 8601, at one-second resolution."""
+        now = int(time.time())
+        if now != self._now_iso_cache[0]:
+            self._now_iso_cache = (now, datetime.fromtimestamp(now, timezone.utc).isoformat())
+        return self._now_iso_cache[1]
     
     def parse(self, content: bytes, content_type: str, url: str) -> Dict:
         """
@@ -40,26 +159,31 @@ class Parser:
     
     def _parse_html(self, content: bytes, url: str) -> Dict:
         """Parse HTML document."""
-        soup = BeautifulSoup(content, 'lxml')
+        root = html.fromstring(content)
+        
+        # Scripts, styles and comments carry no document text
+        for node in list(root.iter(etree.Comment, etree.ProcessingInstruction, 'script', 'style')):
+            node.drop_tree()
         
-        # Extract text
-        text = soup.get_text(separator='\n', strip=True)
+        # Extract text (one stripped, non-empty string per line)
+        text = '\n'.join(stripped for stripped in (t.strip() for t in root.itertext()) if stripped)
         
         # Try to extract structured information
         # This is a placeholder - actual parsing depends on reyestr.court.gov.ua structure
         
         # Look for common patterns
-        case_number = self._extract_case_number(text, soup)
-        court_name = self._extract_court_name(text, soup)
-        judge_name = self._extract_judge_name(text, soup)
-        date = self._extract_date(text, soup)
-        parties = self._extract_parties(text, soup)
-        law_refs = self._extract_law_references(text, soup)
-        decision = self._extract_decision(text, soup)
-        amounts = self._extract_amounts(text, soup)
+        fields = self._extract_fields(text)
+        case_number = fields['case_number']
+        court_name = fields['court']
+        judge_name = fields['judge']
+        date = fields['date']
+        parties = self._extract_parties(text)
+        law_refs = fields['law_references']
+        decision = self._extract_decision(text)
+        amounts = fields['amounts']
         
         # Split into sections
-        sections = self._split_into_sections(text, soup)
+        sections = self._split_into_sections(text)
         
         return {
             "doc_id": None,  # Will be set by caller
@@ -77,47 +201,55 @@ class Parser:
             "text_blocks": sections,
             "source_hash": None,  # Will be set by caller
             "parser_version": self.parser_version,
-            "parsed_at": datetime.utcnow().isoformat(),
+            "parsed_at": self._now_iso(),
             "confidence": self._calculate_confidence(court_name, judge_name, date)
         }
     
     def _parse_pdf(self, content: bytes, url: str) -> Dict:
         """Parse PDF document."""
         try:
-            import PyPDF2
-            from io import BytesIO
-            
-            pdf_file = BytesIO(content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            # Extract text from all pages
-            text_parts = []
-            for page in pdf_reader.pages:
-                text_parts.append(page.extract_text())
-            
-            text = '\n\n'.join(text_parts)
+            import pypdfium2 as pdfium
+        except ImportError:
+            logger.error("pypdfium2 not installed, cannot parse PDF")
+            return self._create_empty_structure(url)
+        
+        try:
+            pdf = pdfium.PdfDocument(content)
+            try:
+                text = '\n\n'.join(self._iter_pdf_page_texts(pdf))
+            finally:
+                pdf.close()
             
             # Use similar extraction logic as HTML
             # (In production, would have more sophisticated PDF parsing)
             return self._parse_text(text, url)
             
-        except ImportError:
-            logger.error("PyPDF2 not installed, cannot parse PDF")
-            return self._create_empty_structure(url)
         except Exception as e:
             logger.error(f"Error parsing PDF: {e}")
             return self._create_empty_structure(url)
     
+    def _iter_pdf_page_texts(self, pdf):
+        """Yield the text of each PDF page, releasing the page before the next one."""
+        for page in pdf:
+            textpage = page.get_textpage()
+            try:
+                # PDFium separates lines with CRLF
+                yield textpage.get_text_range().replace('\r\n', '\n')
+            finally:
+                textpage.close()
+                page.close()
+    
     def _parse_text(self, text: str, url: str) -> Dict:
         """Parse plain text (fallback for PDF)."""
-        case_number = self._extract_case_number(text, None)
-        court_name = self._extract_court_name(text, None)
-        judge_name = self._extract_judge_name(text, None)
-        date = self._extract_date(text, None)
-        parties = self._extract_parties(text, None)
-        law_refs = self._extract_law_references(text, None)
-        decision = self._extract_decision(text, None)
-        amounts = self._extract_amounts(text, None)
+        fields = self._extract_fields(text)
+        case_number = fields['case_number']
+        court_name = fields['court']
+        judge_name = fields['judge']
+        date = fields['date']
+        parties = self._extract_parties(text)
+        law_refs = fields['law_references']
+        decision = self._extract_decision(text)
+        amounts = fields['amounts']
         
         sections = self._split_into_sections_text(text)
         
@@ -137,65 +269,43 @@ class Parser:
             "text_blocks": sections,
             "source_hash": None,
             "parser_version": self.parser_version,
-            "parsed_at": datetime.utcnow().isoformat(),
+            "parsed_at": self._now_iso(),
             "confidence": self._calculate_confidence(court_name, judge_name, date)
         }
     
-    def _extract_case_number(self, text: str, soup: Optional[BeautifulSoup]) -> Optional[str]:
-        """Extract case number from text."""
-        # Pattern: справa №123/456/2024
-        patterns = [
-            r'справа\s*№?\s*(\d+[/-]\d+[/-]\d+)',
-            r'case\s*№?\s*(\d+[/-]\d+[/-]\d+)',
-            r'№\s*(\d+[/-]\d+[/-]\d+)',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1)
-        return None
-    
-    def _extract_court_name(self, text: str, soup: Optional[BeautifulSoup]) -> Optional[str]:
-        """Extract court name."""
-        # Look for common court name patterns
-        patterns = [
-            r'([А-Яа-я]+ський\s+[А-Яа-я]+\s+суд)',
-            r'(Суд\s+[А-Яа-я]+)',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-        return None
-    
-    def _extract_judge_name(self, text: str, soup: Optional[BeautifulSoup]) -> Optional[str]:
-        """Extract judge name."""
-        # Pattern: Суддя: Іванов І.І.
-        patterns = [
-            r'Суддя[:\s]+([А-Яа-я]+\s+[А-Я]\.[А-Я]\.)',
-            r'Judge[:\s]+([А-Яа-я]+\s+[А-Я]\.[А-Я]\.)',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-        return None
-    
-    def _extract_date(self, text: str, soup: Optional[BeautifulSoup]) -> Optional[str]:
-        """Extract document date."""
-        # Pattern: DD.MM.YYYY
-        patterns = [
-            r'(\d{2}\.\d{2}\.\d{4})',
-            r'(\d{4}-\d{2}-\d{2})',
-        ]
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                # Return the first date found
-                return matches[0]
-        return None
+    def _extract_fields(self, text: str) -> Dict:
+        """Extract case number, court, judge, date, law references and amounts in one pass.
+        
+        Unlike one scan per pattern, the fused alternation consumes each match, so
+        a match of one field hides a match of another field that starts inside it
+        (e.g. an amount within a span taken by a case number). The fields' formats
+        do not overlap in registry decisions; tests/test_parser.py checks a sample
+        decision against per-pattern scans.
+        """
+        first_matches = {}
+        refs = {}  # Insertion-ordered set: duplicates dropped, document order kept
+        amounts = []
+        for match in EXTRACTION_PATTERN.finditer(text):
+            field, index, group = EXTRACTION_SLOTS[match.lastgroup]
+            if field == 'law_reference':
+                refs[f"{match[group + 1]} {match[group]}"] = None
+            elif field == 'amount':
+                amounts.append({"value": float(match[group].replace(',', '.')), "currency": match[group + 1]})
+            elif (field, index) not in first_matches:
+                first_matches[field, index] = match[group]
+        
+        fields = {
+            field: next(
+                (first_matches[field, index] for index in range(len(patterns)) if (field, index) in first_matches),
+                None
+            )
+            for field, patterns in FIRST_MATCH_FIELDS.items()
+        }
+        fields['law_references'] = list(refs)
+        fields['amounts'] = {"amounts": amounts}
+        return fields
     
-    def _extract_parties(self, text: str, soup: Optional[BeautifulSoup]) -> Dict:
+    def _extract_parties(self, text: str) -> Dict:
         """Extract parties (plaintiff/defendant)."""
         # Placeholder - would need more sophisticated parsing
         return {
@@ -203,85 +313,51 @@ class Parser:
             "defendant": []
         }
     
-    def _extract_law_references(self, text: str, soup: Optional[BeautifulSoup]) -> List[str]:
-        """Extract law article references."""
-        # Pattern: ст. 625 ЦКУ, ст. 123 ККУ
-        patterns = [
-            r'ст\.\s*(\d+)\s+([А-Я]+)',
-            r'стаття\s+(\d+)\s+([А-Я]+)',
-        ]
-        refs = []
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                refs.append(f"{match[1]} {match[0]}")
-        return list(set(refs))  # Remove duplicates
-    
-    def _extract_decision(self, text: str, soup: Optional[BeautifulSoup]) -> Optional[str]:
+    def _extract_decision(self, text: str) -> Optional[str]:
         """Extract decision text."""
         # Look for "Резолютивна частина" or "DECISION"
-        decision_keywords = ['резолютивна', 'рішення', 'decision', 'resolution']
-        lines = text.split('\n')
-        in_decision = False
-        decision_lines = []
-        
-        for line in lines:
-            if any(keyword in line.lower() for keyword in decision_keywords):
-                in_decision = True
-            if in_decision:
-                decision_lines.append(line)
-                if len(decision_lines) > 20:  # Limit decision section
-                    break
+        match = DECISION_PATTERN.search(text)
+        if not match:
+            return None
         
-        return '\n'.join(decision_lines) if decision_lines else None
-    
-    def _extract_amounts(self, text: str, soup: Optional[BeautifulSoup]) -> Dict:
-        """Extract monetary amounts."""
-        # Pattern: 12345.67 грн
-        pattern = r'(\d+[.,]?\d*)\s*(грн|UAH|USD|EUR)'
-        matches = re.findall(pattern, text)
-        return {
-            "amounts": [{"value": float(m[0].replace(',', '.')), "currency": m[1]} for m in matches]
-        }
+        start = text.rfind('\n', 0, match.start()) + 1
+        end = start
+        for _ in range(DECISION_MAX_LINES):
+            end = text.find('\n', end) + 1
+            if not end:
+                return text[start:]
+        return text[start:end - 1]
     
-    def _split_into_sections(self, text: str, soup: Optional[BeautifulSoup]) -> List[Dict]:
+    def _split_into_sections(self, text: str) -> List[Dict]:
         """Split document into semantic sections."""
-        sections = []
-        section_types = ['FACTS', 'CLAIMS', 'ARGUMENTS', 'LAW_REFERENCES', 'COURT_REASONING', 'DECISION']
-        
-        # Simple splitting by keywords
-        lines = text.split('\n')
-        current_section = None
-        current_text = []
-        
-        for line in lines:
-            # Check if line starts a new section
-            for section_type in section_types:
-                if section_type.lower().replace('_', ' ') in line.lower():
-                    if current_section:
-                        sections.append({
-                            "type": current_section,
-                            "text": '\n'.join(current_text)
-                        })
-                    current_section = section_type
-                    current_text = [line]
-                    break
+        # Simple splitting by keywords: collect (line start, section type) markers
+        markers = []
+        for match in SECTION_PATTERN.finditer(text):
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            section_type = match.lastgroup
+            if markers and markers[-1][0] == line_start:
+                if SECTION_PRIORITY[section_type] < SECTION_PRIORITY[markers[-1][1]]:
+                    markers[-1] = (line_start, section_type)
             else:
-                if current_section:
-                    current_text.append(line)
+                markers.append((line_start, section_type))
         
-        # Add last section
-        if current_section:
+        # Each section runs from its line to the line before the next marker
+        sections = []
+        for (start, section_type), (next_start, _) in zip(markers, markers[1:] + [(len(text) + 1, None)]):
             sections.append({
-                "type": current_section,
-                "text": '\n'.join(current_text)
+                "type": section_type,
+                "text": text[start:next_start - 1]
             })
         
         return sections
     
     def _split_into_sections_text(self, text: str) -> List[Dict]:
         """Split plain text into sections."""
-        return self._split_into_sections(text, None)
+        return self._split_into_sections(text)
+    
+    def to_json(self, parsed: Dict) -> bytes:
+        """Serialize a parsed document to JSON bytes."""
+        return orjson.dumps(parsed, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY)
     
     def _calculate_confidence(self, court: Optional[str], judge: Optional[str], date: Optional[str]) -> float:
         """Calculate parsing confidence score."""
@@ -312,6 +388,6 @@ class Parser:
             "text_blocks": [],
             "source_hash": None,
             "parser_version": self.parser_version,
-            "parsed_at": datetime.utcnow().isoformat(),
+            "parsed_at": self._now_iso(),
             "confidence": 0.0
         }
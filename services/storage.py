@@ -1,7 +1,9 @@
 """Storage service for raw documents (MinIO or local filesystem)."""
 import os
 import hashlib
+import uuid
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 from typing import Optional
 import logging
@@ -9,6 +11,54 @@ from config import settings
 
 logger = logging.getLogger(__name__)
 
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# MinIO objects above this size are uploaded as concurrent multipart parts
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+S3_MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+S3_TRANSFER_CONCURRENCY = 8
+# One shared client serves all concurrent saves; keep enough pooled connections for them
+S3_MAX_POOL_CONNECTIONS = 64
+
+
+def new_content_hasher():
+    """
+    Create an incremental hasher for document fingerprints (source_hash).
+    
+    The hash is only used for change detection, not for security, so BLAKE3
+    can be selected for its SIMD throughput. Changing the algorithm invalidates
+    stored source_hash values: every document is seen as changed once.
+    """
+    if settings.content_hash_algorithm == "blake3":
+        if blake3 is None:
+            raise RuntimeError("CONTENT_HASH_ALGORITHM=blake3 requires the blake3 package")
+        return blake3.blake3()
+    return hashlib.new("sha256", usedforsecurity=False)
+
+
+def write_file(path: Path, content: bytes):
+    """
+    Write a raw document in one pass without keeping it in the page cache.
+    
+    The size is known up front, so the file is preallocated (less fragmentation);
+    raw documents are rarely read back, so their pages are dropped after writing.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if content and hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, len(content))
+        view = memoryview(content)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
 
 class StorageService:
     """Service for storing and retrieving raw documents."""
@@ -24,6 +74,8 @@ class StorageService:
         elif self.storage_type == "minio":
             # MinIO will be initialized lazily
             self._s3_client = None
+            self._transfer_config = None
+            self._bucket_checked = False
             logger.info("MinIO storage configured")
         else:
             raise ValueError(f"Unknown storage type: {self.storage_type}")
@@ -33,6 +85,7 @@ class StorageService:
         if self._s3_client is None:
             try:
                 import boto3
+                from boto3.s3.transfer import TransferConfig
                 from botocore.config import Config
                 
                 # Parse endpoint (remove http:// or https:// if present)
@@ -55,14 +108,27 @@ class StorageService:
                     aws_access_key_id=settings.minio_access_key,
                     aws_secret_access_key=settings.minio_secret_key,
                     region_name=settings.minio_region,
-                    config=Config(signature_version='s3v4')
+                    config=Config(
+                        signature_version='s3v4',
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        tcp_keepalive=True,
+                        retries={'mode': 'adaptive', 'max_attempts': 3}
+                    )
+                )
+                self._transfer_config = TransferConfig(
+                    multipart_threshold=S3_MULTIPART_THRESHOLD,
+                    multipart_chunksize=S3_MULTIPART_CHUNK_SIZE,
+                    max_concurrency=S3_TRANSFER_CONCURRENCY,
+                    use_threads=True
                 )
-                
-                # Ensure bucket exists
-                self._ensure_bucket_exists()
                 
             except ImportError:
                 raise ImportError("boto3 is required for MinIO storage")
+        
+        # Ensure bucket exists (once per service)
+        if not self._bucket_checked:
+            self._bucket_checked = True
+            self._ensure_bucket_exists()
         return self._s3_client
     
     def _ensure_bucket_exists(self):
@@ -80,28 +146,48 @@ class StorageService:
                 logger.error(f"Failed to create MinIO bucket: {e}")
                 raise
     
-    def save(self, doc_id: str, content: bytes, extension: str = "html") -> str:
+    def save(self, doc_id: str, content: bytes, extension: str = "html", content_hash: Optional[str] = None) -> str:
         """
         Save document content to storage.
         
+        Content is stored once under its hash (content-addressed), so identical
+        bytes fetched again, e.g. a re-published document, are not rewritten.
+        
         Args:
             doc_id: Document UUID
             content: Raw document content
             extension: File extension (html, pdf, etc.)
+            content_hash: Content fingerprint, if already computed (see calculate_hash)
             
         Returns:
             Storage path/URI
         """
-        timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
-        filename = f"{timestamp}.{extension}"
+        digest = content_hash or self.calculate_hash(content)
+        object_name = f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
         
         if self.storage_type == "local":
             # Local filesystem storage
+            object_path = Path(self.storage_path) / "objects" / object_name
+            if object_path.exists():
+                logger.info(f"Document content already stored at {object_path}")
+            else:
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                # Write under a temporary name so concurrent saves never expose a partial object
+                tmp_path = object_path.with_name(f".{object_path.name}.{uuid.uuid4().hex}")
+                write_file(tmp_path, content)
+                os.replace(tmp_path, object_path)
+            
+            # Per-document entry, hard-linked to the stored content
             doc_dir = Path(self.storage_path) / str(doc_id)
             doc_dir.mkdir(parents=True, exist_ok=True)
-            
-            file_path = doc_dir / filename
-            file_path.write_bytes(content)
+            timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+            file_path = doc_dir / f"{timestamp}.{extension}"
+            file_path.unlink(missing_ok=True)  # Same document saved twice within a second
+            try:
+                os.link(object_path, file_path)
+            except OSError:
+                # Hard links unsupported (e.g. some network filesystems): store a copy
+                write_file(file_path, content)
             
             logger.info(f"Saved document to {file_path}")
             return str(file_path)
@@ -111,16 +197,20 @@ class StorageService:
             if not settings.minio_bucket_name:
                 raise ValueError("MinIO bucket name not configured")
             
-            s3_key = f"court-registry-raw/{doc_id}/{filename}"
-            s3_client = self._get_s3_client()
+            s3_key = f"court-registry-raw/objects/{object_name}"
+            s3_uri = f"s3://{settings.minio_bucket_name}/{s3_key}"
+            if self.exists(s3_uri):
+                logger.info(f"Document content already stored at {s3_uri}")
+                return s3_uri
             
-            s3_client.put_object(
+            s3_client = self._get_s3_client()
+            s3_client.upload_fileobj(
+                BytesIO(content),
                 Bucket=settings.minio_bucket_name,
                 Key=s3_key,
-                Body=content
+                Config=self._transfer_config
             )
             
-            s3_uri = f"s3://{settings.minio_bucket_name}/{s3_key}"
             logger.info(f"Saved document to {s3_uri}")
             return s3_uri
         
@@ -142,8 +232,9 @@ class StorageService:
             s3_client = self._get_s3_client()
             bucket, key = storage_path.replace("s3://", "").split("/", 1)
             
-            response = s3_client.get_object(Bucket=bucket, Key=key)
-            return response['Body'].read()
+            buffer = BytesIO()
+            s3_client.download_fileobj(bucket, key, buffer, Config=self._transfer_config)
+            return buffer.getvalue()
         
         else:
             # Local filesystem storage
@@ -153,8 +244,10 @@ class StorageService:
             return file_path.read_bytes()
     
     def calculate_hash(self, content: bytes) -> str:
-        """Calculate SHA256 hash of content."""
-        return hashlib.sha256(content).hexdigest()
+        """Calculate the content fingerprint (SHA-256 by default)."""
+        hasher = new_content_hasher()
+        hasher.update(content)
+        return hasher.hexdigest()
     
     def exists(self, storage_path: str) -> bool:
         """Check if file exists in storage."""
@@ -0,0 +1,71 @@
+"""On-demand wake-ups for the background worker's periodic loops.
+
+main.py serves the API on the background worker's event loop, but the API can
+also run standalone (api_server.py, with several uvicorn worker processes).
+Triggers therefore travel over Redis pub/sub, which reaches the worker from any
+process, and are turned into asyncio.Event sets inside it.
+"""
+import asyncio
+import logging
+from typing import Dict
+import redis.asyncio as redis
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pub/sub channel prefix; the trigger name ("discovery", "reconciliation") is appended
+TRIGGER_CHANNEL_PREFIX = "court-registry:trigger:"
+
+
+def _redis_client() -> redis.Redis:
+    return redis.Redis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        password=settings.redis_password,
+        db=settings.redis_db
+    )
+
+
+async def publish_trigger(name: str) -> int:
+    """Ask the background worker to run a loop now.
+    
+    Returns:
+        Number of subscribers that received the trigger (0 if no worker is listening)
+    """
+    client = _redis_client()
+    try:
+        return await client.publish(TRIGGER_CHANNEL_PREFIX + name, b"1")
+    finally:
+        await client.aclose()
+
+
+async def wait_for_trigger(event: asyncio.Event, timeout: float):
+    """Sleep until the event is set or the timeout elapses, then reset it."""
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        event.clear()
+
+
+async def listen_for_triggers(events: Dict[str, asyncio.Event]):
+    """Set the matching event whenever a trigger is published; runs until cancelled."""
+    client = _redis_client()
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(*(TRIGGER_CHANNEL_PREFIX + name for name in events))
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            name = message["channel"].decode().removeprefix(TRIGGER_CHANNEL_PREFIX)
+            if name in events:
+                logger.info(f"Received {name} trigger")
+                events[name].set()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"Trigger listener stopped, loops fall back to their intervals: {e}")
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
@@ -11,6 +11,7 @@ logging.basicConfig(
 )
 
 from services.fetcher import FetcherPool
+from services.http_client import close_http_client
 
 async def test_fetcher():
     """Test fetcher with logging."""
@@ -61,7 +62,7 @@ async def test_fetcher():
     print(f"  Successful: {len(results)}/{len(batch_urls)}")
     
     # Close fetcher (should log close)
-    await fetcher.close()
+    await close_http_client()
     
     print("\n" + "=" * 60)
     print("TEST COMPLETED")
@@ -2,9 +2,16 @@
 """Test script to check reyestr.court.gov.ua search and count cases/pages."""
 import asyncio
 import logging
+import mmap
+import random
+import re
+import time
 from datetime import datetime
-from services.change_monitor import ChangeMonitor
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
+from services.change_monitor import ChangeMonitor, DOC_ID_PATTERN
+from services.fetcher import retry_after_seconds
+from services.http_client import close_http_client
+from lxml import html
 import httpx
 
 # Configure logging
@@ -15,6 +22,62 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Common document count phrases in the Ukrainian court registry (longest first, so
+# 'Документів у системі:' is not reported as 'Документів:'); matched on the raw UTF-8 body
+COUNT_PATTERN = re.compile(
+    'Документів у системі:|Знайдено документів:|Всього документів:|Документів:|записів|результатів'.encode('utf-8')
+)
+NUMBER_PATTERN = re.compile(r'\d+')
+TAG_PATTERN = re.compile(r'<[^>]*>')
+# Raw bytes after a phrase to take the snippet from (markup included, stripped afterwards)
+COUNT_SNIPPET_BYTES = 400
+
+# Attempts per request on 429/5xx responses (exponential backoff with jitter, capped)
+MAX_ATTEMPTS = 4
+MAX_BACKOFF_SECONDS = 30
+# Minimum delay between requests to the same host
+MIN_REQUEST_INTERVAL = 1.5
+
+# The search results page is streamed here and kept for inspection
+RESULT_DUMP_PATH = '/tmp/reyestr_search_result.html'
+
+# Host -> monotonic time of the last request sent to it
+last_request_at = {}
+
+
+async def request_with_retries(
+    client: httpx.AsyncClient, method: str, url: str, stream: bool = False, **kwargs
+) -> httpx.Response:
+    """Send a request politely: space requests per host and retry transient HTTP errors with backoff.
+    
+    With stream=True the body is left unread; the caller must consume and close the response.
+    """
+    host = urlparse(url).netloc
+    for attempt in range(MAX_ATTEMPTS):
+        wait = MIN_REQUEST_INTERVAL - (time.monotonic() - last_request_at.get(host, float('-inf')))
+        if wait > 0:
+            await asyncio.sleep(wait)
+        last_request_at[host] = time.monotonic()
+        
+        response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        try:
+            response.raise_for_status()
+            return response
+        except httpx.HTTPStatusError:
+            if stream:
+                await response.aclose()
+            # Only rate limiting and server errors are transient
+            transient = response.status_code == 429 or response.status_code >= 500
+            if not transient or attempt == MAX_ATTEMPTS - 1:
+                raise
+            # Honor the server's Retry-After (429/503), else back off exponentially with jitter
+            backoff = retry_after_seconds(response)
+            if backoff is None:
+                backoff = 2 ** attempt + random.random()
+            backoff = min(backoff, MAX_BACKOFF_SECONDS)
+            logger.warning(f"[TEST_SEARCH] {method} {url} returned {response.status_code}, retrying in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+
 
 async def test_reyestr_search():
     """Test search in reyestr.court.gov.ua and count cases/pages."""
@@ -24,7 +87,7 @@ async def test_reyestr_search():
     print()
     
     date_from = "2026-01-01"
-    date_to = datetime.utcnow().strftime("%Y-%m-%d")
+    date_to = datetime.utcnow().date().isoformat()
     
     print(f"Search date range: {date_from} to {date_to}")
     print()
@@ -46,16 +109,15 @@ async def test_reyestr_search():
         
         # The search form requires POST with form data
         # First, get the search page to get any required tokens/fields
-        initial_response = await monitor.http_client.get(search_url)
-        initial_response.raise_for_status()
+        initial_response = await request_with_retries(monitor.http_client, "GET", search_url)
         
-        logger.info(f"[TEST_SEARCH] Got initial page: status={initial_response.status_code}, size={len(initial_response.text)} bytes")
+        logger.info(f"[TEST_SEARCH] Got initial page: status={initial_response.status_code}, http_version={initial_response.http_version}, size={len(initial_response.content)} bytes")
         
         # Parse form to get all required fields
-        soup_initial = BeautifulSoup(initial_response.text, 'html.parser')
-        form = soup_initial.find('form')
+        tree_initial = html.fromstring(initial_response.content)
+        form = tree_initial.find('.//form')
         
-        if form:
+        if form is not None:
             logger.info(f"[TEST_SEARCH] Found form: action={form.get('action')}, method={form.get('method')}")
             
             # Build form data
@@ -68,31 +130,45 @@ async def test_reyestr_search():
             form_data['ImportDateEnd'] = ''
             
             # Get all hidden inputs
-            for input_field in soup_initial.find_all('input', type='hidden'):
-                name = input_field.get('name')
-                value = input_field.get('value', '')
-                if name:
-                    form_data[name] = value
+            hidden_fields = {
+                input_field.get('name'): input_field.get('value', '')
+                for input_field in tree_initial.xpath("//input[@type='hidden'][@name != '']")
+            }
+            form_data.update(hidden_fields)
+            if logger.isEnabledFor(logging.DEBUG):
+                for name, value in hidden_fields.items():
                     logger.debug(f"[TEST_SEARCH] Added hidden field: {name}={value[:50]}")
             
             logger.info(f"[TEST_SEARCH] Submitting POST with {len(form_data)} form fields")
             logger.debug(f"[TEST_SEARCH] Form data keys: {list(form_data.keys())}")
             
             # Submit POST request
-            response = await monitor.http_client.post(search_url, data=form_data, follow_redirects=True)
-            response.raise_for_status()
+            response = await request_with_retries(monitor.http_client, "POST", search_url, stream=True, data=form_data)
         else:
             # Fallback to GET if no form found
             logger.warning(f"[TEST_SEARCH] No form found, using GET as fallback")
-            response = await monitor.http_client.get(search_url, params=params)
-            response.raise_for_status()
+            response = await request_with_retries(monitor.http_client, "GET", search_url, stream=True, params=params)
         
         print(f"[SEARCH] Response status: {response.status_code}")
-        print(f"[SEARCH] Response size: {len(response.text)} bytes")
-        print()
+        # Both requests go through the shared HTTP/2 client, so the search reuses the initial connection
+        print(f"[SEARCH] HTTP version: {response.http_version}")
         
-        # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # Stream the body to the dump file while lxml parses it incrementally, so the
+        # page is never held in memory whole (links only, so no soup tree)
+        parser = html.HTMLParser(encoding=response.charset_encoding or 'utf-8')
+        size = 0
+        try:
+            with open(RESULT_DUMP_PATH, 'wb') as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+                    parser.feed(chunk)
+                    size += len(chunk)
+        finally:
+            await response.aclose()
+        tree = parser.close()
+        
+        print(f"[SEARCH] Response size: {size} bytes")
+        print()
         
         # Try to find total document count
         print("=" * 70)
@@ -100,50 +176,46 @@ async def test_reyestr_search():
         print("=" * 70)
         print()
         
-        # Look for document count text
-        page_text = soup.get_text()
-        
-        # Common patterns in Ukrainian court registry
-        count_patterns = [
-            'Документів у системі:',
-            'Документів:',
-            'Знайдено документів:',
-            'Всього документів:',
-            'записів',
-            'результатів'
-        ]
-        
+        # Look for document count text: one scan over the raw body (memory-mapped from the
+        # dump), without building the page text; report the first occurrence of each phrase
         found_count = None
-        for pattern in count_patterns:
-            if pattern in page_text:
-                # Try to extract number
-                idx = page_text.find(pattern)
-                snippet = page_text[idx:idx+100]
-                print(f"[FOUND] Pattern '{pattern}' found in page text")
-                print(f"[SNIPPET] {snippet[:80]}...")
-                
-                # Try to extract number
-                import re
-                numbers = re.findall(r'\d+', snippet.replace(' ', '').replace(',', ''))
-                if numbers:
-                    found_count = numbers[0]
-                    print(f"[COUNT] Extracted number: {found_count}")
-                print()
+        seen_patterns = set()
+        with open(RESULT_DUMP_PATH, 'rb') as f:
+            # An empty file cannot be mapped
+            body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else memoryview(b'')
+            with body:
+                for match in COUNT_PATTERN.finditer(body):
+                    pattern = match.group().decode('utf-8')
+                    if pattern in seen_patterns:
+                        continue
+                    seen_patterns.add(pattern)
+                    raw_snippet = body[match.start():match.start() + COUNT_SNIPPET_BYTES]
+                    snippet = TAG_PATTERN.sub(' ', bytes(raw_snippet).decode('utf-8', errors='ignore'))[:100]
+                    print(f"[FOUND] Pattern '{pattern}' found in page text")
+                    print(f"[SNIPPET] {snippet[:80]}...")
+                    
+                    # Try to extract number
+                    number = NUMBER_PATTERN.search(snippet.replace(' ', '').replace(',', ''))
+                    if number:
+                        found_count = number.group()
+                        print(f"[COUNT] Extracted number: {found_count}")
+                    print()
         
         # Count document links
-        all_links = soup.find_all('a', href=True)
-        document_links = [link for link in all_links if '/Document/' in link.get('href', '') or '/Case/' in link.get('href', '')]
+        all_links = tree.xpath('//a[@href]')
+        document_links = tree.xpath("//a[contains(@href, '/Document/') or contains(@href, '/Case/')]")
         
         print(f"[LINKS] Total links on page: {len(all_links)}")
         print(f"[LINKS] Document/Case links: {len(document_links)}")
         print()
         
         # Try to find pagination
-        pagination_links = soup.find_all('a', href=True, string=lambda text: text and any(char.isdigit() for char in str(text)))
         page_numbers = []
-        for link in pagination_links:
-            href = link.get('href', '')
-            text = link.get_text(strip=True)
+        for link in all_links:
+            text = link.text_content().strip()
+            if not any(char.isdigit() for char in text):
+                continue
+            href = link.get('href')
             if text.isdigit() or 'page' in href.lower() or 'сторінк' in text.lower():
                 page_numbers.append((text, href))
         
@@ -152,14 +224,13 @@ async def test_reyestr_search():
             print(f"[PAGINATION] Sample: {page_numbers[:5]}")
         print()
         
-        # Count unique document URLs
+        # Count unique document URLs (ids are read straight from the deduplicated hrefs)
         unique_docs = set()
-        for link in document_links:
-            href = link.get('href', '')
+        for href in {link.get('href', '') for link in document_links}:
             if '/Document/' in href:
-                doc_id = monitor._extract_doc_id_from_url(monitor._make_absolute_url(href))
-                if doc_id:
-                    unique_docs.add(doc_id)
+                match = DOC_ID_PATTERN.search(href)
+                if match:
+                    unique_docs.add(match.group(1))
         
         print("=" * 70)
         print("SEARCH RESULTS SUMMARY")
@@ -172,11 +243,8 @@ async def test_reyestr_search():
         print(f"Pagination links found: {len(page_numbers)}")
         print()
         
-        # Save HTML for inspection
-        print("[DEBUG] Saving search results HTML for inspection...")
-        with open('/tmp/reyestr_search_result.html', 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        print("[DEBUG] Saved to /tmp/reyestr_search_result.html")
+        # The HTML was saved for inspection while streaming
+        print(f"[DEBUG] Search results HTML saved to {RESULT_DUMP_PATH}")
         print()
         
         # Show sample document links
@@ -185,8 +253,8 @@ async def test_reyestr_search():
             print("SAMPLE DOCUMENT LINKS (first 10)")
             print("=" * 70)
             for i, link in enumerate(document_links[:10], 1):
-                href = link.get('href', '')
-                text = link.get_text(strip=True)[:60]
+                href = link.get('href')
+                text = link.text_content().strip()[:60]
                 print(f"{i}. {text}")
                 print(f"   URL: {monitor._make_absolute_url(href)}")
             print()
@@ -195,7 +263,7 @@ async def test_reyestr_search():
         logger.error(f"[TEST_SEARCH_ERROR] Error: {e}", exc_info=True)
         print(f"ERROR: {e}")
     finally:
-        await monitor.close()
+        await close_http_client()
     
     print("=" * 70)
     print("TEST COMPLETED")
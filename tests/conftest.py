@@ -0,0 +1,7 @@
+"""Shared test setup: settings without required secrets fail to load, so give them dummies."""
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("FETCHER_WORKERS", "1")
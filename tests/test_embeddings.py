@@ -0,0 +1,35 @@
+"""Tests for the token chunking of the embedding service."""
+import pytest
+
+from services.embeddings import EMBEDDING_ENCODING, EmbeddingService, get_encoding
+
+MAX_TOKENS = 64
+
+# One paragraph of distinct words, so every chunk has a single place in it
+LONG_PARAGRAPH = " ".join(f"word{i}" for i in range(1000))
+
+
+@pytest.fixture
+def service():
+    # chunk_texts only needs the encoding; skip the OpenAI client setup
+    service = EmbeddingService.__new__(EmbeddingService)
+    service.encoding = get_encoding(EMBEDDING_ENCODING)
+    service.chunk_size = MAX_TOKENS
+    return service
+
+
+def test_long_paragraph_windows_overlap_without_gaps(service):
+    [chunks] = service.chunk_texts([LONG_PARAGRAPH], max_tokens=MAX_TOKENS)
+    
+    assert len(chunks) > 1
+    assert all(len(service.encoding.encode_ordinary(chunk)) <= MAX_TOKENS for chunk in chunks)
+    assert LONG_PARAGRAPH.startswith(chunks[0])
+    assert LONG_PARAGRAPH.endswith(chunks[-1])
+    
+    end = len(chunks[0])
+    for chunk in chunks[1:]:
+        start = LONG_PARAGRAPH.find(chunk)
+        assert start != -1
+        assert start < end, "window does not overlap the previous one"
+        end = start + len(chunk)
+    assert end == len(LONG_PARAGRAPH)
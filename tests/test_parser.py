@@ -0,0 +1,76 @@
+"""Tests for the fused field extraction of the parser."""
+import re
+from pathlib import Path
+
+import pytest
+
+from services import parser as parser_module
+from services.parser import Parser, _combine_patterns
+
+ENGINES = [
+    pytest.param(re, id="re"),
+    pytest.param(
+        parser_module.re2,
+        id="re2",
+        marks=pytest.mark.skipif(parser_module.re2 is None, reason="google-re2 not installed")
+    ),
+]
+
+NBSP = "\u00a0"
+
+# Registry texts put non-breaking spaces after "№", "ст." and "Суддя:"
+NBSP_TEXT = (
+    f"Справа{NBSP}№{NBSP}910/1234/23\n"
+    f"Одеський окружний{NBSP}суд\n"
+    f"Суддя:{NBSP}Петренко{NBSP}П.П.\n"
+    f"Відповідно до ст.{NBSP}625{NBSP}ЦКУ стягнути 1500,50{NBSP}грн\n"
+)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_extract_fields_matches_nbsp_with_every_engine(monkeypatch, engine):
+    pattern, slots = _combine_patterns(engine)
+    monkeypatch.setattr(parser_module, "EXTRACTION_PATTERN", pattern)
+    monkeypatch.setattr(parser_module, "EXTRACTION_SLOTS", slots)
+    
+    fields = Parser()._extract_fields(NBSP_TEXT)
+    
+    assert fields["case_number"] == "910/1234/23"
+    assert fields["court"] == f"Одеський окружний{NBSP}суд"
+    assert fields["judge"] == f"Петренко{NBSP}П.П."
+    assert fields["law_references"] == ["ЦКУ 625"]
+    assert fields["amounts"] == {"amounts": [{"value": 1500.5, "currency": "грн"}]}
+
+
+def per_pattern_fields(text):
+    """The fields as the per-pattern scans before the fused alternation found them."""
+    fields = {}
+    for field, patterns in parser_module.FIRST_MATCH_FIELDS.items():
+        matches = (pattern.search(text) for pattern in patterns)
+        fields[field] = next((match.group(1) for match in matches if match), None)
+    fields["law_references"] = {
+        f"{code} {article}"
+        for pattern in parser_module.LAW_REFERENCE_PATTERNS
+        for article, code in pattern.findall(text)
+    }
+    fields["amounts"] = [
+        {"value": float(value.replace(",", ".")), "currency": currency}
+        for value, currency in parser_module.AMOUNT_PATTERN.findall(text)
+    ]
+    return fields
+
+
+def test_extract_fields_matches_per_pattern_scans_on_a_decision():
+    text = (Path(__file__).parent / "data" / "sample_decision.txt").read_text(encoding="utf-8")
+    expected = per_pattern_fields(text)
+    
+    fields = Parser()._extract_fields(text)
+    
+    for field in parser_module.FIRST_MATCH_FIELDS:
+        assert fields[field] == expected[field], field
+    # The old scans returned a set; the fused scan keeps document order
+    assert set(fields["law_references"]) == expected["law_references"]
+    assert len(fields["law_references"]) == len(expected["law_references"])
+    assert fields["amounts"]["amounts"] == expected["amounts"]
+    # The sample exercises every field
+    assert all(expected.values())
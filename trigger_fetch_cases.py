@@ -3,12 +3,64 @@
 Script to trigger the backend to fetch all cases registered from a specific date 
 from https://reyestr.court.gov.ua/
 """
-import requests
-import json
+import httpx
+import orjson
 import sys
 import os
-from datetime import datetime
-from typing import Optional, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+# Attempts for a trigger request answered with 503 (exponential backoff in between).
+# Connection errors are retried by the transport; other 5xx responses are not
+# retried, since the backend may already have queued the request's documents.
+TRIGGER_MAX_ATTEMPTS = 3
+
+
+def post_with_retries(client: httpx.Client, url: str, payload: Dict[str, Any]) -> httpx.Response:
+    """POST the payload, retrying 503 responses with exponential backoff."""
+    for attempt in range(TRIGGER_MAX_ATTEMPTS):
+        response = client.post(url, json=payload)
+        if response.status_code != 503 or attempt == TRIGGER_MAX_ATTEMPTS - 1:
+            return response
+        wait_time = 2 ** attempt
+        print(f"Service unavailable ({response.status_code}), retrying in {wait_time}s...", file=sys.stderr)
+        time.sleep(wait_time)
+
+
+def split_date_range(date_from: str, date_to: str, shards: int) -> List[Tuple[str, str]]:
+    """Split the inclusive date range into at most `shards` contiguous sub-ranges of near-equal length."""
+    start = date.fromisoformat(date_from)
+    days = (date.fromisoformat(date_to) - start).days + 1
+    shards = max(1, min(shards, days))
+    return [
+        (
+            (start + timedelta(days=days * i // shards)).isoformat(),
+            (start + timedelta(days=days * (i + 1) // shards - 1)).isoformat()
+        )
+        for i in range(shards)
+    ]
+
+
+def combine_results(results: List[Dict[str, Any]], date_from: str, date_to: str) -> Dict[str, Any]:
+    """Sum the per-shard counters into one result shaped like a single trigger response."""
+    combined = {
+        key: sum(result.get(key, 0) for result in results)
+        for key in ('discovered', 'queued', 'skipped', 'failed')
+    }
+    statuses = {result.get('status', 'unknown') for result in results}
+    combined.update({
+        "status": statuses.pop() if len(statuses) == 1 else "mixed",
+        "date_from": date_from,
+        "date_to": date_to,
+        "message": (
+            f"Discovered {combined['discovered']} documents, queued {combined['queued']} "
+            f"for processing across {len(results)} shards"
+        ),
+        "shards": results
+    })
+    return combined
 
 
 def trigger_fetch(
@@ -16,7 +68,8 @@ def trigger_fetch(
     date_from: str = "2026-01-01",
     date_to: Optional[str] = None,
     force: bool = False,
-    output_file: Optional[str] = None
+    output_file: Optional[str] = None,
+    shards: int = 1
 ) -> Dict[str, Any]:
     """
     Trigger the backend to fetch cases from the registry.
@@ -27,6 +80,7 @@ def trigger_fetch(
         date_to: End date in YYYY-MM-DD format (optional)
         force: Force re-fetch even if documents already exist
         output_file: Optional file path to save the results as JSON
+        shards: Number of sub-ranges to split the dates into, triggered concurrently
     
     Returns:
         Dictionary containing the API response
@@ -43,26 +97,39 @@ def trigger_fetch(
     if date_to:
         payload["date_to"] = date_to
     
+    # The backend discovers each range serially, so shards let it work on sub-ranges in parallel
+    payloads = [payload]
+    if shards > 1:
+        date_to = date_to or date.today().isoformat()
+        payloads = [
+            {"date_from": shard_from, "date_to": shard_to, "force": force}
+            for shard_from, shard_to in split_date_range(date_from, date_to, shards)
+        ]
+    
     # Make the API request
     print(f"Triggering fetch from registry: https://reyestr.court.gov.ua/")
     print(f"Date range: {date_from} to {date_to or 'today'}")
     print(f"API URL: {api_url}")
-    print(f"Payload: {json.dumps(payload, indent=2)}")
+    if len(payloads) > 1:
+        print(f"Shards: {len(payloads)}")
+    print(f"Payload: {orjson.dumps(payloads if len(payloads) > 1 else payload, option=orjson.OPT_INDENT_2).decode()}")
     print()
     
     try:
-        response = requests.post(
-            api_url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=300  # 5 minutes timeout for discovery
-        )
+        # Connection failures are retried by the transport; discovery may take up to 5 minutes
+        with httpx.Client(
+            http2=True,
+            transport=httpx.HTTPTransport(http2=True, retries=3),
+            timeout=httpx.Timeout(300.0, connect=10.0)
+        ) as client, ThreadPoolExecutor(max_workers=len(payloads)) as executor:
+            responses = list(executor.map(lambda body: post_with_retries(client, api_url, body), payloads))
         
-        # Check if request was successful
-        response.raise_for_status()
-        
-        # Parse the response
-        result = response.json()
+        # Check if every request was successful and parse the responses
+        results = []
+        for response in responses:
+            response.raise_for_status()
+            results.append(orjson.loads(response.content))
+        result = results[0] if len(results) == 1 else combine_results(results, date_from, date_to)
         
         # Print summary
         print("=" * 60)
@@ -85,23 +152,23 @@ def trigger_fetch(
         
         # Save to file if requested
         if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
             print(f"\nResults saved to: {output_file}")
         
         return result
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error making request: {e}", file=sys.stderr)
-        if hasattr(e, 'response') and e.response is not None:
+        if isinstance(e, httpx.HTTPStatusError):
             print(f"Response status: {e.response.status_code}", file=sys.stderr)
             try:
-                error_detail = e.response.json()
-                print(f"Response body: {json.dumps(error_detail, indent=2)}", file=sys.stderr)
-            except:
+                error_detail = orjson.loads(e.response.content)
+                print(f"Response body: {orjson.dumps(error_detail, option=orjson.OPT_INDENT_2).decode()}", file=sys.stderr)
+            except orjson.JSONDecodeError:
                 print(f"Response text: {e.response.text}", file=sys.stderr)
         sys.exit(1)
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}", file=sys.stderr)
         print(f"Response text: {response.text}", file=sys.stderr)
         sys.exit(1)
@@ -140,12 +207,18 @@ def main():
         default=None,
         help="Output file path to save results as JSON (optional)"
     )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the date range into N sub-ranges triggered concurrently (default: 1)"
+    )
     
     args = parser.parse_args()
     
-    # Validate date format
+    # Validate date format (normalized to YYYY-MM-DD, which the API expects)
     try:
-        datetime.strptime(args.date_from, "%Y-%m-%d")
+        args.date_from = date.fromisoformat(args.date_from).isoformat()
     except ValueError:
         print(f"Error: Invalid date format for --date-from: {args.date_from}", file=sys.stderr)
         print("Expected format: YYYY-MM-DD", file=sys.stderr)
@@ -153,7 +226,7 @@ def main():
     
     if args.date_to:
         try:
-            datetime.strptime(args.date_to, "%Y-%m-%d")
+            args.date_to = date.fromisoformat(args.date_to).isoformat()
         except ValueError:
             print(f"Error: Invalid date format for --date-to: {args.date_to}", file=sys.stderr)
             print("Expected format: YYYY-MM-DD", file=sys.stderr)
@@ -165,7 +238,8 @@ def main():
         date_from=args.date_from,
         date_to=args.date_to,
         force=args.force,
-        output_file=args.output
+        output_file=args.output,
+        shards=args.shards
     )
     
     return result
@@ -5,7 +5,7 @@ import os
 
 # Check if we're in the right environment
 try:
-    from sqlalchemy import text, inspect
+    from sqlalchemy import String, and_, column, exists, literal, select, text, union_all, values
     from database import engine, Base
     from models import *
     from config import settings
@@ -17,6 +17,12 @@ except ImportError as e:
     print("  2. Or locally after installing dependencies: pip install -r requirements.txt")
     sys.exit(1)
 
+# Expected extensions
+EXPECTED_EXTENSIONS = [
+    'vector',
+    'pg_trgm'
+]
+
 # Expected tables from init_db.sql
 EXPECTED_TABLES = [
     'courts',
@@ -40,19 +46,22 @@ EXPECTED_TABLES = [
     'search_index'
 ]
 
+EXPECTED_TABLE_SET = frozenset(EXPECTED_TABLES)
+
 # Expected indexes (key ones)
 EXPECTED_INDEXES = [
     'idx_cases_registry_number',
     'idx_documents_case_id',
     'idx_document_versions_document_id',
     'idx_document_versions_source_hash',
+    'idx_document_versions_source_url',
     'idx_parties_normalized_name',
     'idx_case_parties_case_id',
     'idx_case_parties_party_id',
     'idx_document_sections_document_version_id',
-    'idx_document_sections_section_type',
+    'idx_document_sections_type_version',
     'idx_embedding_chunks_section_id',
-    'idx_embedding_chunks_vector',
+    'idx_embedding_chunks_vector_hnsw',
     'idx_case_relations_parent',
     'idx_case_relations_child',
     'idx_document_relations_parent',
@@ -60,7 +69,12 @@ EXPECTED_INDEXES = [
     'idx_parse_runs_document_version',
     'idx_entity_mentions_document_version',
     'idx_entity_mentions_entity',
-    'idx_search_index_entity'
+    'idx_search_index_entity',
+    'idx_parties_normalized_name_trgm',
+    'idx_courts_name_trgm',
+    'idx_judges_full_name_trgm',
+    'idx_law_articles_code_trgm',
+    'idx_document_versions_presiding_judge'
 ]
 
 # Expected triggers
@@ -79,215 +93,209 @@ EXPECTED_FUNCTIONS = [
 ]
 
 
-def check_pgvector_extension():
-    """Check if pgvector extension is enabled."""
-    print("Checking pgvector extension...")
+# Critical columns, as table.column
+EXPECTED_COLUMNS = [
+    'embedding_chunks.embedding_vector',
+    'search_index.text_vector'
+]
+
+# Every catalog object the checks look at, as (kind, name) rows
+CATALOG_QUERY = """
+    SELECT 'extension' AS kind, extname::text AS name FROM pg_extension
+    UNION ALL
+    SELECT 'table', tablename::text FROM pg_tables WHERE schemaname = 'public'
+    UNION ALL
+    SELECT 'index', indexname::text FROM pg_indexes
+    WHERE schemaname = 'public' AND indexname LIKE 'idx_%'
+    UNION ALL
+    SELECT 'trigger', trigger_name::text FROM information_schema.triggers
+    WHERE trigger_schema = 'public'
+    UNION ALL
+    SELECT 'function', routine_name::text FROM information_schema.routines
+    WHERE routine_schema = 'public' AND routine_type = 'FUNCTION'
+    UNION ALL
+    SELECT 'column', (table_name || '.' || column_name)::text FROM information_schema.columns
+    WHERE table_schema = 'public'
+    UNION ALL
+    SELECT 'unique_constraint:' || table_name, constraint_name::text FROM information_schema.table_constraints
+    WHERE table_schema = 'public' AND constraint_type = 'UNIQUE'
+"""
+
+
+def build_schema_diff_query():
+    """Build the query that diffs the expected objects against the catalog on the server.
+    
+    Only the gaps come back: expected objects that are missing (an anti-join against a
+    VALUES list), tables that are not expected ('extra_table'), and a missing
+    document_versions unique constraint. A healthy database returns no rows.
+    """
+    catalog = text(CATALOG_QUERY).columns(column('kind', String), column('name', String)).cte('catalog')
+    expected = values(column('kind', String), column('name', String), name='expected').data(
+        [('extension', name) for name in EXPECTED_EXTENSIONS]
+        + [('table', name) for name in EXPECTED_TABLES]
+        + [('index', name) for name in EXPECTED_INDEXES]
+        + [('trigger', name) for name in EXPECTED_TRIGGERS]
+        + [('function', name) for name in EXPECTED_FUNCTIONS]
+        + [('column', name) for name in EXPECTED_COLUMNS]
+    )
+    missing = select(expected.c.kind, expected.c.name).select_from(
+        expected.outerjoin(catalog, and_(catalog.c.kind == expected.c.kind, catalog.c.name == expected.c.name))
+    ).where(catalog.c.name.is_(None))
+    extra_tables = select(literal('extra_table', String), catalog.c.name).where(
+        catalog.c.kind == 'table', catalog.c.name.not_in(EXPECTED_TABLES)
+    )
+    # The constraint is named by init_db.sql or the models, so match it loosely
+    missing_constraint = select(literal('unique_constraint', String), literal('document_versions', String)).where(
+        ~exists().where(
+            catalog.c.kind == 'unique_constraint:document_versions',
+            catalog.c.name.contains('document_version')
+        )
+    )
+    return union_all(missing, extra_tables, missing_constraint)
+
+
+SCHEMA_DIFF_QUERY = build_schema_diff_query()
+
+
+def fetch_schema_diff():
+    """Fetch the schema gaps, bucketed by kind."""
+    diff = {}
     with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT EXISTS(
-                SELECT 1 FROM pg_extension WHERE extname = 'vector'
-            ) as exists;
-        """))
-        exists = result.scalar()
-        if exists:
-            print("  ✓ pgvector extension is enabled")
-            return True
-        else:
-            print("  ✗ pgvector extension is NOT enabled")
-            return False
+        for kind, name in conn.execute(SCHEMA_DIFF_QUERY):
+            diff.setdefault(kind, set()).add(name)
+    return {kind: frozenset(names) for kind, names in diff.items()}
+
+
+def report(lines):
+    """Write a check's report lines in one call."""
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
-def check_tables():
+def check_extension(diff, extname, label):
+    """Check if an extension is enabled."""
+    enabled = extname not in diff.get('extension', frozenset())
+    report([
+        f"Checking {label} extension...",
+        f"  ✓ {label} extension is enabled" if enabled else f"  ✗ {label} extension is NOT enabled"
+    ])
+    return enabled
+
+
+def check_names(diff, kind, title, label, expected):
+    """Check that every expected name of a catalog kind exists; reports in expected order."""
+    missing = diff.get(kind, frozenset())
+    report([f"\nChecking {title}..."] + [
+        f"  ✗ {label} '{name}' is MISSING" if name in missing else f"  ✓ {label} '{name}' exists"
+        for name in expected
+    ])
+    return not missing
+
+
+def check_pg_trgm_extension(diff):
+    """Check if pg_trgm extension is enabled."""
+    return check_extension(diff, 'pg_trgm', 'pg_trgm')
+
+
+def check_pgvector_extension(diff):
+    """Check if pgvector extension is enabled."""
+    return check_extension(diff, 'vector', 'pgvector')
+
+
+def check_tables(diff):
     """Check if all expected tables exist."""
-    print("\nChecking tables...")
-    inspector = inspect(engine)
-    existing_tables = set(inspector.get_table_names())
-    expected_tables = set(EXPECTED_TABLES)
-    
-    missing_tables = expected_tables - existing_tables
-    extra_tables = existing_tables - expected_tables
-    
-    all_good = True
-    for table in EXPECTED_TABLES:
-        if table in existing_tables:
-            print(f"  ✓ Table '{table}' exists")
-        else:
-            print(f"  ✗ Table '{table}' is MISSING")
-            all_good = False
+    all_good = check_names(diff, 'table', 'tables', 'Table', EXPECTED_TABLES)
     
+    extra_tables = diff.get('extra_table', frozenset())
     if extra_tables:
-        print(f"\n  Note: Found {len(extra_tables)} extra tables: {', '.join(extra_tables)}")
+        report([f"\n  Note: Found {len(extra_tables)} extra tables: {', '.join(extra_tables)}"])
     
     return all_good
 
 
-def check_indexes():
+def check_indexes(diff):
     """Check if all expected indexes exist."""
-    print("\nChecking indexes...")
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT indexname 
-            FROM pg_indexes 
-            WHERE schemaname = 'public' 
-            AND indexname LIKE 'idx_%'
-            ORDER BY indexname;
-        """))
-        existing_indexes = {row[0] for row in result}
-    
-    all_good = True
-    for index in EXPECTED_INDEXES:
-        if index in existing_indexes:
-            print(f"  ✓ Index '{index}' exists")
-        else:
-            print(f"  ✗ Index '{index}' is MISSING")
-            all_good = False
-    
-    return all_good
+    return check_names(diff, 'index', 'indexes', 'Index', EXPECTED_INDEXES)
 
 
-def check_triggers():
+def check_triggers(diff):
     """Check if all expected triggers exist."""
-    print("\nChecking triggers...")
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT trigger_name 
-            FROM information_schema.triggers 
-            WHERE trigger_schema = 'public'
-            ORDER BY trigger_name;
-        """))
-        existing_triggers = {row[0] for row in result}
-    
-    all_good = True
-    for trigger in EXPECTED_TRIGGERS:
-        if trigger in existing_triggers:
-            print(f"  ✓ Trigger '{trigger}' exists")
-        else:
-            print(f"  ✗ Trigger '{trigger}' is MISSING")
-            all_good = False
-    
-    return all_good
+    return check_names(diff, 'trigger', 'triggers', 'Trigger', EXPECTED_TRIGGERS)
 
 
-def check_functions():
+def check_functions(diff):
     """Check if all expected functions exist."""
-    print("\nChecking functions...")
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT routine_name 
-            FROM information_schema.routines 
-            WHERE routine_schema = 'public'
-            AND routine_type = 'FUNCTION'
-            ORDER BY routine_name;
-        """))
-        existing_functions = {row[0] for row in result}
-    
-    all_good = True
-    for func in EXPECTED_FUNCTIONS:
-        if func in existing_functions:
-            print(f"  ✓ Function '{func}' exists")
-        else:
-            print(f"  ✗ Function '{func}' is MISSING")
-            all_good = False
-    
-    return all_good
+    return check_names(diff, 'function', 'functions', 'Function', EXPECTED_FUNCTIONS)
 
 
-def check_table_columns():
+def check_table_columns(diff):
     """Check critical table columns."""
-    print("\nChecking critical table columns...")
-    with engine.connect() as conn:
-        # Check if embedding_chunks has vector column
-        result = conn.execute(text("""
-            SELECT column_name, data_type 
-            FROM information_schema.columns 
-            WHERE table_name = 'embedding_chunks' 
-            AND column_name = 'embedding_vector';
-        """))
-        if result.fetchone():
-            print("  ✓ embedding_chunks.embedding_vector column exists")
-        else:
-            print("  ✗ embedding_chunks.embedding_vector column is MISSING")
-            return False
-        
-        # Check if search_index has vector column
-        result = conn.execute(text("""
-            SELECT column_name, data_type 
-            FROM information_schema.columns 
-            WHERE table_name = 'search_index' 
-            AND column_name = 'text_vector';
-        """))
-        if result.fetchone():
-            print("  ✓ search_index.text_vector column exists")
+    missing_columns = diff.get('column', frozenset())
+    lines = ["\nChecking critical table columns..."]
+    all_good = True
+    for column_name in EXPECTED_COLUMNS:
+        if column_name not in missing_columns:
+            lines.append(f"  ✓ {column_name} column exists")
         else:
-            print("  ✗ search_index.text_vector column is MISSING")
-            return False
-    
-    return True
+            lines.append(f"  ✗ {column_name} column is MISSING")
+            all_good = False
+            break
+    report(lines)
+    return all_good
 
 
-def check_constraints():
+def check_constraints(diff):
     """Check if key constraints exist."""
-    print("\nChecking constraints...")
-    with engine.connect() as conn:
-        # Check unique constraint on document_versions
-        result = conn.execute(text("""
-            SELECT constraint_name 
-            FROM information_schema.table_constraints 
-            WHERE table_name = 'document_versions' 
-            AND constraint_type = 'UNIQUE'
-            AND constraint_name LIKE '%document_version%';
-        """))
-        if result.fetchone():
-            print("  ✓ document_versions unique constraint exists")
-        else:
-            print("  ✗ document_versions unique constraint is MISSING")
-            return False
-    
-    return True
+    # Check unique constraint on document_versions
+    exists = 'document_versions' not in diff.get('unique_constraint', frozenset())
+    report([
+        "\nChecking constraints...",
+        "  ✓ document_versions unique constraint exists" if exists else "  ✗ document_versions unique constraint is MISSING"
+    ])
+    return exists
 
 
 def main():
     """Run all checks."""
-    print("=" * 60)
-    print("Database Schema Verification")
-    print("=" * 60)
-    print(f"Database: {settings.postgres_db}")
-    print(f"Host: {settings.postgres_host}:{settings.postgres_port}")
-    print("=" * 60)
+    rule = "=" * 60
+    report([
+        rule,
+        "Database Schema Verification",
+        rule,
+        f"Database: {settings.postgres_db}",
+        f"Host: {settings.postgres_host}:{settings.postgres_port}",
+        rule
+    ])
     
     results = []
     
-    # Run all checks
-    results.append(("pgvector extension", check_pgvector_extension()))
-    results.append(("tables", check_tables()))
-    results.append(("indexes", check_indexes()))
-    results.append(("triggers", check_triggers()))
-    results.append(("functions", check_functions()))
-    results.append(("table columns", check_table_columns()))
-    results.append(("constraints", check_constraints()))
+    # Run all checks against one server-side diff of the schema
+    diff = fetch_schema_diff()
+    results.append(("pgvector extension", check_pgvector_extension(diff)))
+    results.append(("pg_trgm extension", check_pg_trgm_extension(diff)))
+    results.append(("tables", check_tables(diff)))
+    results.append(("indexes", check_indexes(diff)))
+    results.append(("triggers", check_triggers(diff)))
+    results.append(("functions", check_functions(diff)))
+    results.append(("table columns", check_table_columns(diff)))
+    results.append(("constraints", check_constraints(diff)))
     
     # Summary
-    print("\n" + "=" * 60)
-    print("Summary")
-    print("=" * 60)
-    
-    all_passed = True
-    for check_name, passed in results:
-        status = "✓ PASS" if passed else "✗ FAIL"
-        print(f"{check_name:30s} {status}")
-        if not passed:
-            all_passed = False
-    
-    print("=" * 60)
+    all_passed = all(passed for _, passed in results)
+    lines = ["\n" + rule, "Summary", rule]
+    lines += [f"{check_name:30s} {'✓ PASS' if passed else '✗ FAIL'}" for check_name, passed in results]
+    lines.append(rule)
     
     if all_passed:
-        print("\n✓ All database migrations and schemas are properly created!")
-        return 0
+        lines.append("\n✓ All database migrations and schemas are properly created!")
     else:
-        print("\n✗ Some database migrations or schemas are missing!")
-        print("\nTo fix, ensure init_db.sql is executed or run:")
-        print("  Base.metadata.create_all(bind=engine)")
-        return 1
+        lines += [
+            "\n✗ Some database migrations or schemas are missing!",
+            "\nTo fix, ensure init_db.sql is executed or run:",
+            "  Base.metadata.create_all(bind=engine)"
+        ]
+    report(lines)
+    sys.stdout.flush()
+    return 0 if all_passed else 1
 
 
 if __name__ == "__main__":